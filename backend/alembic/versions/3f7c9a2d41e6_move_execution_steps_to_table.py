@@ -0,0 +1,63 @@
+"""move_execution_steps_to_table
+
+Revision ID: 3f7c9a2d41e6
+Revises: af25eb8630d0
+Create Date: 2026-10-16 09:12:44.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7c9a2d41e6'
+down_revision: Union[str, Sequence[str], None] = 'af25eb8630d0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Move execution steps from the instance_tasks JSONB array to task_execution_steps."""
+    op.create_table('task_execution_steps',
+        sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('seq', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('step', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['task_id'], ['instance_tasks.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('task_id', 'seq')
+    )
+    op.add_column('instance_tasks',
+        sa.Column('step_count', sa.Integer(), server_default='0', nullable=False))
+    
+    # Copy existing steps in array order, then empty the arrays
+    op.execute("""
+        INSERT INTO task_execution_steps (task_id, seq, step, created_at)
+        SELECT t.id, e.ordinality, e.value, COALESCE(t.processing_started_at, t.created_at)
+        FROM instance_tasks t
+        CROSS JOIN LATERAL jsonb_array_elements(t.execution_steps) WITH ORDINALITY AS e(value, ordinality)
+        WHERE jsonb_typeof(t.execution_steps) = 'array'
+    """)
+    op.execute("""
+        UPDATE instance_tasks
+        SET step_count = jsonb_array_length(execution_steps), execution_steps = '[]'::jsonb
+        WHERE jsonb_typeof(execution_steps) = 'array' AND jsonb_array_length(execution_steps) > 0
+    """)
+
+
+def downgrade() -> None:
+    """Fold task_execution_steps back into the instance_tasks JSONB array."""
+    op.execute("""
+        UPDATE instance_tasks t
+        SET execution_steps = s.steps
+        FROM (
+            SELECT task_id, jsonb_agg(step ORDER BY seq) AS steps
+            FROM task_execution_steps
+            GROUP BY task_id
+        ) s
+        WHERE t.id = s.task_id
+    """)
+    op.drop_column('instance_tasks', 'step_count')
+    op.drop_table('task_execution_steps')
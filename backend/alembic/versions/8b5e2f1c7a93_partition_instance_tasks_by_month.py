@@ -0,0 +1,151 @@
+"""partition_instance_tasks_by_month
+
+Revision ID: 8b5e2f1c7a93
+Revises: 3f7c9a2d41e6
+Create Date: 2026-10-16 14:03:27.519846
+
+"""
+from datetime import date, datetime, timezone
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b5e2f1c7a93'
+down_revision: Union[str, Sequence[str], None] = '3f7c9a2d41e6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+# Partition helpers as of this revision; src.tasks.partitions may change later
+def _month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_ddl(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS instance_tasks_y{month.year:04d}m{month.month:02d} "
+        f"PARTITION OF instance_tasks "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def _create_indexes(scheduled_index: bool) -> None:
+    op.create_index('idx_instance_tasks_instance_status', 'instance_tasks', ['instance_id', 'status'])
+    op.create_index('idx_instance_tasks_created', 'instance_tasks', ['instance_id', 'created_at'])
+    op.create_index('idx_instance_tasks_priority', 'instance_tasks', ['instance_id', 'priority', 'created_at'])
+    if scheduled_index:
+        op.create_index('idx_instance_tasks_scheduled', 'instance_tasks', ['scheduled_for', 'status'])
+
+
+def _rebuild_table(partitioned: bool) -> None:
+    """Replace instance_tasks by a copy with the same columns and rows."""
+    op.execute("ALTER TABLE instance_tasks RENAME TO instance_tasks_old")
+    op.execute("ALTER TABLE instance_tasks_old RENAME CONSTRAINT instance_tasks_pkey TO instance_tasks_old_pkey")
+    op.execute(
+        "CREATE TABLE instance_tasks (LIKE instance_tasks_old INCLUDING DEFAULTS)"
+        + (" PARTITION BY RANGE (created_at)" if partitioned else "")
+    )
+    op.create_primary_key('instance_tasks_pkey', 'instance_tasks', ['id', 'created_at'] if partitioned else ['id'])
+    op.create_foreign_key(
+        'instance_tasks_instance_id_fkey', 'instance_tasks', 'instances',
+        ['instance_id'], ['id'], ondelete='CASCADE'
+    )
+
+    if partitioned:
+        # One partition per month from the oldest task to a few months ahead
+        oldest = op.get_bind().scalar(sa.text("SELECT min(created_at) FROM instance_tasks_old"))
+        current = _month_start(datetime.now(timezone.utc))
+        month = min(_month_start(oldest), current) if oldest else current
+        while month <= _add_months(current, MONTHS_AHEAD):
+            op.execute(_partition_ddl(month))
+            month = _add_months(month, 1)
+        op.execute("CREATE TABLE instance_tasks_default PARTITION OF instance_tasks DEFAULT")
+
+    op.execute("INSERT INTO instance_tasks SELECT * FROM instance_tasks_old")
+    op.execute("DROP TABLE instance_tasks_old")
+
+
+def upgrade() -> None:
+    """Partition instance_tasks by month of created_at and add partial indexes on live statuses."""
+    # The partial indexes name the statuses as the ORM stores them (enum
+    # names); SUBMITTED is only known in lower case to databases built by
+    # these migrations, and new enum values must be committed before use
+    with op.get_context().autocommit_block():
+        for status in ('SUBMITTED', 'QUEUED', 'IN_PROGRESS'):
+            op.execute(f"ALTER TYPE instancetaskstatus ADD VALUE IF NOT EXISTS '{status}'")
+
+    # A foreign key to a partitioned table must include the partition key
+    op.drop_constraint('task_execution_steps_task_id_fkey', 'task_execution_steps', type_='foreignkey')
+    op.drop_constraint('instance_media_task_id_fkey', 'instance_media', type_='foreignkey')
+
+    _rebuild_table(partitioned=True)
+    _create_indexes(scheduled_index=False)
+
+    # Scheduler sweep and status polling only look at waiting or running tasks
+    op.execute(
+        "CREATE INDEX idx_instance_tasks_due ON instance_tasks (scheduled_for) "
+        "WHERE status = 'SUBMITTED'"
+    )
+    op.execute(
+        "CREATE INDEX idx_instance_tasks_live ON instance_tasks (instance_id, status) "
+        "WHERE status IN ('SUBMITTED', 'QUEUED', 'IN_PROGRESS')"
+    )
+
+    # Stands in for the dropped ON DELETE CASCADE of task_execution_steps
+    op.execute("""
+        CREATE OR REPLACE FUNCTION instance_tasks_delete_steps() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM task_execution_steps WHERE task_id = OLD.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER instance_tasks_delete_steps AFTER DELETE ON instance_tasks
+        FOR EACH ROW EXECUTE FUNCTION instance_tasks_delete_steps()
+    """)
+    
+    # Stands in for the dropped ON DELETE SET NULL of instance_media.task_id
+    op.execute("""
+        CREATE OR REPLACE FUNCTION instance_tasks_unlink_media() RETURNS trigger AS $$
+        BEGIN
+            UPDATE instance_media SET task_id = NULL WHERE task_id = OLD.id;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER instance_tasks_unlink_media AFTER DELETE ON instance_tasks
+        FOR EACH ROW EXECUTE FUNCTION instance_tasks_unlink_media()
+    """)
+
+
+def downgrade() -> None:
+    """Move instance_tasks back into a single table."""
+    _rebuild_table(partitioned=False)
+    _create_indexes(scheduled_index=True)
+    op.execute("DROP FUNCTION instance_tasks_delete_steps()")
+    op.execute("DROP FUNCTION instance_tasks_unlink_media()")
+
+    op.execute("DELETE FROM task_execution_steps s WHERE NOT EXISTS (SELECT 1 FROM instance_tasks t WHERE t.id = s.task_id)")
+    op.create_foreign_key(
+        'task_execution_steps_task_id_fkey', 'task_execution_steps', 'instance_tasks',
+        ['task_id'], ['id'], ondelete='CASCADE'
+    )
+    op.execute("UPDATE instance_media m SET task_id = NULL WHERE NOT EXISTS (SELECT 1 FROM instance_tasks t WHERE t.id = m.task_id)")
+    op.create_foreign_key(
+        'instance_media_task_id_fkey', 'instance_media', 'instance_tasks',
+        ['task_id'], ['id'], ondelete='SET NULL'
+    )
+
+    # Note: enum values cannot be removed in PostgreSQL, so SUBMITTED remains
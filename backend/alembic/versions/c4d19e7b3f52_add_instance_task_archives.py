@@ -0,0 +1,54 @@
+"""add_instance_task_archives
+
+Revision ID: c4d19e7b3f52
+Revises: 8b5e2f1c7a93
+Create Date: 2026-10-16 16:41:09.207315
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d19e7b3f52'
+down_revision: Union[str, Sequence[str], None] = '8b5e2f1c7a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _delete_steps_function(tables: Sequence[str]) -> str:
+    deletes = "\n".join(f"            DELETE FROM {table} WHERE task_id = OLD.id;" for table in tables)
+    return f"""
+        CREATE OR REPLACE FUNCTION instance_tasks_delete_steps() RETURNS trigger AS $$
+        BEGIN
+{deletes}
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """
+
+
+def upgrade() -> None:
+    """Add cold storage for the payloads and steps of old finished tasks."""
+    op.create_table('instance_task_archives',
+        sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('payload', sa.LargeBinary(), nullable=False),
+        sa.Column('archived_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    # Payloads are zlib-compressed already; skip TOAST compression
+    op.execute("ALTER TABLE instance_task_archives ALTER COLUMN payload SET STORAGE EXTERNAL")
+    op.add_column('instance_tasks', sa.Column('archived_at', sa.DateTime(), nullable=True))
+    
+    # Archives go with their task like its steps
+    op.execute(_delete_steps_function(['task_execution_steps', 'instance_task_archives']))
+
+
+def downgrade() -> None:
+    """Drop task archives; archived payloads are lost."""
+    op.execute(_delete_steps_function(['task_execution_steps']))
+    op.drop_column('instance_tasks', 'archived_at')
+    op.drop_table('instance_task_archives')
@@ -0,0 +1,58 @@
+"""add_task_change_feed
+
+Revision ID: d81a3c6e5f27
+Revises: c4d19e7b3f52
+Create Date: 2026-10-16 18:22:51.630418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81a3c6e5f27'
+down_revision: Union[str, Sequence[str], None] = 'c4d19e7b3f52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _delete_steps_function(tombstones: bool) -> str:
+    tombstone = """
+            INSERT INTO instance_task_tombstones (task_id, instance_id, deleted_at)
+            VALUES (OLD.id, OLD.instance_id, timezone('utc', now()))
+            ON CONFLICT (task_id) DO NOTHING;""" if tombstones else ""
+    return f"""
+        CREATE OR REPLACE FUNCTION instance_tasks_delete_steps() RETURNS trigger AS $$
+        BEGIN
+            DELETE FROM task_execution_steps WHERE task_id = OLD.id;
+            DELETE FROM instance_task_archives WHERE task_id = OLD.id;{tombstone}
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+    """
+
+
+def upgrade() -> None:
+    """Index tasks by update time and keep tombstones of deleted tasks."""
+    # Created on the partitioned parent, so every partition gets it
+    op.create_index('idx_instance_tasks_updated', 'instance_tasks', ['instance_id', 'updated_at'])
+
+    op.create_table('instance_task_tombstones',
+        sa.Column('task_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('instance_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('deleted_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('task_id')
+    )
+    op.create_index('idx_instance_task_tombstones_deleted', 'instance_task_tombstones', ['instance_id', 'deleted_at'])
+    op.execute(_delete_steps_function(tombstones=True))
+
+
+def downgrade() -> None:
+    """Stop recording tombstones and drop the change feed index."""
+    op.execute(_delete_steps_function(tombstones=False))
+    op.drop_index('idx_instance_task_tombstones_deleted', table_name='instance_task_tombstones')
+    op.drop_table('instance_task_tombstones')
+    op.drop_index('idx_instance_tasks_updated', table_name='instance_tasks')
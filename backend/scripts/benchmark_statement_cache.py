@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Benchmark the task list, detail and submit queries with asyncpg's
+statement cache off and on.
+
+Runs against DATABASE_URL (or --url) using an existing instance and its
+newest task. Submitted tasks are rolled back. Only run the cached mode
+against a connection that supports it (direct, session pooler, or
+PgBouncer >= 1.21 with max_prepared_statements); the script refuses a
+plain transaction pooler unless --force is given.
+
+Usage:
+    PYTHONPATH=. python scripts/benchmark_statement_cache.py --iterations 500
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+# Add parent directory to path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from src.core.config import get_settings
+from src.core.engines import TRANSACTION_POOLER, EngineRegistry
+from src.models.instance import Instance, InstanceTask, InstanceTaskStatus, TaskPriority
+from src.models.instance_schemas import TaskListFilters
+from src.tasks.async_queue_service import AsyncTaskQueueService
+from src.tasks.execution_steps import list_execution_steps_async
+
+
+async def run_list(session: AsyncSession, instance: Instance, task: InstanceTask):
+    await AsyncTaskQueueService(session).list_tasks(instance.id, TaskListFilters(limit=20))
+
+
+async def run_detail(session: AsyncSession, instance: Instance, task: InstanceTask):
+    # Same statements as GET /tasks/{task_id}/detail
+    await session.scalar(select(InstanceTask).join(Instance).where(
+        InstanceTask.id == task.id,
+        Instance.user_id == instance.user_id
+    ))
+    await list_execution_steps_async(session, task.id)
+
+
+async def run_submit(session: AsyncSession, instance: Instance, task: InstanceTask):
+    session.add(InstanceTask(
+        instance_id=instance.id,
+        description="Benchmark task",
+        priority=TaskPriority.NORMAL,
+        status=InstanceTaskStatus.SUBMITTED
+    ))
+    await session.flush()
+    await session.rollback()
+
+
+QUERIES: Dict[str, Callable[[AsyncSession, Instance, InstanceTask], Awaitable[None]]] = {
+    "list": run_list,
+    "detail": run_detail,
+    "submit": run_submit,
+}
+
+
+async def benchmark(registry: EngineRegistry, statement_cache: bool, iterations: int) -> Dict[str, List[float]]:
+    """Per-query latencies in milliseconds for one mode."""
+    engine = registry.build_async_engine(statement_cache=statement_cache)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    timings: Dict[str, List[float]] = {name: [] for name in QUERIES}
+    try:
+        async with session_factory() as session:
+            instance = await session.scalar(select(Instance).join(InstanceTask).limit(1))
+            if not instance:
+                raise SystemExit("Needs an instance with at least one task")
+            task = await session.scalar(
+                select(InstanceTask)
+                .where(InstanceTask.instance_id == instance.id)
+                .order_by(InstanceTask.created_at.desc())
+                .limit(1)
+            )
+            await session.commit()
+
+        for name, query in QUERIES.items():
+            for i in range(iterations):
+                # A new session per request, as in the API
+                async with session_factory() as session:
+                    started = time.perf_counter()
+                    await query(session, instance, task)
+                    await session.commit()
+                    elapsed = (time.perf_counter() - started) * 1000
+                # The first round trips prepare the statements
+                if i >= min(10, iterations // 10):
+                    timings[name].append(elapsed)
+    finally:
+        await engine.dispose()
+    return timings
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Database URL (defaults to DATABASE_URL)")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--force", action="store_true", help="Run the cached mode behind a transaction pooler")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    if args.url:
+        settings = settings.model_copy(update={"database_url": args.url})
+    registry = EngineRegistry(settings)
+
+    print(f"Connection mode: {registry.connection_mode}")
+    modes = [False]
+    if registry.connection_mode != TRANSACTION_POOLER or args.force:
+        modes.append(True)
+    else:
+        print("Statement cache is unsafe behind this pooler, only benchmarking it off (use --force)")
+
+    results = {}
+    for statement_cache in modes:
+        results[statement_cache] = await benchmark(registry, statement_cache, args.iterations)
+
+    print(f"\n{'query':<8} {'cache':<6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9}")
+    for name in QUERIES:
+        for statement_cache, timings in results.items():
+            values = timings[name]
+            print(
+                f"{name:<8} {'on' if statement_cache else 'off':<6} "
+                f"{statistics.mean(values):>9.2f} {percentile(values, 0.5):>9.2f} {percentile(values, 0.95):>9.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,10 @@
+#!/bin/bash
+
+# Run the delayed task scheduler for development
+cd "$(dirname "$0")/.."
+
+# Load environment variables
+export PYTHONPATH="${PYTHONPATH}:${PWD}"
+
+# Pop due scheduled tasks from Redis and queue them
+poetry run python -m src.tasks.delayed_scheduler
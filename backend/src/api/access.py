@@ -0,0 +1,79 @@
+"""Cache of instance and task access checks."""
+
+import threading
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from sqlalchemy import event
+
+from src.core.cache import TTLCache
+from src.core.config import get_settings
+from src.models.instance import Instance
+
+
+class AccessCache:
+    """Remembers which users may access which instances and tasks.
+
+    Only grants are cached, keyed on ``(user_id, instance_id)`` and
+    ``(user_id, task_id)``; a task entry holds its instance id so that
+    revoking an instance also revokes its tasks, and its ``created_at`` so
+    that later loads can prune the monthly ``instance_tasks`` partitions. Denials are always
+    re-checked, so a new instance is reachable at once. Entries expire after
+    ``access_cache_ttl_seconds``, which bounds how long an instance deleted
+    through another process stays reachable here.
+    """
+
+    def __init__(self, maxsize: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        settings = get_settings()
+        self._cache = TTLCache(
+            maxsize or settings.access_cache_size,
+            settings.access_cache_ttl_seconds if ttl_seconds is None else ttl_seconds
+        )
+
+    def instance_granted(self, user_id: UUID, instance_id: UUID) -> bool:
+        return self._cache.get(("instance", user_id, instance_id)) is not None
+
+    def grant_instance(self, user_id: UUID, instance_id: UUID):
+        self._cache.set(("instance", user_id, instance_id), instance_id)
+
+    def task_instance(self, user_id: UUID, task_id: UUID) -> Optional[UUID]:
+        """Instance of a task the user was granted, or None if not cached."""
+        grant = self._cache.get(("task", user_id, task_id))
+        return grant[0] if grant else None
+
+    def task_created_at(self, user_id: UUID, task_id: UUID) -> Optional[datetime]:
+        """Creation time of a task the user was granted, or None if not cached."""
+        grant = self._cache.get(("task", user_id, task_id))
+        return grant[1] if grant else None
+
+    def grant_task(self, user_id: UUID, task_id: UUID, instance_id: UUID, created_at: datetime):
+        self._cache.set(("task", user_id, task_id), (instance_id, created_at))
+
+    def revoke_task(self, user_id: UUID, task_id: UUID):
+        self._cache.discard(("task", user_id, task_id))
+
+    def revoke_instance(self, instance_id: UUID):
+        """Drop every grant of an instance and of its tasks."""
+        self._cache.discard_where(
+            lambda key, value: (value[0] if key[0] == "task" else value) == instance_id
+        )
+
+
+_access_cache: Optional[AccessCache] = None
+_access_cache_lock = threading.Lock()
+
+
+def get_access_cache() -> AccessCache:
+    """Get the process-wide access cache, created on first use."""
+    global _access_cache
+    if _access_cache is None:
+        with _access_cache_lock:
+            if _access_cache is None:
+                _access_cache = AccessCache()
+    return _access_cache
+
+
+@event.listens_for(Instance, "after_delete")
+def _revoke_deleted_instance(mapper, connection, target):
+    get_access_cache().revoke_instance(target.id)
@@ -1,19 +1,16 @@
 """Common dependencies for API routes."""
-from typing import Optional
+from typing import Generator
 from uuid import UUID
 
+from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
-from src.core.database import get_db as async_get_db
+from src.core.database import get_db as async_get_db, get_session
+from src.core.read_routing import get_read_router, has_committed_writes
 from src.models.user import User
 
 
-async def get_db() -> AsyncSession:
-    """Get async database session."""
-    async for db in async_get_db():
-        yield db
-
-
 async def get_current_user() -> User:
     """Get current user - placeholder for now."""
     # TODO: Implement proper authentication
@@ -28,4 +25,32 @@ async def get_current_user() -> User:
 async def get_current_user_id() -> UUID:
     """Get current user ID - placeholder for now."""
     user = await get_current_user()
-    return user.id
\ No newline at end of file
+    return user.id
+
+
+async def get_db(user_id: UUID = Depends(get_current_user_id)) -> AsyncSession:
+    """Get async database session on the primary.
+
+    Committed writes keep the user's reads on the primary for a while.
+    """
+    async for db in async_get_db():
+        yield db
+        if has_committed_writes(db):
+            await get_read_router().sticky.mark(str(user_id))
+
+
+async def get_read_db(user_id: UUID = Depends(get_current_user_id)) -> AsyncSession:
+    """Get async database session for read-only endpoints.
+
+    Uses a read replica when configured, unless the user wrote recently.
+    """
+    async with await get_read_router().session(str(user_id)) as db:
+        yield db
+
+
+def get_sync_db(user_id: UUID = Depends(get_current_user_id)) -> Generator[Session, None, None]:
+    """Get sync database session on the primary, for sync routes."""
+    for db in get_session():
+        yield db
+        if has_committed_writes(db):
+            get_read_router().sticky.mark_sync(str(user_id))
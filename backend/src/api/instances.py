@@ -3,9 +3,11 @@
 from typing import List
 from uuid import UUID
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from src.core.sync_database import get_db
+from src.api.access import get_access_cache
+from src.api.deps import get_read_db, get_sync_db as get_db
 from src.services.instance_service import InstanceService
 from src.models.instance_schemas import (
     InstanceCreate, InstanceResponse, TaskSubmission, InstanceTaskResponse
@@ -32,29 +34,28 @@ def create_instance(
     """Create a new instance for the current user."""
     service = InstanceService(db)
     instance = service.create_instance(user_id, instance_data)
+    get_access_cache().grant_instance(user_id, instance.id)
     return instance
 
 
 @router.get("/", response_model=List[InstanceResponse])
-def list_instances(
-    db: Session = Depends(get_db),
+async def list_instances(
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """List all instances for the current user."""
-    service = InstanceService(db)
-    instances = service.list_instances(user_id)
+    instances = await db.run_sync(lambda session: InstanceService(session).list_instances(user_id))
     return instances
 
 
 @router.get("/{instance_id}", response_model=InstanceResponse)
-def get_instance(
+async def get_instance(
     instance_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Get a specific instance by ID."""
-    service = InstanceService(db)
-    instance = service.get_instance(instance_id, user_id)
+    instance = await db.run_sync(lambda session: InstanceService(session).get_instance(instance_id, user_id))
     
     if not instance:
         raise HTTPException(
@@ -1,16 +1,41 @@
 """FastAPI application setup."""
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 import socketio
 
 from ..core.config import get_settings
+from ..core.engines import get_engine_registry
+from ..core.query_stats import REQUEST, begin_unit, end_unit
 from ..core.websocket import sio as socketio_server
 from .routes import checkpoints, health, image_generation, tasks, tiktok, tiktok_mvp
 from . import instances
 
 settings = get_settings()
 
+DEBUG_QUERY_HEADERS = [
+    "X-DB-Query-Count",
+    "X-DB-Time-Ms",
+    "X-DB-Slowest-Ms",
+    "X-DB-Slowest-Statement",
+    "X-DB-N-Plus-One",
+]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Detect database connection modes before serving requests.
+    
+    Detection can block on the PgBouncer admin console, so it runs in a
+    worker thread here rather than on the event loop of the first request.
+    """
+    if settings.database_url:
+        await asyncio.to_thread(get_engine_registry().resolve_connection_modes)
+    yield
+
 
 def create_app() -> FastAPI:
     """Create and configure the FastAPI application."""
@@ -20,6 +45,7 @@ def create_app() -> FastAPI:
         version="0.1.0",
         docs_url="/docs" if settings.debug else None,
         redoc_url="/redoc" if settings.debug else None,
+        lifespan=lifespan,
     )
     
     # Configure CORS
@@ -29,8 +55,21 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor", "X-Change-Cursor"] + (DEBUG_QUERY_HEADERS if settings.debug else []),
     )
     
+    @app.middleware("http")
+    async def track_request_queries(request: Request, call_next):
+        """Count the request's SQL statements; debug responses carry the totals."""
+        token = begin_unit(REQUEST, f"{request.method} {request.url.path}")
+        try:
+            response = await call_next(request)
+        finally:
+            stats = end_unit(token)
+        if settings.debug and stats is not None:
+            response.headers.update(stats.headers())
+        return response
+    
     # Include routers
     app.include_router(health.router, tags=["health"])
     app.include_router(
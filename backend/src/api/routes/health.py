@@ -8,26 +8,57 @@ from sqlalchemy import text
 
 from ...core.state import SharedState
 from ...core.tasks import check_celery_health
-from ...core.database import engine, get_db
+from ...core.database import get_db
+from ...core.engines import ASYNC, get_engine_registry
+from ...core.query_stats import query_metrics
 from ...core.config import get_settings
 
 router = APIRouter()
 settings = get_settings()
 
 
+class PoolStatus(BaseModel):
+    """Usage and checkout metrics of one engine's pool."""
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    waits: int  # Checkouts that found every connection in use
+    timeouts: int
+    checkout_seconds_avg: float
+    checkout_seconds_max: float
+
+
 class DatabasePoolStatus(BaseModel):
     """Database connection pool status."""
     connected: bool
-    connection_type: str  # "pooled" or "direct"
+    connection_type: str  # Connection mode of the engine registry
     database_url_type: str  # Which URL is being used
     pool_size: Optional[int] = None
     pool_overflow: Optional[int] = None
     pool_checked_out: Optional[int] = None
+    connection_budget: Optional[int] = None  # Connections this process may hold across engines
+    statement_cache: Optional[bool] = None  # Whether asyncpg caches prepared statements
+    pools: Dict[str, PoolStatus] = {}  # Engines created so far, by kind
     database_name: Optional[str] = None
     postgresql_version: Optional[str] = None
     error: Optional[str] = None
 
 
+class QueryUnitStatus(BaseModel):
+    """SQL statements of the finished requests or Celery tasks of this process."""
+    units: int
+    queries: int
+    queries_avg: float
+    max_queries: int
+    db_seconds_avg: float
+    max_db_seconds: float
+    n_plus_one_units: int  # Units where one statement shape passed DB_N_PLUS_ONE_THRESHOLD
+    slowest_seconds: float
+    slowest_statement: Optional[str] = None
+
+
 class HealthResponse(BaseModel):
     """Health check response model."""
     
@@ -35,6 +66,7 @@ class HealthResponse(BaseModel):
     redis_connected: bool
     celery_status: Dict[str, Any]
     database_status: DatabasePoolStatus
+    query_metrics: Dict[str, QueryUnitStatus] = {}  # By unit kind: request or task
     environment: str
     version: str = "0.1.0"
 
@@ -71,6 +103,7 @@ async def health_check(db: AsyncSession = Depends(get_db)) -> HealthResponse:
         redis_connected=redis_connected,
         celery_status=celery_status,
         database_status=database_status,
+        query_metrics={kind: QueryUnitStatus(**stats) for kind, stats in query_metrics.stats().items()},
         environment=settings.environment,
     )
 
@@ -78,8 +111,8 @@ async def health_check(db: AsyncSession = Depends(get_db)) -> HealthResponse:
 async def check_database_pool(db: AsyncSession) -> DatabasePoolStatus:
     """Check database connection pool status."""
     try:
-        # Always using transaction pooler now for IPv4 compatibility
-        connection_type = "transaction_pooler"
+        registry = get_engine_registry()
+        connection_type = registry.connection_mode
         database_url_type = "DATABASE_URL"
         
         # Test basic connection
@@ -88,35 +121,20 @@ async def check_database_pool(db: AsyncSession) -> DatabasePoolStatus:
         database_name = row[0] if row else None
         postgresql_version = row[1].split()[1] if row and len(row[1].split()) > 1 else None
         
-        # Get pool statistics from engine
-        pool = engine.pool
-        pool_status = pool.status() if hasattr(pool, 'status') else None
-        
-        # Parse pool status (format: "Pool size: X  Connections in pool: Y Current Overflow: Z Current Checked out connections: W")
-        pool_size = None
-        pool_overflow = None
-        pool_checked_out = None
-        
-        if pool_status:
-            import re
-            size_match = re.search(r'Pool size: (\d+)', pool_status)
-            overflow_match = re.search(r'Current Overflow: (-?\d+)', pool_status)
-            checked_match = re.search(r'Current Checked out connections: (\d+)', pool_status)
-            
-            if size_match:
-                pool_size = int(size_match.group(1))
-            if overflow_match:
-                pool_overflow = int(overflow_match.group(1))
-            if checked_match:
-                pool_checked_out = int(checked_match.group(1))
+        # Get pool statistics of every engine in this process
+        pools = {kind: PoolStatus(**stats) for kind, stats in registry.stats().items()}
+        api_pool = pools.get(ASYNC)
         
         return DatabasePoolStatus(
             connected=True,
             connection_type=connection_type,
             database_url_type=database_url_type,
-            pool_size=pool_size,
-            pool_overflow=pool_overflow,
-            pool_checked_out=pool_checked_out,
+            pool_size=api_pool.pool_size if api_pool else None,
+            pool_overflow=api_pool.overflow if api_pool else None,
+            pool_checked_out=api_pool.checked_out if api_pool else None,
+            connection_budget=registry.budget,
+            statement_cache=registry.statement_cache_enabled,
+            pools=pools,
             database_name=database_name,
             postgresql_version=postgresql_version,
         )
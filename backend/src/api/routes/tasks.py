@@ -1,19 +1,37 @@
 """Enhanced task API endpoints with filtering and queue integration."""
 
-from typing import List, Optional
+import json
+from contextlib import aclosing
+from typing import Any, Dict, List, Optional, Union
 from uuid import UUID
 from datetime import datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, status
-from sqlalchemy.orm import Session
-
-from src.core.sync_database import get_db
-from src.tasks.queue_service import TaskQueueService
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.api.access import get_access_cache
+from src.api.deps import get_db, get_read_db
+from src.core.config import get_settings
+from src.core.event_coalescing import TERMINAL_STATUSES
+from src.core.event_stream import get_async_event_stream
+from src.tasks.archiver import list_task_steps_async, load_task_archive
+from src.tasks.async_queue_service import AsyncTaskQueueService
+from src.tasks.execution_steps import DEFAULT_STEP_PAGE_SIZE, MAX_STEP_PAGE_SIZE, step_to_log
+from src.tasks.idempotency import SubmissionInProgressError
+from src.tasks.queue_service import encode_task_cursor
+from src.tasks.task_changes import ChangeCursorExpiredError, change_cursor_since, initial_change_cursor
+from src.tasks.processors import register_task_processors
 from src.models.instance import Instance, InstanceTask, InstanceTaskStatus, TaskPriority
 from src.models.instance_schemas import (
     TaskSubmission, 
+    TaskBatchSubmission,
     InstanceTaskResponse, 
     TaskListFilters,
+    TaskChangesResponse,
+    TaskDispatchStats,
     TaskUpdateRequest,
     TaskDetailResponse,
     TaskPlanningStep,
@@ -21,11 +39,16 @@ from src.models.instance_schemas import (
     InstanceMediaResponse,
     TikTokPostRequest,
     TikTokPostResponse,
-    TikTokPostStatusResponse
+    TikTokPostStatusResponse,
+    TASK_SUMMARY_EXCLUDED_FIELDS
 )
 
 router = APIRouter(prefix="/tasks", tags=["tasks"])
 
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+CHANGE_CURSOR_HEADER = "X-Change-Cursor"
+SSE_KEEPALIVE = ": keepalive\n\n"
+
 
 def get_current_user_id() -> UUID:
     """Get the current user ID from auth context."""
@@ -34,16 +57,27 @@ def get_current_user_id() -> UUID:
     return UUID("00000000-0000-0000-0000-000000000001")
 
 
-def verify_instance_access(
+async def verify_instance_access(
     instance_id: UUID,
     user_id: UUID,
-    db: Session
+    db: AsyncSession
 ) -> Instance:
-    """Verify user has access to the instance."""
-    instance = db.query(Instance).filter(
-        Instance.id == instance_id,
-        Instance.user_id == user_id
-    ).first()
+    """Verify user has access to the instance.
+    
+    Cached grants skip the ownership query; the row then comes from the
+    session's identity map or a primary key lookup.
+    """
+    access = get_access_cache()
+    if access.instance_granted(user_id, instance_id):
+        instance = await db.get(Instance, instance_id)
+        if not instance:
+            # A granted instance that is gone was deleted; drop every user's grants
+            access.revoke_instance(instance_id)
+    else:
+        instance = await db.scalar(select(Instance).where(
+            Instance.id == instance_id,
+            Instance.user_id == user_id
+        ))
     
     if not instance:
         raise HTTPException(
@@ -51,19 +85,48 @@ def verify_instance_access(
             detail="Instance not found or access denied"
         )
     
+    access.grant_instance(user_id, instance_id)
     return instance
 
 
-def verify_task_access(
+async def check_instance_access(
+    instance_id: UUID,
+    user_id: UUID,
+    db: AsyncSession
+):
+    """Verify user has access to the instance without loading it when cached."""
+    if not get_access_cache().instance_granted(user_id, instance_id):
+        await verify_instance_access(instance_id, user_id, db)
+
+
+async def verify_task_access(
     task_id: UUID,
     user_id: UUID,
-    db: Session
+    db: AsyncSession
 ) -> InstanceTask:
-    """Verify user has access to the task."""
-    task = db.query(InstanceTask).join(Instance).filter(
-        InstanceTask.id == task_id,
-        Instance.user_id == user_id
-    ).first()
+    """Verify user has access to the task.
+    
+    Cached grants load the task by id and its cached ``created_at`` instead
+    of joining through its instance, so the lookup touches one monthly
+    partition of ``instance_tasks``. The first check filters on the id
+    alone and probes the id index of every partition. Later ``session.get``
+    calls in the same request, such as the queue service's, reuse the
+    loaded row.
+    """
+    access = get_access_cache()
+    created_at = access.task_created_at(user_id, task_id)
+    if created_at:
+        task = await db.scalar(select(InstanceTask).where(
+            InstanceTask.id == task_id,
+            InstanceTask.created_at == created_at
+        ))
+        if not task:
+            access.revoke_task(user_id, task_id)
+    else:
+        task = await db.scalar(select(InstanceTask).join(Instance).where(
+            InstanceTask.id == task_id,
+            Instance.user_id == user_id
+        ))
     
     if not task:
         raise HTTPException(
@@ -71,38 +134,84 @@ def verify_task_access(
             detail="Task not found or access denied"
         )
     
+    access.grant_task(user_id, task_id, task.instance_id, task.created_at)
     return task
 
 
 @router.post("/instances/{instance_id}/tasks", 
              response_model=InstanceTaskResponse,
              status_code=status.HTTP_201_CREATED)
-def submit_task(
+async def submit_task(
     instance_id: UUID,
     task_data: TaskSubmission,
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
-    """Submit a new task to the queue."""
+    """Submit a new task to the queue.
+    
+    Retries carrying the same ``Idempotency-Key`` header return the task
+    created by the first request.
+    """
     # Verify access
-    instance = verify_instance_access(instance_id, user_id, db)
+    await check_instance_access(instance_id, user_id, db)
     
     # Submit task through queue service
-    queue_service = TaskQueueService(db)
-    task = queue_service.submit_task(instance_id, task_data)
-    
-    # Process scheduled tasks in background
-    if not task_data.scheduled_for or task_data.scheduled_for <= datetime.now():
-        background_tasks.add_task(process_scheduled_tasks, db)
+    queue_service = AsyncTaskQueueService(db)
+    try:
+        task = await queue_service.submit_task(instance_id, task_data, idempotency_key=idempotency_key)
+    except SubmissionInProgressError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
     
     return task
 
 
+@router.post("/instances/{instance_id}/tasks:batch",
+             response_model=List[InstanceTaskResponse],
+             status_code=status.HTTP_201_CREATED)
+async def submit_tasks_batch(
+    instance_id: UUID,
+    batch: TaskBatchSubmission,
+    db: AsyncSession = Depends(get_db),
+    user_id: UUID = Depends(get_current_user_id)
+):
+    """Submit several tasks to the queue in a single request."""
+    # Verify access
+    await check_instance_access(instance_id, user_id, db)
+    
+    queue_service = AsyncTaskQueueService(db)
+    tasks = await queue_service.submit_tasks_bulk(instance_id, batch.tasks)
+    
+    return tasks
+
+
+def parse_task_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse the ``fields`` query parameter of task listings.
+    
+    ``summary`` selects every response field except the large JSONB ones;
+    otherwise a comma-separated list of response field names is expected.
+    """
+    if not fields:
+        return None
+    available = list(InstanceTaskResponse.model_fields)
+    if fields == "summary":
+        return [name for name in available if name not in TASK_SUMMARY_EXCLUDED_FIELDS]
+    
+    selected = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in selected if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown task fields: {', '.join(unknown)}"
+        )
+    return ["id"] + [name for name in selected if name != "id"]
+
+
 @router.get("/instances/{instance_id}/tasks",
-            response_model=List[InstanceTaskResponse])
-def list_tasks(
+            response_model=Union[List[InstanceTaskResponse], TaskChangesResponse])
+async def list_tasks(
     instance_id: UUID,
+    response: Response,
     status: Optional[InstanceTaskStatus] = Query(None),
     priority: Optional[TaskPriority] = Query(None),
     created_after: Optional[datetime] = Query(None),
@@ -111,12 +220,41 @@ def list_tasks(
     scheduled_before: Optional[datetime] = Query(None),
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None, description=f"{NEXT_CURSOR_HEADER} of the previous page"),
+    fields: Optional[str] = Query(None, description="'summary' or comma-separated response fields"),
+    updated_since: Optional[datetime] = Query(None, description="Only tasks changed or deleted after this time"),
+    change_cursor: Optional[str] = Query(
+        None, description=f"{CHANGE_CURSOR_HEADER} of a listing or change_cursor of the previous changes"
+    ),
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
-    """List tasks with advanced filtering."""
+    """List tasks with advanced filtering.
+    
+    Pages are chained with the ``X-Next-Cursor`` response header, which is
+    only set while more tasks may follow. ``fields`` trims each task to the
+    selected fields.
+    
+    Listings also return an ``X-Change-Cursor`` header. Passing it back as
+    ``change_cursor`` (or passing ``updated_since``) returns a
+    ``TaskChangesResponse`` with only the tasks changed and deleted since,
+    for clients that poll. Expired change cursors get 410 Gone.
+    """
     # Verify access
-    instance = verify_instance_access(instance_id, user_id, db)
+    await check_instance_access(instance_id, user_id, db)
+    selected_fields = parse_task_fields(fields)
+    
+    if updated_since is not None or change_cursor is not None:
+        # A task leaving a filter would never be reported as a change
+        listing_filters = (status, priority, created_after, created_before, scheduled_after, scheduled_before, cursor)
+        if any(value is not None for value in listing_filters) or offset or (updated_since and change_cursor):
+            raise HTTPException(
+                status_code=400,
+                detail="updated_since and change_cursor cannot be combined with each other, filters or pagination"
+            )
+        return await list_task_changes(
+            instance_id, change_cursor or change_cursor_since(updated_since), limit, selected_fields, db
+        )
     
     # Create filters
     filters = TaskListFilters(
@@ -127,72 +265,272 @@ def list_tasks(
         scheduled_after=scheduled_after,
         scheduled_before=scheduled_before,
         limit=limit,
-        offset=offset
+        offset=offset,
+        cursor=cursor
     )
     
+    # Taken before the listing runs, so changes made meanwhile are not missed
+    headers = {CHANGE_CURSOR_HEADER: initial_change_cursor()}
+    
     # Get tasks through queue service
-    queue_service = TaskQueueService(db)
-    tasks = queue_service.list_tasks(instance_id, filters)
+    queue_service = AsyncTaskQueueService(db)
+    try:
+        tasks = await queue_service.list_tasks(instance_id, filters, fields=selected_fields)
+    except ValueError as e:
+        # The status filter shadows fastapi.status here
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return tasks
+    if len(tasks) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_task_cursor(tasks[-1].created_at, tasks[-1].id)
+    
+    if selected_fields is None:
+        response.headers.update(headers)
+        return tasks
+    
+    items = [{name: getattr(task, name) for name in selected_fields} for task in tasks]
+    return JSONResponse(content=jsonable_encoder(items), headers=headers)
+
+
+async def list_task_changes(
+    instance_id: UUID,
+    change_cursor: str,
+    limit: int,
+    selected_fields: Optional[List[str]],
+    db: AsyncSession
+):
+    """Changes of an instance's tasks since a change cursor, as a TaskChangesResponse."""
+    queue_service = AsyncTaskQueueService(db)
+    try:
+        changes = await queue_service.list_task_changes(instance_id, change_cursor, limit, fields=selected_fields)
+    except ChangeCursorExpiredError as e:
+        raise HTTPException(status_code=410, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if selected_fields is None:
+        return TaskChangesResponse(
+            tasks=[InstanceTaskResponse.model_validate(task) for task in changes.tasks],
+            deleted=[{"id": row.id, "deleted_at": row.deleted_at} for row in changes.deleted],
+            change_cursor=changes.change_cursor,
+            has_more=changes.has_more
+        )
+    
+    content = {
+        "tasks": [{name: getattr(task, name) for name in selected_fields} for task in changes.tasks],
+        "deleted": [{"id": row.id, "deleted_at": row.deleted_at} for row in changes.deleted],
+        "change_cursor": changes.change_cursor,
+        "has_more": changes.has_more
+    }
+    return JSONResponse(content=jsonable_encoder(content))
+
+
+@router.get("/instances/{instance_id}/dispatch-stats",
+            response_model=TaskDispatchStats)
+async def get_dispatch_stats(
+    instance_id: UUID,
+    db: AsyncSession = Depends(get_read_db),
+    user_id: UUID = Depends(get_current_user_id)
+):
+    """Get fair-share dispatch statistics, including wait time percentiles."""
+    # Verify access
+    await check_instance_access(instance_id, user_id, db)
+    
+    queue_service = AsyncTaskQueueService(db)
+    return await queue_service.get_dispatch_stats(instance_id)
 
 
 @router.get("/tasks/{task_id}",
             response_model=InstanceTaskResponse)
-def get_task(
+async def get_task(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Get task details with current status."""
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
+    await load_task_archive(db, task)
     return task
 
 
 @router.get("/tasks/{task_id}/status")
-def get_task_status(
+async def get_task_status(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Get detailed task status including Celery information."""
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
-    queue_service = TaskQueueService(db)
-    status = queue_service.get_task_status(task_id)
+    queue_service = AsyncTaskQueueService(db)
+    status = await queue_service.get_task_status(task_id)
     
     return status
 
 
+def format_sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    """Encode one Server-Sent Events message."""
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(jsonable_encoder(data))}")
+    return "\n".join(lines) + "\n\n"
+
+
+@router.get("/tasks/{task_id}/events")
+async def stream_task_events(
+    task_id: UUID,
+    request: Request,
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db),
+    user_id: UUID = Depends(get_current_user_id)
+):
+    """Stream status, progress and step events of a task as Server-Sent Events.
+    
+    A new stream starts with a ``snapshot`` of the task. Event ids are the
+    instance event sequence numbers, so a reconnect with ``Last-Event-ID``
+    resumes where it left off; if events were lost in between a ``reset``
+    and a fresh ``snapshot`` are sent instead. The stream ends after a
+    terminal status. A reconnect to a finished task gets what it missed and
+    then the end of the stream, or 204 when it missed nothing, which stops
+    EventSource from reconnecting.
+    """
+    task = await verify_task_access(task_id, user_id, db)
+    
+    last_seq = None
+    if last_event_id:
+        try:
+            last_seq = int(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID")
+    
+    task_key = str(task.id)
+    instance_id = str(task.instance_id)
+    terminal = task.status.value in TERMINAL_STATUSES
+    snapshot = {
+        'task_id': task_key,
+        'instance_id': instance_id,
+        'status': task.status.value,
+        'progress': task.progress_percentage,
+        'error_message': task.error_message
+    }
+    keepalive_seconds = get_settings().sse_keepalive_seconds
+    
+    # The stream can stay open for minutes; give the connection back now
+    await db.close()
+    
+    missed = None
+    if terminal and last_seq is not None:
+        replayed, complete = await get_async_event_stream().replay(instance_id, last_seq)
+        missed = [(seq, event, data) for seq, event, data in replayed if data.get('task_id') == task_key]
+        if complete and not missed:
+            return Response(status_code=status.HTTP_204_NO_CONTENT)
+        if not complete:
+            missed = [(last_seq, 'reset', {})]
+    
+    async def events():
+        if last_seq is None:
+            yield format_sse('snapshot', snapshot)
+            if terminal:
+                return
+        
+        if missed is not None:
+            # Nothing newer can follow the finished task's last event
+            for seq, event, data in missed:
+                if event == 'reset':
+                    yield format_sse('reset', {'task_id': task_key, 'last_seq': seq})
+                    yield format_sse('snapshot', snapshot)
+                else:
+                    data['seq'] = seq
+                    yield format_sse(event, data, seq)
+            return
+        
+        stream = get_async_event_stream().tail(instance_id, last_seq, block_seconds=keepalive_seconds)
+        async with aclosing(stream):
+            async for item in stream:
+                if await request.is_disconnected():
+                    return
+                if item is None:
+                    yield SSE_KEEPALIVE
+                    continue
+                
+                seq, event, data = item
+                if event == 'reset':
+                    yield format_sse('reset', {'task_id': task_key, 'last_seq': seq})
+                    yield format_sse('snapshot', snapshot)
+                    if terminal:
+                        return
+                    continue
+                if data.get('task_id') != task_key:
+                    continue
+                
+                data['seq'] = seq
+                yield format_sse(event, data, seq)
+                if event == 'task_update' and data['data'].get('status') in TERMINAL_STATUSES:
+                    return
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/tasks/{task_id}/steps",
+            response_model=List[TaskExecutionLog])
+async def get_task_steps(
+    task_id: UUID,
+    response: Response,
+    after_seq: int = Query(0, ge=0, description=f"{NEXT_CURSOR_HEADER} of the previous page"),
+    limit: int = Query(DEFAULT_STEP_PAGE_SIZE, ge=1, le=MAX_STEP_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
+    user_id: UUID = Depends(get_current_user_id)
+):
+    """Page through a task's execution logs in the order they were recorded.
+    
+    Pages are chained with the ``X-Next-Cursor`` response header; polling with
+    the last seen ``seq`` returns only steps recorded since.
+    """
+    task = await verify_task_access(task_id, user_id, db)
+    archived = await load_task_archive(db, task)
+    
+    default_timestamp = task.processing_started_at or task.created_at
+    logs = [
+        step_to_log(record, default_timestamp)
+        for record in await list_task_steps_async(db, task_id, after_seq, limit, archived)
+    ]
+    if len(logs) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(logs[-1].seq)
+    return logs
+
+
 @router.patch("/tasks/{task_id}",
               response_model=InstanceTaskResponse)
-def update_task(
+async def update_task(
     task_id: UUID,
     update_data: TaskUpdateRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Update task properties (priority, status, etc)."""
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
-    queue_service = TaskQueueService(db)
-    updated_task = queue_service.update_task(task_id, update_data)
+    queue_service = AsyncTaskQueueService(db)
+    updated_task = await queue_service.update_task(task_id, update_data)
     
     return updated_task
 
 
 @router.post("/tasks/{task_id}/cancel",
              status_code=status.HTTP_204_NO_CONTENT)
-def cancel_task(
+async def cancel_task(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Cancel a pending or running task."""
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
-    queue_service = TaskQueueService(db)
-    success = queue_service.cancel_task(task_id)
+    queue_service = AsyncTaskQueueService(db)
+    success = await queue_service.cancel_task(task_id)
     
     if not success:
         raise HTTPException(
@@ -205,18 +543,18 @@ def cancel_task(
 
 @router.post("/tasks/{task_id}/retry",
              response_model=InstanceTaskResponse)
-def retry_task(
+async def retry_task(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Retry a failed task."""
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
-    queue_service = TaskQueueService(db)
+    queue_service = AsyncTaskQueueService(db)
     
     try:
-        retried_task = queue_service.retry_task(task_id)
+        retried_task = await queue_service.retry_task(task_id)
         return retried_task
     except ValueError as e:
         raise HTTPException(
@@ -227,37 +565,16 @@ def retry_task(
 
 @router.post("/process-scheduled",
              include_in_schema=False)
-def trigger_scheduled_processing(
-    db: Session = Depends(get_db)
+async def trigger_scheduled_processing(
+    db: AsyncSession = Depends(get_db)
 ):
     """Manually trigger processing of scheduled tasks (admin endpoint)."""
-    queue_service = TaskQueueService(db)
-    count = queue_service.process_scheduled_tasks()
+    queue_service = AsyncTaskQueueService(db)
+    count = await queue_service.process_scheduled_tasks()
     
     return {"processed": count}
 
 
-def process_scheduled_tasks(db: Session):
-    """Background task to process scheduled tasks."""
-    try:
-        queue_service = TaskQueueService(db)
-        queue_service.process_scheduled_tasks()
-    except Exception as e:
-        print(f"Error processing scheduled tasks: {e}")
-
-
-# Register processors on import
-def register_task_processors():
-    """Register all task processors with the queue service."""
-    from src.tasks.processors.default_processor import DefaultTaskProcessor
-    from src.tasks.processors.content_creation_processor import ContentCreationProcessor
-    
-    # Register processors
-    TaskQueueService.register_processor('default', DefaultTaskProcessor)
-    TaskQueueService.register_processor('general', DefaultTaskProcessor)
-    TaskQueueService.register_processor('content_creation', ContentCreationProcessor)
-
-
 # Register processors when module is imported
 register_task_processors()
 
@@ -266,16 +583,23 @@ register_task_processors()
 
 @router.get("/tasks/{task_id}/detail",
             response_model=TaskDetailResponse)
-def get_task_detail(
+async def get_task_detail(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    steps_after_seq: int = Query(0, ge=0),
+    steps_limit: int = Query(DEFAULT_STEP_PAGE_SIZE, ge=1, le=MAX_STEP_PAGE_SIZE),
+    db: AsyncSession = Depends(get_read_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
-    """Get detailed task information including planning and execution logs."""
+    """Get detailed task information including planning and execution logs.
+    
+    Only one page of execution logs is included; ``next_steps_seq`` is set
+    while more steps follow.
+    """
     from src.models.instance import InstanceMedia
     
-    # Verify access and get task
-    task = verify_task_access(task_id, user_id, db)
+    # Verify access and get task; payloads of archived tasks are loaded back
+    task = await verify_task_access(task_id, user_id, db)
+    archived = await load_task_archive(db, task)
     
     # Build planning steps (mock data for now - will be from parsed_intent later)
     planning_steps = []
@@ -303,26 +627,20 @@ def get_task_detail(
                 )
             ]
     
-    # Convert execution_steps to logs
-    execution_logs = []
-    if task.execution_steps:
-        for step in task.execution_steps:
-            if isinstance(step, dict):
-                execution_logs.append(TaskExecutionLog(
-                    timestamp=step.get('timestamp', task.processing_started_at or task.created_at),
-                    agent_name=step.get('agent', 'System'),
-                    action=step.get('action', 'Processing'),
-                    status=step.get('status', 'info'),
-                    message=step.get('output', {}).get('message', '') if isinstance(step.get('output'), dict) else str(step.get('output', '')),
-                    details=step.get('output')
-                ))
+    # One page of execution logs; later pages come from /tasks/{id}/steps
+    default_timestamp = task.processing_started_at or task.created_at
+    step_records = await list_task_steps_async(db, task.id, steps_after_seq, steps_limit, archived)
+    execution_logs = [step_to_log(record, default_timestamp) for record in step_records]
+    next_steps_seq = None
+    if execution_logs and execution_logs[-1].seq < task.step_count:
+        next_steps_seq = execution_logs[-1].seq
     
     # Get attached media
     attached_media = []
     if task.attached_media_ids:
-        media_items = db.query(InstanceMedia).filter(
+        media_items = await db.scalars(select(InstanceMedia).where(
             InstanceMedia.id.in_(task.attached_media_ids)
-        ).all()
+        ))
         attached_media = [InstanceMediaResponse.model_validate(item) for item in media_items]
     
     # Extract suggested caption from output_data
@@ -342,6 +660,8 @@ def get_task_detail(
         priority=task.priority,
         planning=planning_steps,
         execution_logs=execution_logs,
+        total_steps=task.step_count,
+        next_steps_seq=next_steps_seq,
         output_format=task.output_format,
         output_data=task.output_data,
         output_media_ids=task.output_media_ids,
@@ -368,7 +688,7 @@ def get_task_detail(
 async def post_task_to_tiktok(
     task_id: UUID,
     post_request: TikTokPostRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Post task output video to TikTok."""
@@ -379,7 +699,7 @@ async def post_task_to_tiktok(
     import httpx
     
     # Verify access and get task
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
     # Check if task can be posted
     if not task.can_post_to_tiktok():
@@ -399,15 +719,15 @@ async def post_task_to_tiktok(
         )
     
     # Get TikTok credentials for the instance
-    query = db.query(InstanceTikTokCredentials).filter(
+    query = select(InstanceTikTokCredentials).where(
         InstanceTikTokCredentials.instance_id == task.instance_id
     )
     
     # If specific account requested, filter by it
     if post_request.account_id:
-        query = query.filter(InstanceTikTokCredentials.id == post_request.account_id)
+        query = query.where(InstanceTikTokCredentials.id == post_request.account_id)
     
-    credentials = query.first()
+    credentials = await db.scalar(query.limit(1))
     
     if not credentials:
         return TikTokPostResponse(
@@ -436,7 +756,7 @@ async def post_task_to_tiktok(
                     refreshed_tokens.get('refresh_expires_in', 0) + datetime.now(timezone.utc).timestamp(),
                     tz=timezone.utc
                 )
-            db.commit()
+            await db.commit()
         except Exception as e:
             return TikTokPostResponse(
                 success=False,
@@ -499,7 +819,7 @@ async def post_task_to_tiktok(
         if post_request.schedule_time:
             task.scheduled_post_time = post_request.schedule_time
         
-        db.commit()
+        await db.commit()
         
         return TikTokPostResponse(
             success=True,
@@ -520,7 +840,7 @@ async def post_task_to_tiktok(
                 pass
         
         task.update_tiktok_status(status="FAILED", error=error_msg)
-        db.commit()
+        await db.commit()
         
         return TikTokPostResponse(
             success=False,
@@ -531,7 +851,7 @@ async def post_task_to_tiktok(
     
     except Exception as e:
         task.update_tiktok_status(status="FAILED", error=str(e))
-        db.commit()
+        await db.commit()
         
         return TikTokPostResponse(
             success=False,
@@ -545,7 +865,7 @@ async def post_task_to_tiktok(
             response_model=TikTokPostStatusResponse)
 async def get_tiktok_post_status(
     task_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     user_id: UUID = Depends(get_current_user_id)
 ):
     """Check the status of a TikTok post."""
@@ -554,7 +874,7 @@ async def get_tiktok_post_status(
     from datetime import timezone
     
     # Verify access and get task
-    task = verify_task_access(task_id, user_id, db)
+    task = await verify_task_access(task_id, user_id, db)
     
     # Check if task has been posted
     if not task.tiktok_publish_id:
@@ -568,14 +888,14 @@ async def get_tiktok_post_status(
     if task.tiktok_post_data and isinstance(task.tiktok_post_data, dict):
         account_id = task.tiktok_post_data.get('request', {}).get('account_id')
     
-    query = db.query(InstanceTikTokCredentials).filter(
+    query = select(InstanceTikTokCredentials).where(
         InstanceTikTokCredentials.instance_id == task.instance_id
     )
     
     if account_id:
-        query = query.filter(InstanceTikTokCredentials.id == UUID(account_id))
+        query = query.where(InstanceTikTokCredentials.id == UUID(account_id))
     
-    credentials = query.first()
+    credentials = await db.scalar(query.limit(1))
     
     if not credentials:
         raise HTTPException(
@@ -609,7 +929,7 @@ async def get_tiktok_post_status(
                 status="PUBLISHED",
                 post_url=post_url
             )
-            db.commit()
+            await db.commit()
         
         elif tiktok_status == 'FAILED':
             fail_reason = status_result.get('fail_reason', 'Unknown error')
@@ -617,7 +937,7 @@ async def get_tiktok_post_status(
                 status="FAILED",
                 error=fail_reason
             )
-            db.commit()
+            await db.commit()
         
         return TikTokPostStatusResponse(
             publish_id=task.tiktok_publish_id,
@@ -5,7 +5,7 @@ from uuid import UUID
 from typing import Optional
 from datetime import datetime, timedelta, timezone
 
-from src.api.deps import get_current_user, get_db
+from src.api.deps import get_current_user, get_db, get_read_db
 from src.models.user import User
 from src.services.tiktok.oauth import TikTokOAuthService
 from src.services.tiktok.content_api import TikTokContentService
@@ -126,10 +126,13 @@ async def handle_callback(
 async def get_accounts(
     instance_id: UUID,
     current_user: User = Depends(get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get all TikTok accounts connected to an instance.
+    
+    Accounts are read from a replica; a primary session is only opened when
+    expired tokens have to be refreshed.
     """
     from src.models.tiktok_credentials import InstanceTikTokCredentials
     from sqlalchemy import select
@@ -147,34 +150,41 @@ async def get_accounts(
     if not all_credentials:
         return []
     
-    # Check each account and refresh if needed
+    # Refreshes are loaded and written on the primary
+    expired = [
+        credentials for credentials in all_credentials
+        if credentials.is_active == "active" and credentials.is_access_token_expired
+    ]
+    refreshed = {}
+    if expired:
+        async for write_db in get_db(current_user.id):
+            for stale in expired:
+                credentials = await write_db.get(InstanceTikTokCredentials, stale.id)
+                refreshed[stale.id] = credentials
+                if credentials is None:
+                    continue
+                # Try to refresh token
+                try:
+                    async with TikTokOAuthService() as service:
+                        token_response = await service.refresh_access_token(credentials.refresh_token)
+                        
+                        # Update credentials
+                        credentials.access_token = token_response.access_token
+                        credentials.refresh_token = token_response.refresh_token
+                        credentials.access_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=token_response.expires_in)
+                        credentials.refresh_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=token_response.refresh_expires_in)
+                        
+                        await write_db.commit()
+                except Exception:
+                    # If refresh fails, mark as inactive
+                    credentials.is_active = "expired"
+                    await write_db.commit()
+    
     accounts = []
     for credentials in all_credentials:
-        # Skip inactive accounts
-        if credentials.is_active != "active":
+        credentials = refreshed.get(credentials.id, credentials)
+        if credentials is not None:
             accounts.append(credentials.to_dict())
-            continue
-            
-        # Check if token is expired
-        if credentials.is_access_token_expired:
-            # Try to refresh token
-            try:
-                async with TikTokOAuthService() as service:
-                    token_response = await service.refresh_access_token(credentials.refresh_token)
-                    
-                    # Update credentials
-                    credentials.access_token = token_response.access_token
-                    credentials.refresh_token = token_response.refresh_token
-                    credentials.access_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=token_response.expires_in)
-                    credentials.refresh_token_expires_at = datetime.now(timezone.utc) + timedelta(seconds=token_response.refresh_expires_in)
-                    
-                    await db.commit()
-            except Exception:
-                # If refresh fails, mark as inactive
-                credentials.is_active = "expired"
-                await db.commit()
-        
-        accounts.append(credentials.to_dict())
     
     return accounts
 
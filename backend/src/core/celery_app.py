@@ -1,8 +1,14 @@
 """Celery application configuration and initialization."""
 from celery import Celery
+from celery.signals import task_postrun, task_prerun, worker_process_init
 from kombu import Queue
 
 from src.core.config import get_settings
+from src.core.engines import get_engine_registry
+from src.core.query_stats import TASK, begin_unit, end_unit
+
+# Query tracking tokens of the tasks running in this worker, by task id
+_query_units = {}
 
 
 def create_celery_app() -> Celery:
@@ -52,4 +58,24 @@ def create_celery_app() -> Celery:
 
 
 # Create global Celery instance
-celery_app = create_celery_app()
\ No newline at end of file
+celery_app = create_celery_app()
+
+
+@task_prerun.connect
+def _begin_task_queries(task_id=None, task=None, **kwargs):
+    """Count the SQL statements of each task as one unit of work."""
+    _query_units[task_id] = begin_unit(TASK, task.name if task else "")
+
+
+@task_postrun.connect
+def _end_task_queries(task_id=None, **kwargs):
+    token = _query_units.pop(task_id, None)
+    if token is not None:
+        end_unit(token)
+
+
+@worker_process_init.connect
+def _resolve_connection_modes(**kwargs):
+    """Detect database connection modes before the first task needs an engine."""
+    if get_settings().database_url:
+        get_engine_registry().resolve_connection_modes()
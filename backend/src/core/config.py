@@ -23,6 +23,16 @@ class Settings(BaseSettings):
     
     # Redis Configuration
     redis_url: str = "redis://localhost:6379"
+    socketio_channel: str = "swallowtail:socketio"  # Pub/sub channel shared by API servers and workers
+    socketio_serializer: str = "default"  # "msgpack" for binary packets (needs the msgpack extra)
+    websocket_task_emit_rate: float = 4.0  # Max emits per second per task (0 = unlimited)
+    websocket_room_emit_rate: float = 20.0  # Max emits per second per instance room (0 = unlimited)
+    websocket_flush_interval_seconds: float = 0.1  # How often held-back events are checked
+    websocket_replica_ttl_seconds: int = 60  # Subscriber counts of a silent API replica expire after this
+    task_event_stream_maxlen: int = 1000  # Events kept per instance for replay
+    task_event_stream_max_age_seconds: int = 60 * 60
+    task_event_replay_limit: int = 200  # Events replayed per resubscribe
+    sse_keepalive_seconds: float = 15.0  # Comment sent on idle task event streams
     
     # API Configuration
     api_host: str = "0.0.0.0"
@@ -47,6 +57,15 @@ class Settings(BaseSettings):
     # Database Configuration
     database_url: Optional[str] = None
     database_session_pooler_url: Optional[str] = None  # Session pooler for migrations
+    db_connection_budget: int = 30  # Server connections one process may hold across all engines
+    db_async_pool_weight: int = 3  # Share of the budget for the async (API) engine
+    db_sync_pool_weight: int = 1  # Share of the budget for the sync (Celery) engine
+    db_connection_mode: str = "auto"  # direct, session_pooler, transaction_pooler or prepared_transaction_pooler
+    db_statement_cache_size: int = 100  # Prepared statements cached per connection when the mode allows it
+    database_replica_urls: Optional[str] = None  # Comma-separated read replicas for read-only endpoints
+    read_your_writes_seconds: float = 5.0  # Reads of a user stay on the primary this long after their writes
+    task_partition_months_ahead: int = 3  # Monthly instance_tasks partitions created ahead of time
+    db_n_plus_one_threshold: int = 10  # Warn when one statement shape runs more often in a request or task (0 = off)
     supabase_url: Optional[str] = None
     supabase_anon_key: Optional[str] = None
     supabase_service_key: Optional[str] = None
@@ -60,6 +79,41 @@ class Settings(BaseSettings):
     # Encryption key for token storage
     encryption_key: Optional[str] = None
     
+    # Task Scheduler Configuration
+    scheduler_poll_interval_seconds: float = 0.25
+    recurrence_lookahead: int = 3  # Occurrences materialized ahead per recurring series
+    concurrency_slot_lease_seconds: int = 2 * 60 * 60  # Covers time limit plus retry backoff
+    # Tasks published to each Celery queue at once, cluster-wide: set it to the
+    # total worker processes consuming a queue (default: one worker's concurrency)
+    fair_share_in_flight_per_queue: Optional[int] = None
+    fair_share_lease_seconds: Optional[int] = None  # In-flight budget of a lost task is reclaimed after this (default: task time limit + 5 min)
+    queued_task_reconcile_after_seconds: int = 10 * 60  # QUEUED tasks missing from Redis this long are dispatched again
+    fair_share_wait_samples: int = 1000  # Wait times kept per instance for percentiles
+    progress_flush_max_steps: int = 20  # Buffered execution steps per write
+    progress_flush_interval_seconds: float = 2.0  # Max age of buffered progress before a write
+    
+    # Task Archiving
+    task_archive_after_days: int = 30  # Finished tasks untouched this long move to cold storage (0 = never)
+    task_archive_batch_size: int = 200  # Tasks archived per transaction
+    
+    # Task Change Feeds
+    task_change_overlap_seconds: float = 5.0  # Recent changes a caught-up change cursor returns again
+    task_tombstone_retention_days: int = 7  # Older change cursors must re-list all tasks
+    
+    # Duplicate Submission Protection
+    idempotency_key_ttl_seconds: int = 24 * 60 * 60
+    idempotency_pending_ttl_seconds: int = 60  # Reservation while the task is being created
+    task_dedup_window_seconds: int = 0  # Collapse identical submissions (0 = only Idempotency-Key)
+    
+    # Access Authorization
+    access_cache_ttl_seconds: float = 30.0  # Granted instance/task access is re-checked after this
+    access_cache_size: int = 10000
+    
+    # Intent Classification
+    intent_llm_fallback_enabled: bool = False  # Ask the LLM when no keyword rule matches
+    intent_cache_size: int = 4096
+    intent_cache_ttl_seconds: int = 24 * 60 * 60
+    
     # Agent Configuration
     max_agent_iterations: int = 10
     agent_timeout_seconds: int = 300
@@ -87,6 +141,13 @@ class Settings(BaseSettings):
         # Otherwise, split by comma
         return [origin.strip() for origin in self.cors_origins.split(',')]
     
+    @property
+    def database_replica_urls_list(self) -> list[str]:
+        """Get read replica URLs as a list."""
+        if not self.database_replica_urls:
+            return []
+        return [url.strip() for url in self.database_replica_urls.split(',') if url.strip()]
+    
     @property
     def is_production(self) -> bool:
         """Check if running in production environment."""
@@ -1,15 +1,21 @@
-"""Database configuration and connection management."""
+"""Database configuration and connection management.
+
+Engines come from the process-wide :class:`~src.core.engines.EngineRegistry`
+and are only created on first use, so a process that never touches one of
+them never reserves its share of connections. ``engine``, ``sync_engine``,
+``AsyncSessionLocal`` and ``SessionLocal`` are resolved lazily as module
+attributes.
+"""
 
-import os
-import ssl
 import logging
+from functools import lru_cache
 from typing import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker, Session
 
 from src.core.config import get_settings
+from src.core.engines import async_database_url, get_engine_registry
 
 logger = logging.getLogger(__name__)
 
@@ -20,80 +26,50 @@ settings = get_settings()
 if not settings.database_url:
     raise ValueError("DATABASE_URL is required")
 
-DATABASE_URL = settings.database_url.replace("postgresql://", "postgresql+asyncpg://")
+DATABASE_URL = async_database_url(settings.database_url)
 logger.info("Using transaction pooler connection (PgBouncer port 6543)")
 
-# PgBouncer requires specific settings to work properly
-# Solution from SQLAlchemy GitHub issue #6467 and Stack Overflow
-from uuid import uuid4
-
-connect_args = {
-    "ssl": "require",  # Supabase requires SSL
-    "statement_cache_size": 0,  # Critical: Must be 0 for PgBouncer
-    # Generate unique statement names to avoid conflicts with PgBouncer
-    "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
-    "command_timeout": 60,
-    "server_settings": {
-        "jit": "off",  # Helps with PgBouncer compatibility
-        "application_name": "swallowtail_backend"
-    }
-}
-
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-    connect_args=connect_args,
-    # Additional settings for PgBouncer compatibility
-    pool_recycle=3600,  # Recycle connections after 1 hour
-    pool_timeout=30,  # Timeout for getting connection from pool
-)
-
-# Create async session factory
-AsyncSessionLocal = async_sessionmaker(
-    engine, 
-    class_=AsyncSession, 
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
-)
-
 # Create base class for declarative models
 Base = declarative_base()
 
-# Create synchronous engine for Celery tasks
-# Always use transaction pooler - direct connections don't work on Railway
-sync_database_url = settings.database_url
 
-# For sync engine with psycopg2, we need different connection args
-sync_connect_args = {
-    "sslmode": "require",
-    "options": "-c statement_timeout=30000 -c idle_in_transaction_session_timeout=60000"
+@lru_cache()
+def _async_session_factory() -> async_sessionmaker:
+    return async_sessionmaker(
+        get_engine_registry().async_engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
+@lru_cache()
+def _sync_session_factory() -> sessionmaker:
+    return sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=get_engine_registry().sync_engine
+    )
+
+
+_LAZY_ATTRIBUTES = {
+    "engine": lambda: get_engine_registry().async_engine,
+    "sync_engine": lambda: get_engine_registry().sync_engine,
+    "AsyncSessionLocal": _async_session_factory,
+    "SessionLocal": _sync_session_factory,
 }
 
-sync_engine = create_engine(
-    sync_database_url,
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
-    connect_args=sync_connect_args,
-    pool_recycle=3600,
-)
 
-# Create synchronous session factory
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=sync_engine
-)
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
     """Dependency to get database session."""
-    async with AsyncSessionLocal() as session:
+    async with _async_session_factory()() as session:
         try:
             yield session
         finally:
@@ -102,19 +78,19 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
 
 async def init_db() -> None:
     """Initialize database by creating all tables."""
-    async with engine.begin() as conn:
+    async with get_engine_registry().async_engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
 
 async def close_db() -> None:
     """Close database connections."""
-    await engine.dispose()
+    await get_engine_registry().dispose()
 
 
 def get_session() -> Generator[Session, None, None]:
     """Get synchronous database session for Celery tasks."""
-    db = SessionLocal()
+    db = _sync_session_factory()()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,379 @@
+"""Process-wide registry of database engines sharing one connection budget."""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from src.core.config import Settings, get_settings
+from src.core.query_stats import instrument_engine
+
+logger = logging.getLogger(__name__)
+
+ASYNC = "async"
+SYNC = "sync"
+REPLICA = "replica"  # Kinds of replica engines are "replica_<index>"
+
+# Where the engine's connections end up (DB_CONNECTION_MODE)
+DIRECT = "direct"
+SESSION_POOLER = "session_pooler"
+TRANSACTION_POOLER = "transaction_pooler"
+# PgBouncer >= 1.21 with max_prepared_statements, which keeps track of
+# prepared statements across server connections
+PREPARED_TRANSACTION_POOLER = "prepared_transaction_pooler"
+CONNECTION_MODES = (DIRECT, SESSION_POOLER, TRANSACTION_POOLER, PREPARED_TRANSACTION_POOLER)
+
+# Supabase's transaction pooler and PgBouncer's default port
+_TRANSACTION_POOLER_PORTS = {6543, 6432}
+# Poolers known not to be PgBouncer (Supabase runs Supavisor); never probed
+_NON_PGBOUNCER_POOLER_HOSTS = (".pooler.supabase.com",)
+
+
+@dataclass
+class PoolMetrics:
+    """Checkout counters of one pool since the engine was created."""
+    checkouts: int = 0
+    waits: int = 0  # Checkouts that found every connection in use
+    timeouts: int = 0
+    checkout_seconds_total: float = 0.0
+    checkout_seconds_max: float = 0.0
+
+    def __post_init__(self):
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, waited: bool, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if waited:
+                self.waits += 1
+            self.checkout_seconds_total += seconds
+            self.checkout_seconds_max = max(self.checkout_seconds_max, seconds)
+
+
+class _MeteredPoolMixin:
+    """Times every checkout, including waits for a free connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = PoolMetrics()
+
+    def connect(self):
+        waited = self.checkedout() >= self.size() + self._max_overflow
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record(time.perf_counter() - started, waited, timed_out=True)
+            raise
+        self.metrics.record(time.perf_counter() - started, waited)
+        return connection
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+
+class MeteredAsyncQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_stats(pool: QueuePool) -> Dict[str, Any]:
+    """Capacity, usage and checkout metrics of a metered pool."""
+    metrics: PoolMetrics = pool.metrics
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": pool._max_overflow,
+        "checked_out": pool.checkedout(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": metrics.checkouts,
+        "waits": metrics.waits,
+        "timeouts": metrics.timeouts,
+        "checkout_seconds_avg": (
+            metrics.checkout_seconds_total / metrics.checkouts if metrics.checkouts else 0.0
+        ),
+        "checkout_seconds_max": metrics.checkout_seconds_max,
+    }
+
+
+def pgbouncer_tracks_prepared_statements(database_url: str) -> bool:
+    """Whether the server behind ``database_url`` is PgBouncer with
+    ``max_prepared_statements`` enabled.
+
+    Reads ``SHOW CONFIG`` from the PgBouncer admin console, which needs the
+    user to be in ``stats_users`` or ``admin_users``. Anything else,
+    including poolers that are not PgBouncer, counts as no.
+    """
+    import psycopg2
+
+    url = make_url(database_url)
+    try:
+        connection = psycopg2.connect(
+            host=url.host,
+            port=url.port,
+            user=url.username,
+            password=url.password,
+            dbname="pgbouncer",
+            connect_timeout=3,
+        )
+    except psycopg2.Error as e:
+        logger.info(f"PgBouncer admin console not reachable, assuming no prepared statement support: {e}")
+        return False
+    try:
+        # The admin console rejects BEGIN
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute("SHOW CONFIG")
+            config = {row[0]: row[1] for row in cursor.fetchall()}
+    except psycopg2.Error as e:
+        logger.info(f"Could not read the PgBouncer config: {e}")
+        return False
+    finally:
+        connection.close()
+    # The setting only exists from PgBouncer 1.21 on
+    return int(config.get("max_prepared_statements") or 0) > 0
+
+
+def detect_connection_mode(database_url: str) -> str:
+    """Guess the connection mode of a URL.
+
+    Ports 6543 and 6432 are transaction poolers, which only support
+    prepared statements when PgBouncer tracks them; Supabase's pooler is not
+    PgBouncer and is not probed. Other ports on a
+    ``pooler`` host are session poolers; anything else is direct.
+    """
+    url = make_url(database_url)
+    if url.port in _TRANSACTION_POOLER_PORTS:
+        if (url.host or "").endswith(_NON_PGBOUNCER_POOLER_HOSTS):
+            return TRANSACTION_POOLER
+        if pgbouncer_tracks_prepared_statements(database_url):
+            return PREPARED_TRANSACTION_POOLER
+        return TRANSACTION_POOLER
+    if "pooler" in (url.host or ""):
+        return SESSION_POOLER
+    return DIRECT
+
+
+class EngineRegistry:
+    """Creates the async and sync engines on first use and shares them.
+
+    A process may hold at most ``db_connection_budget`` server connections
+    across all of its engines. The budget is split by the
+    ``db_async_pool_weight`` and ``db_sync_pool_weight`` settings, so
+    Celery workers, which only use the sync engine, can give it the whole
+    budget with ``DB_ASYNC_POOL_WEIGHT=0``. Half of each share is kept open
+    and the rest is overflow closed when returned.
+
+    asyncpg's statement cache is only enabled when the connection mode
+    allows it: a plain transaction pooler hands every transaction a
+    different server connection, where the cached statements do not exist.
+
+    Read replicas are separate servers, so each replica engine gets the
+    async engine's limits on top of the budget.
+
+    Every engine is instrumented by ``src.core.query_stats``.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        if not self.settings.database_url:
+            raise ValueError("DATABASE_URL is required")
+        if self.settings.db_connection_mode not in ("auto",) + CONNECTION_MODES:
+            raise ValueError(f"Unknown DB_CONNECTION_MODE {self.settings.db_connection_mode!r}")
+        self._engines: Dict[str, Any] = {}
+        self._connection_modes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._mode_lock = threading.Lock()  # Engines are created under _lock and need the mode
+
+    @property
+    def connection_mode(self) -> str:
+        """Connection mode of the primary."""
+        return self.connection_mode_for(self.settings.database_url)
+
+    def connection_mode_for(self, database_url: str) -> str:
+        """Configured connection mode, detected from the URL for ``auto``.
+
+        Detection may connect to the PgBouncer admin console, which blocks;
+        ``resolve_connection_modes`` does it once at startup instead of on
+        the first request.
+        """
+        mode = self._connection_modes.get(database_url)
+        if mode is None:
+            with self._mode_lock:
+                mode = self._connection_modes.get(database_url)
+                if mode is None:
+                    mode = self.settings.db_connection_mode
+                    if mode == "auto":
+                        mode = detect_connection_mode(database_url)
+                        logger.info(f"Detected database connection mode of {make_url(database_url).host}: {mode}")
+                    self._connection_modes[database_url] = mode
+        return mode
+
+    def resolve_connection_modes(self) -> Dict[str, str]:
+        """Detect the connection mode of the primary and every replica.
+
+        Blocking; call it at process startup, off the event loop.
+        """
+        urls = [self.settings.database_url] + self.settings.database_replica_urls_list
+        return {url: self.connection_mode_for(url) for url in urls}
+
+    @property
+    def statement_cache_enabled(self) -> bool:
+        """Whether the primary's async engine caches prepared statements."""
+        return self.statement_cache_for(self.settings.database_url)
+
+    def statement_cache_for(self, database_url: str) -> bool:
+        return self.connection_mode_for(database_url) != TRANSACTION_POOLER and self.settings.db_statement_cache_size > 0
+
+    @property
+    def budget(self) -> int:
+        return self.settings.db_connection_budget
+
+    def pool_limits(self, kind: str) -> Tuple[int, int]:
+        """``(pool_size, max_overflow)`` of an engine kind."""
+        weights = {ASYNC: self.settings.db_async_pool_weight, SYNC: self.settings.db_sync_pool_weight}
+        total = sum(weights.values()) or 1
+        share = max(1, self.budget * weights[kind] // total)
+        pool_size = max(1, share // 2)
+        return pool_size, share - pool_size
+
+    @property
+    def async_engine(self) -> AsyncEngine:
+        """Engine of the API (asyncpg through the transaction pooler)."""
+        return self._get(ASYNC, self.build_async_engine)
+
+    @property
+    def sync_engine(self) -> Engine:
+        """Engine of Celery tasks and other blocking code (psycopg2)."""
+        return self._get(SYNC, self._create_sync_engine)
+
+    @property
+    def replica_engines(self) -> List[AsyncEngine]:
+        """Async engines of the configured read replicas, if any."""
+        return [
+            self._get(f"{REPLICA}_{index}", lambda url=url: self.build_async_engine(database_url=url))
+            for index, url in enumerate(self.settings.database_replica_urls_list)
+        ]
+
+    def _get(self, kind: str, factory):
+        engine = self._engines.get(kind)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(kind)
+                if engine is None:
+                    engine = factory()
+                    instrument_engine(engine)
+                    self._engines[kind] = engine
+        return engine
+
+    def build_async_engine(
+        self,
+        database_url: Optional[str] = None,
+        statement_cache: Optional[bool] = None
+    ) -> AsyncEngine:
+        """A new async engine with this process's share of the budget.
+
+        Connects to the primary unless ``database_url`` is given.
+        ``statement_cache`` overrides the connection mode, for benchmarks.
+        """
+        database_url = database_url or self.settings.database_url
+        if statement_cache is None:
+            statement_cache = self.statement_cache_for(database_url)
+        pool_size, max_overflow = self.pool_limits(ASYNC)
+        database_url = make_url(async_database_url(database_url))
+        connect_args = {
+            "ssl": "require",  # Supabase requires SSL
+            "command_timeout": 60,
+            "server_settings": {
+                "jit": "off",  # Helps with PgBouncer compatibility
+                "application_name": "swallowtail_backend"
+            }
+        }
+        if statement_cache:
+            cache_size = self.settings.db_statement_cache_size
+            connect_args["statement_cache_size"] = cache_size
+            database_url = database_url.update_query_dict({"prepared_statement_cache_size": str(cache_size)})
+        else:
+            # PgBouncer requires specific settings to work properly
+            # Solution from SQLAlchemy GitHub issue #6467 and Stack Overflow
+            connect_args["statement_cache_size"] = 0  # Critical: Must be 0 for PgBouncer
+            # Generate unique statement names to avoid conflicts with PgBouncer
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+        return create_async_engine(
+            database_url,
+            echo=self.settings.debug,
+            poolclass=MeteredAsyncQueuePool,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            connect_args=connect_args,
+            pool_recycle=3600,  # Recycle connections after 1 hour
+            pool_timeout=30,  # Timeout for getting connection from pool
+        )
+
+    def _create_sync_engine(self) -> Engine:
+        pool_size, max_overflow = self.pool_limits(SYNC)
+        # For sync engine with psycopg2, we need different connection args
+        connect_args = {
+            "sslmode": "require",
+            "options": "-c statement_timeout=30000 -c idle_in_transaction_session_timeout=60000"
+        }
+        return create_engine(
+            self.settings.database_url,
+            echo=self.settings.debug,
+            poolclass=MeteredQueuePool,
+            pool_pre_ping=True,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            connect_args=connect_args,
+            pool_recycle=3600,
+        )
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Pool stats of the engines created so far, by kind."""
+        stats = {}
+        for kind, engine in list(self._engines.items()):
+            pool = engine.sync_engine.pool if isinstance(engine, AsyncEngine) else engine.pool
+            stats[kind] = pool_stats(pool)
+        return stats
+
+    async def dispose(self):
+        """Close every pooled connection; engines reconnect on next use."""
+        for engine in list(self._engines.values()):
+            if isinstance(engine, AsyncEngine):
+                await engine.dispose()
+            else:
+                engine.dispose()
+
+
+def async_database_url(database_url: str) -> str:
+    """Database URL with the asyncpg driver."""
+    return database_url.replace("postgresql://", "postgresql+asyncpg://")
+
+
+_registry: Optional[EngineRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_engine_registry() -> EngineRegistry:
+    """Get the process-wide engine registry, created on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = EngineRegistry()
+    return _registry
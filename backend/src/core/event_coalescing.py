@@ -0,0 +1,180 @@
+"""Coalescing and rate limiting of task events sent to Socket.IO rooms."""
+
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import get_settings
+
+# InstanceTaskStatus values after which a task emits nothing more
+TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled", "rejected"})
+
+# (event name, room, payload)
+Event = Tuple[str, str, Dict[str, Any]]
+
+# Forget idle tasks that never reported a terminal status after this long
+_IDLE_TASK_SECONDS = 300.0
+
+
+def instance_room(instance_id: str) -> str:
+    """Room of the clients subscribed to an instance."""
+    return f"instance_{instance_id}"
+
+
+def task_update_event(instance_id: str, task_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of a task_update event."""
+    return {
+        'instance_id': instance_id,
+        'task_id': task_id,
+        'type': 'task_update',
+        'data': update_data
+    }
+
+
+def execution_step_event(instance_id: str, task_id: str, step: Dict[str, Any]) -> Dict[str, Any]:
+    """Payload of an execution_step event."""
+    return {
+        'instance_id': instance_id,
+        'task_id': task_id,
+        'type': 'execution_step',
+        'data': step
+    }
+
+
+def execution_steps_event(instance_id: str, task_id: str, steps: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Payload of an execution_steps event carrying a batch of steps."""
+    return {
+        'instance_id': instance_id,
+        'task_id': task_id,
+        'type': 'execution_steps',
+        'data': steps
+    }
+
+
+@dataclass
+class _PendingTask:
+    """Events of one task held back by the rate limits."""
+    instance_id: str
+    update: Dict[str, Any] = field(default_factory=dict)
+    steps: List[Dict[str, Any]] = field(default_factory=list)
+    last_emit: float = float("-inf")
+
+    @property
+    def pending(self) -> bool:
+        return bool(self.update) or bool(self.steps)
+
+
+class TaskEventCoalescer:
+    """Decides which task events to emit now and merges the rest.
+
+    Each task emits at most ``task_rate`` times per second and each room at
+    most ``room_rate`` times per second (token bucket with a one-second
+    burst). Held-back task updates are merged key by key, so only the latest
+    progress survives, and held-back steps are sent together as one
+    ``execution_steps`` event. A terminal status drains the task immediately,
+    ignoring both limits. A rate of 0 disables that limit.
+
+    Methods return the events to emit; ``flush_due`` must be called
+    periodically to send what was held back.
+    """
+
+    def __init__(
+        self,
+        task_rate: Optional[float] = None,
+        room_rate: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        settings = get_settings()
+        self.task_rate = settings.websocket_task_emit_rate if task_rate is None else task_rate
+        self.room_rate = settings.websocket_room_emit_rate if room_rate is None else room_rate
+        self._clock = clock
+        self._tasks: Dict[str, _PendingTask] = {}
+        self._room_tokens: Dict[str, Tuple[float, float]] = {}  # room -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> bool:
+        """Whether any events are being held back."""
+        return any(task.pending for task in self._tasks.values())
+
+    def add_update(self, instance_id: str, task_id: str, update_data: Dict[str, Any]) -> List[Event]:
+        """Submit a task_update; returns the events to emit now."""
+        with self._lock:
+            task = self._task(instance_id, task_id)
+            task.update.update(update_data)
+            if update_data.get('status') in TERMINAL_STATUSES:
+                events = self._drain(task_id, task, self._clock())
+                del self._tasks[task_id]
+                return events
+            return self._emit_if_due(task_id, task, self._clock())
+
+    def add_step(self, instance_id: str, task_id: str, step: Dict[str, Any]) -> List[Event]:
+        """Submit an execution step; returns the events to emit now."""
+        with self._lock:
+            task = self._task(instance_id, task_id)
+            task.steps.append(step)
+            return self._emit_if_due(task_id, task, self._clock())
+
+    def flush_due(self) -> List[Event]:
+        """Events of tasks whose rate limits allow emitting again."""
+        events: List[Event] = []
+        with self._lock:
+            now = self._clock()
+            for task_id, task in list(self._tasks.items()):
+                if task.pending:
+                    events.extend(self._emit_if_due(task_id, task, now))
+                elif now - task.last_emit > _IDLE_TASK_SECONDS:
+                    del self._tasks[task_id]
+        return events
+
+    def flush(self, task_id: Optional[str] = None) -> List[Event]:
+        """Drain one task, or every task, regardless of the rate limits."""
+        events: List[Event] = []
+        with self._lock:
+            now = self._clock()
+            task_ids = [task_id] if task_id else list(self._tasks)
+            for pending_id in task_ids:
+                task = self._tasks.pop(pending_id, None)
+                if task:
+                    events.extend(self._drain(pending_id, task, now))
+        return events
+
+    def _task(self, instance_id: str, task_id: str) -> _PendingTask:
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = self._tasks[task_id] = _PendingTask(instance_id)
+        return task
+
+    def _emit_if_due(self, task_id: str, task: _PendingTask, now: float) -> List[Event]:
+        if self.task_rate > 0 and now - task.last_emit < 1.0 / self.task_rate:
+            return []
+        if not self._take_room_token(instance_room(task.instance_id), now):
+            return []
+        return self._drain(task_id, task, now)
+
+    def _take_room_token(self, room: str, now: float) -> bool:
+        if self.room_rate <= 0:
+            return True
+        burst = max(1.0, self.room_rate)
+        tokens, updated_at = self._room_tokens.get(room, (burst, now))
+        tokens = min(burst, tokens + (now - updated_at) * self.room_rate)
+        if tokens < 1:
+            self._room_tokens[room] = (tokens, now)
+            return False
+        self._room_tokens[room] = (tokens - 1, now)
+        return True
+
+    def _drain(self, task_id: str, task: _PendingTask, now: float) -> List[Event]:
+        room = instance_room(task.instance_id)
+        events: List[Event] = []
+        if len(task.steps) == 1:
+            events.append(('execution_step', room, execution_step_event(task.instance_id, task_id, task.steps[0])))
+        elif task.steps:
+            events.append(('execution_steps', room, execution_steps_event(task.instance_id, task_id, task.steps)))
+        if task.update:
+            events.append(('task_update', room, task_update_event(task.instance_id, task_id, task.update)))
+        task.steps = []
+        task.update = {}
+        task.last_emit = now
+        return events
@@ -0,0 +1,173 @@
+"""Per-instance Redis Streams of task events for replay after reconnects."""
+
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import redis
+import redis.asyncio as aioredis
+
+from src.core.config import get_settings
+
+# KEYS: stream, sequence counter
+# ARGV: maxlen, event name, JSON payload, min entry id, stream TTL
+# Returns the event's sequence number and stream entry id.
+_APPEND_SCRIPT = """
+local seq = redis.call('INCR', KEYS[2])
+local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'seq', seq, 'event', ARGV[2], 'data', ARGV[3])
+redis.call('XTRIM', KEYS[1], 'MINID', '~', ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return {seq, id}
+"""
+
+# (seq, event name, payload)
+StreamEvent = Tuple[int, str, Dict[str, Any]]
+
+
+def entry_timestamp(entry_id: str) -> int:
+    """Milliseconds part of a stream entry id; never decreases within a stream."""
+    return int(entry_id.split('-', 1)[0])
+
+
+def _parse_entry(entry_id: str, fields: Dict[str, str]) -> StreamEvent:
+    data = json.loads(fields['data'])
+    data['ts'] = entry_timestamp(entry_id)
+    return int(fields['seq']), fields['event'], data
+
+
+class _EventStreamBase:
+    """Key layout, append arguments and replay parsing shared by both clients.
+
+    Events of an instance get consecutive sequence numbers from a counter
+    that outlives the stream, so numbers never repeat even after the stream
+    expires. Streams are capped at ``maxlen`` entries and ``max_age``
+    seconds.
+    """
+
+    def __init__(self, maxlen: Optional[int] = None, max_age: Optional[int] = None):
+        settings = get_settings()
+        self.maxlen = maxlen or settings.task_event_stream_maxlen
+        self.max_age = max_age or settings.task_event_stream_max_age_seconds
+        self.replay_limit = settings.task_event_replay_limit
+        self.namespace = "swallowtail:events:"
+
+    def keys_for(self, instance_id: str) -> List[str]:
+        return [f"{self.namespace}{instance_id}", f"{self.namespace}{instance_id}:seq"]
+
+    def _append_args(self, event: str, data: Dict[str, Any]) -> List[Any]:
+        min_id = int((time.time() - self.max_age) * 1000)
+        return [self.maxlen, event, json.dumps(data, default=str), min_id, self.max_age]
+
+    @staticmethod
+    def _parse_replay(
+        entries: Sequence[Tuple[str, Dict[str, str]]],
+        current_seq: Optional[str],
+        last_seq: int
+    ) -> Tuple[List[StreamEvent], bool]:
+        """Events newer than ``last_seq`` oldest first, and whether none are missing."""
+        events: List[StreamEvent] = []
+        for entry_id, fields in entries:
+            if int(fields['seq']) <= last_seq:
+                break
+            events.append(_parse_entry(entry_id, fields))
+        events.reverse()
+        if events:
+            complete = events[0][0] == last_seq + 1
+        else:
+            complete = int(current_seq or 0) <= last_seq
+        return events, complete
+
+
+class TaskEventStream(_EventStreamBase):
+    """Synchronous stream writer for processes without an event loop."""
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis_client or redis.from_url(get_settings().redis_url, decode_responses=True)
+        self._append_script = self.redis.register_script(_APPEND_SCRIPT)
+
+    def append(self, instance_id: str, event: str, data: Dict[str, Any]) -> Tuple[int, int]:
+        """Record an event; returns its sequence number and timestamp in ms."""
+        seq, entry_id = self._append_script(keys=self.keys_for(instance_id), args=self._append_args(event, data))
+        return int(seq), entry_timestamp(entry_id)
+
+
+class AsyncTaskEventStream(_EventStreamBase):
+    """Stream writer and reader for the API processes."""
+
+    def __init__(self, redis_client: Optional[aioredis.Redis] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = redis_client or aioredis.from_url(get_settings().redis_url, decode_responses=True)
+        self._append_script = self.redis.register_script(_APPEND_SCRIPT)
+
+    async def append(self, instance_id: str, event: str, data: Dict[str, Any]) -> Tuple[int, int]:
+        """Record an event; returns its sequence number and timestamp in ms."""
+        seq, entry_id = await self._append_script(keys=self.keys_for(instance_id), args=self._append_args(event, data))
+        return int(seq), entry_timestamp(entry_id)
+
+    async def replay(
+        self,
+        instance_id: str,
+        last_seq: int,
+        limit: Optional[int] = None
+    ) -> Tuple[List[StreamEvent], bool]:
+        """Up to ``limit`` most recent events after ``last_seq``.
+
+        The flag is False when older events were trimmed or fall outside the
+        limit, in which case the client must reload the state it shows.
+        """
+        stream_key, seq_key = self.keys_for(instance_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xrevrange(stream_key, count=limit or self.replay_limit)
+        pipe.get(seq_key)
+        entries, current_seq = await pipe.execute()
+        return self._parse_replay(entries, current_seq, last_seq)
+
+    async def tail(
+        self,
+        instance_id: str,
+        last_seq: Optional[int] = None,
+        block_seconds: float = 15
+    ) -> AsyncIterator[Optional[StreamEvent]]:
+        """Follow an instance's events as they are recorded.
+
+        With ``last_seq`` the replay of :meth:`replay` comes first. Yields
+        None whenever ``block_seconds`` pass without events, so callers can
+        send keepalives and notice disconnects; a gap in the replay is
+        signalled by a ``(last_seq, 'reset', {})`` item.
+        """
+        stream_key, seq_key = self.keys_for(instance_id)
+        count = self.replay_limit if last_seq is not None else 1
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.xrevrange(stream_key, count=count)
+        pipe.get(seq_key)
+        entries, current_seq = await pipe.execute()
+        last_id = entries[0][0] if entries else "0-0"
+
+        if last_seq is not None:
+            events, complete = self._parse_replay(entries, current_seq, last_seq)
+            if not complete:
+                yield last_seq, 'reset', {}
+            for event in events:
+                yield event
+
+        while True:
+            response = await self.redis.xread({stream_key: last_id}, block=int(block_seconds * 1000))
+            if not response:
+                yield None
+                continue
+            for _, stream_entries in response:
+                for entry_id, fields in stream_entries:
+                    last_id = entry_id
+                    yield _parse_entry(entry_id, fields)
+
+
+_async_event_stream: Optional[AsyncTaskEventStream] = None
+
+
+def get_async_event_stream() -> AsyncTaskEventStream:
+    """Get the process-wide async event stream, created on first use."""
+    global _async_event_stream
+    if _async_event_stream is None:
+        _async_event_stream = AsyncTaskEventStream()
+    return _async_event_stream
@@ -0,0 +1,213 @@
+"""Per-request and per-task SQL counters with an N+1 detector.
+
+``instrument_engine`` hooks an engine's cursor events. Statements executed
+while a unit of work (an API request or a Celery task) is open are counted
+on that unit's ``QueryStats``, which the API returns as response headers in
+debug mode. Finished units are added to the process-wide ``QueryMetrics``
+shown by the health endpoint.
+"""
+
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Set, Union
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+REQUEST = "request"
+TASK = "task"
+
+# Key of the start times of a connection's running statements in conn.info
+_STARTED = "query_stats_started"
+
+_PLACEHOLDER = re.compile(r"\$\d+|%\(\w+\)s|%s|\?|:\w+|\b\d+\b|'(?:[^']|'')*'")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE = re.compile(r"\s+")
+
+_current: contextvars.ContextVar[Optional["QueryStats"]] = contextvars.ContextVar("query_stats", default=None)
+
+
+def statement_shape(statement: str) -> str:
+    """Statement with literals and bound parameters replaced by ``?``.
+
+    Expanded ``IN`` lists collapse to one ``?`` so the same query with a
+    different number of ids has the same shape.
+    """
+    shape = _PLACEHOLDER.sub("?", statement)
+    shape = _PLACEHOLDER_LIST.sub("?", shape)
+    return _WHITESPACE.sub(" ", shape).strip()
+
+
+@dataclass
+class QueryStats:
+    """Statements executed in one unit of work."""
+    kind: str
+    name: str = ""
+    n_plus_one_threshold: int = 0  # 0 disables the N+1 warning
+    count: int = 0
+    seconds_total: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_statement: Optional[str] = None
+    shapes: Counter = field(default_factory=Counter)
+    repeated_shapes: Set[str] = field(default_factory=set)  # Shapes that hit the N+1 threshold
+
+    def record(self, statement: str, seconds: float):
+        self.count += 1
+        self.seconds_total += seconds
+        if seconds >= self.slowest_seconds:
+            self.slowest_seconds = seconds
+            self.slowest_statement = statement
+        if not self.n_plus_one_threshold:
+            return
+        shape = statement_shape(statement)
+        self.shapes[shape] += 1
+        if self.shapes[shape] > self.n_plus_one_threshold and shape not in self.repeated_shapes:
+            self.repeated_shapes.add(shape)
+            logger.warning(
+                f"Possible N+1 in {self.kind} {self.name}: statement ran more than "
+                f"{self.n_plus_one_threshold} times: {shape[:300]}"
+            )
+
+    def headers(self) -> Dict[str, str]:
+        """Debug response headers summarizing the unit's queries."""
+        headers = {
+            "X-DB-Query-Count": str(self.count),
+            "X-DB-Time-Ms": f"{self.seconds_total * 1000:.1f}",
+        }
+        if self.slowest_statement is not None:
+            headers["X-DB-Slowest-Ms"] = f"{self.slowest_seconds * 1000:.1f}"
+            # Header values must be single-line latin-1
+            statement = _WHITESPACE.sub(" ", self.slowest_statement)[:200]
+            headers["X-DB-Slowest-Statement"] = statement.encode("ascii", "replace").decode()
+        if self.repeated_shapes:
+            headers["X-DB-N-Plus-One"] = str(len(self.repeated_shapes))
+        return headers
+
+
+@dataclass
+class UnitMetrics:
+    """Totals of the finished units of one kind."""
+    units: int = 0
+    queries: int = 0
+    db_seconds_total: float = 0.0
+    max_queries: int = 0
+    max_db_seconds: float = 0.0
+    n_plus_one_units: int = 0  # Units with at least one N+1 warning
+    slowest_seconds: float = 0.0
+    slowest_statement: Optional[str] = None
+
+
+class QueryMetrics:
+    """Process-wide query totals of requests and tasks."""
+
+    def __init__(self):
+        self._units: Dict[str, UnitMetrics] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stats: QueryStats):
+        with self._lock:
+            metrics = self._units.setdefault(stats.kind, UnitMetrics())
+            metrics.units += 1
+            metrics.queries += stats.count
+            metrics.db_seconds_total += stats.seconds_total
+            metrics.max_queries = max(metrics.max_queries, stats.count)
+            metrics.max_db_seconds = max(metrics.max_db_seconds, stats.seconds_total)
+            if stats.repeated_shapes:
+                metrics.n_plus_one_units += 1
+            if stats.slowest_statement is not None and stats.slowest_seconds >= metrics.slowest_seconds:
+                metrics.slowest_seconds = stats.slowest_seconds
+                metrics.slowest_statement = _WHITESPACE.sub(" ", stats.slowest_statement)[:500]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Totals and averages by unit kind."""
+        with self._lock:
+            return {
+                kind: {
+                    "units": metrics.units,
+                    "queries": metrics.queries,
+                    "queries_avg": metrics.queries / metrics.units if metrics.units else 0.0,
+                    "max_queries": metrics.max_queries,
+                    "db_seconds_avg": metrics.db_seconds_total / metrics.units if metrics.units else 0.0,
+                    "max_db_seconds": metrics.max_db_seconds,
+                    "n_plus_one_units": metrics.n_plus_one_units,
+                    "slowest_seconds": metrics.slowest_seconds,
+                    "slowest_statement": metrics.slowest_statement,
+                }
+                for kind, metrics in self._units.items()
+            }
+
+
+query_metrics = QueryMetrics()
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats of the unit of work in progress, if any."""
+    return _current.get()
+
+
+def begin_unit(kind: str, name: str = "") -> contextvars.Token:
+    """Start counting the statements of a unit of work in this context."""
+    stats = QueryStats(kind=kind, name=name, n_plus_one_threshold=get_settings().db_n_plus_one_threshold)
+    return _current.set(stats)
+
+
+def end_unit(token: contextvars.Token) -> Optional[QueryStats]:
+    """Stop counting, add the unit to ``query_metrics`` and return its stats."""
+    stats = _current.get()
+    _current.reset(token)
+    if stats is not None:
+        query_metrics.record(stats)
+    return stats
+
+
+@contextmanager
+def track_queries(kind: str, name: str = "") -> Iterator[QueryStats]:
+    """Count the statements executed inside the block as one unit of work."""
+    token = begin_unit(kind, name)
+    try:
+        yield _current.get()
+    finally:
+        end_unit(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault(_STARTED, []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get(_STARTED)
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.record(statement, seconds)
+
+
+def _handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get(_STARTED):
+        connection.info[_STARTED].pop()
+
+
+def instrument_engine(engine: Union[Engine, AsyncEngine]) -> None:
+    """Count the statements of ``engine`` on the current unit of work."""
+    if isinstance(engine, AsyncEngine):
+        engine = engine.sync_engine
+    if event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
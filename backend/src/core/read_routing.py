@@ -0,0 +1,151 @@
+"""Routing of read-only sessions to read replicas with read-your-writes."""
+
+import itertools
+import logging
+import threading
+from typing import List, Optional, Union
+
+import redis
+import redis.asyncio as aioredis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import Session
+
+from src.core import database
+from src.core.config import get_settings
+from src.core.engines import EngineRegistry, get_engine_registry
+
+logger = logging.getLogger(__name__)
+
+# session.info flags: writes in the open transaction / committed writes
+_PENDING_WRITES = "pending_writes"
+_COMMITTED_WRITES = "committed_writes"
+
+
+@event.listens_for(Session, "after_flush")
+def _flag_flush(session, flush_context):
+    session.info[_PENDING_WRITES] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _flag_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info[_PENDING_WRITES] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _flag_commit(session):
+    if session.info.pop(_PENDING_WRITES, False):
+        session.info[_COMMITTED_WRITES] = True
+
+
+@event.listens_for(Session, "after_rollback")
+def _clear_pending(session):
+    session.info.pop(_PENDING_WRITES, None)
+
+
+def has_committed_writes(session: Union[Session, AsyncSession]) -> bool:
+    """Whether the session committed any INSERT, UPDATE or DELETE."""
+    return bool(session.info.get(_COMMITTED_WRITES))
+
+
+class ReadYourWrites:
+    """Remembers in Redis which users wrote in the last few seconds.
+
+    Shared by all API replicas, so a write handled by one process keeps the
+    user's reads on the primary in every process. When Redis is unavailable
+    every user counts as having just written.
+    """
+
+    def __init__(self, window_seconds: Optional[float] = None):
+        settings = get_settings()
+        self.window_seconds = settings.read_your_writes_seconds if window_seconds is None else window_seconds
+        self.namespace = "swallowtail:rw:"
+        self._redis: Optional[aioredis.Redis] = None
+        self._sync_redis: Optional[redis.Redis] = None
+
+    @property
+    def client(self) -> aioredis.Redis:
+        if self._redis is None:
+            self._redis = aioredis.from_url(get_settings().redis_url, decode_responses=True)
+        return self._redis
+
+    @property
+    def sync_client(self) -> redis.Redis:
+        if self._sync_redis is None:
+            self._sync_redis = redis.from_url(get_settings().redis_url, decode_responses=True)
+        return self._sync_redis
+
+    def _key(self, scope: str) -> str:
+        return f"{self.namespace}{scope}"
+
+    def _window_ms(self) -> int:
+        return max(1, int(self.window_seconds * 1000))
+
+    async def mark(self, scope: str):
+        """Record a committed write of ``scope`` (usually a user id)."""
+        try:
+            await self.client.set(self._key(scope), 1, px=self._window_ms())
+        except redis.RedisError as e:
+            logger.warning(f"Could not record write of {scope} for read-your-writes: {e}")
+
+    def mark_sync(self, scope: str):
+        """Record a committed write from blocking code."""
+        try:
+            self.sync_client.set(self._key(scope), 1, px=self._window_ms())
+        except redis.RedisError as e:
+            logger.warning(f"Could not record write of {scope} for read-your-writes: {e}")
+
+    async def wrote_recently(self, scope: str) -> bool:
+        """Whether ``scope`` committed a write within the window."""
+        try:
+            return bool(await self.client.exists(self._key(scope)))
+        except redis.RedisError as e:
+            logger.warning(f"Read-your-writes check failed, reading from the primary: {e}")
+            return True
+
+
+class ReadSessionRouter:
+    """Session factory for read-only endpoints.
+
+    Sessions go to the read replicas in turn, except for users who wrote in
+    the last ``read_your_writes_seconds`` (and when no replicas are
+    configured), whose sessions go to the primary. Replica sessions must
+    only read: replicas reject writes.
+    """
+
+    def __init__(self, registry: Optional[EngineRegistry] = None, sticky: Optional[ReadYourWrites] = None):
+        self.registry = registry or get_engine_registry()
+        self.sticky = sticky or ReadYourWrites()
+        self._replica_factories: Optional[List[async_sessionmaker]] = None
+        self._next_replica = itertools.count()
+
+    @property
+    def replica_factories(self) -> List[async_sessionmaker]:
+        if self._replica_factories is None:
+            self._replica_factories = [
+                async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False, autoflush=False)
+                for engine in self.registry.replica_engines
+            ]
+        return self._replica_factories
+
+    async def session(self, scope: Optional[str] = None) -> AsyncSession:
+        """A new session for reads on behalf of ``scope``."""
+        factories = self.replica_factories
+        if not factories or (scope and await self.sticky.wrote_recently(scope)):
+            return database.AsyncSessionLocal()
+        return factories[next(self._next_replica) % len(factories)]()
+
+
+_router: Optional[ReadSessionRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_read_router() -> ReadSessionRouter:
+    """Get the process-wide read session router, created on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ReadSessionRouter()
+    return _router
@@ -1,37 +1,14 @@
-"""Synchronous database configuration for non-async operations."""
+"""Synchronous database configuration for non-async operations.
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator
-
-from src.core.config import get_settings
-from src.core.database import Base
-
-settings = get_settings()
+Sessions use the shared sync engine of the engine registry.
+"""
 
-# Create sync engine  
-SYNC_DATABASE_URL = settings.database_url
-
-engine = create_engine(
-    SYNC_DATABASE_URL,
-    echo=settings.debug,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20,
-)
+from sqlalchemy.orm import Session
+from typing import Generator
 
-# Create sync session factory
-SessionLocal = sessionmaker(
-    autocommit=False,
-    autoflush=False,
-    bind=engine
-)
+from src.core.database import Base, get_session
 
 
 def get_db() -> Generator[Session, None, None]:
     """Dependency to get sync database session."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
\ No newline at end of file
+    yield from get_session()
@@ -1,34 +1,231 @@
-"""WebSocket management for real-time updates."""
+"""WebSocket management for real-time updates.
 
+Every API process attaches its Socket.IO server to a Redis pub/sub channel,
+so an emit from any replica reaches clients connected to all of them.
+Celery workers and other processes without a server publish to the same
+channel through ``TaskEventPublisher``.
+"""
+
+import asyncio
+import enum
 import logging
-from typing import Dict, Set, Optional, Any
-from uuid import UUID
+import os
+import socket
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Mapping, Set, Optional, Any
+from uuid import UUID, uuid4
 import json
 
+import redis.asyncio as aioredis
 import socketio
 from socketio import AsyncServer
 
 from src.core.config import get_settings
+from src.core.event_coalescing import Event, TaskEventCoalescer, instance_room
+from src.core.event_stream import AsyncTaskEventStream, TaskEventStream
 
 logger = logging.getLogger(__name__)
 
+settings = get_settings()
+
 # Create Socket.io server instance
 sio = AsyncServer(
     async_mode='asgi',
-    cors_allowed_origins=get_settings().cors_origins,
+    client_manager=socketio.AsyncRedisManager(settings.redis_url, channel=settings.socketio_channel),
+    serializer=settings.socketio_serializer,
+    cors_allowed_origins=settings.cors_origins,
     logger=True,
     engineio_logger=False
 )
 
-# Track connected clients by instance
+# Subscriptions of the clients connected to this process
 connected_clients: Dict[str, Set[str]] = {}  # instance_id -> set of session_ids
+client_subscriptions: Dict[str, Set[str]] = {}  # session_id -> set of instance_ids
+
+
+def track_subscription(sid: str, instance_id: str) -> None:
+    """Record that a client subscribed to an instance."""
+    connected_clients.setdefault(instance_id, set()).add(sid)
+    client_subscriptions.setdefault(sid, set()).add(instance_id)
+
+
+def untrack_subscription(sid: str, instance_id: str) -> None:
+    """Forget one subscription, dropping entries that become empty."""
+    clients = connected_clients.get(instance_id)
+    if clients is not None:
+        clients.discard(sid)
+        if not clients:
+            del connected_clients[instance_id]
+    instances = client_subscriptions.get(sid)
+    if instances is not None:
+        instances.discard(instance_id)
+        if not instances:
+            del client_subscriptions[sid]
+
+
+def untrack_client(sid: str) -> Set[str]:
+    """Forget every subscription of a client; returns the instances it left."""
+    instances = client_subscriptions.pop(sid, set())
+    for instance_id in instances:
+        clients = connected_clients.get(instance_id)
+        if clients is not None:
+            clients.discard(sid)
+            if not clients:
+                del connected_clients[instance_id]
+    return instances
+
+
+class SubscriberCounts:
+    """Subscriber counts per instance shared by all API replicas.
+    
+    Each replica writes its own local counts to a Redis hash that expires
+    unless the replica keeps sending heartbeats, and registers itself in a
+    sorted set scored by that expiry. Totals only sum live replicas, so a
+    crashed replica stops counting after one TTL.
+    """
+    
+    def __init__(
+        self,
+        redis_client: Optional[aioredis.Redis] = None,
+        replica_id: Optional[str] = None,
+        ttl_seconds: Optional[int] = None
+    ):
+        self.redis = redis_client or aioredis.from_url(settings.redis_url, decode_responses=True)
+        self.replica_id = replica_id or f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+        self.ttl_seconds = ttl_seconds or settings.websocket_replica_ttl_seconds
+        self.namespace = "swallowtail:ws:"
+    
+    @property
+    def replicas_key(self) -> str:
+        return f"{self.namespace}replicas"
+    
+    def counts_key(self, replica_id: str) -> str:
+        return f"{self.namespace}subscribers:{replica_id}"
+    
+    async def publish(self, instance_ids: Iterable[str]):
+        """Write this replica's current counts of the given instances."""
+        key = self.counts_key(self.replica_id)
+        pipe = self.redis.pipeline(transaction=False)
+        for instance_id in instance_ids:
+            count = len(connected_clients.get(instance_id, ()))
+            if count:
+                pipe.hset(key, instance_id, count)
+            else:
+                pipe.hdel(key, instance_id)
+        self._queue_heartbeat(pipe)
+        await pipe.execute()
+    
+    async def heartbeat(self):
+        """Keep this replica's counts alive."""
+        pipe = self.redis.pipeline(transaction=False)
+        self._queue_heartbeat(pipe)
+        await pipe.execute()
+    
+    async def count(self, instance_id: str) -> int:
+        """Subscribers of an instance across all live replicas."""
+        now = time.time()
+        await self.redis.zremrangebyscore(self.replicas_key, "-inf", now)
+        replicas = await self.redis.zrangebyscore(self.replicas_key, now, "+inf")
+        if not replicas:
+            return 0
+        pipe = self.redis.pipeline(transaction=False)
+        for replica_id in replicas:
+            pipe.hget(self.counts_key(replica_id), instance_id)
+        return sum(int(count) for count in await pipe.execute() if count)
+    
+    def _queue_heartbeat(self, pipe):
+        pipe.expire(self.counts_key(self.replica_id), self.ttl_seconds)
+        pipe.zadd(self.replicas_key, {self.replica_id: time.time() + self.ttl_seconds})
+
+
+# InstanceTask columns that task_update deltas may carry
+TASK_DELTA_FIELDS = frozenset({
+    'status',
+    'priority',
+    'progress_percentage',
+    'error_message',
+    'scheduled_for',
+    'processing_started_at',
+    'processing_ended_at',
+    'output_format',
+    'output_media_ids',
+})
+
+
+def task_delta(changes: Mapping[str, Any]) -> Dict[str, Any]:
+    """Update data holding only the changed InstanceTask fields.
+    
+    Clients merge it into their copy of the task when the event's ``seq`` is
+    above the last one they applied, instead of refetching the task.
+    """
+    unknown = set(changes) - TASK_DELTA_FIELDS
+    if unknown:
+        raise ValueError(f"Not task delta fields: {', '.join(sorted(unknown))}")
+    delta = {}
+    for name, value in changes.items():
+        if isinstance(value, enum.Enum):
+            value = value.value
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        elif isinstance(value, list):
+            value = [str(item) for item in value]
+        delta[name] = value
+    return delta
+
+
+def progress_update(progress: int) -> Dict[str, Any]:
+    """Update data of a progress change."""
+    return task_delta({'progress_percentage': progress})
+
+
+def status_update(status: str, error_message: Optional[str] = None) -> Dict[str, Any]:
+    """Update data of a status change."""
+    changes = {'status': status}
+    if error_message:
+        changes['error_message'] = error_message
+    return task_delta(changes)
+
+
+def stamp_event(data: Dict[str, Any], recorded: Optional[Any]) -> Dict[str, Any]:
+    """Add the ``seq`` version and ``ts`` (epoch ms) an event was recorded with.
+    
+    ``seq`` increases with every event of an instance and doubles as the
+    version of the task state an update leads to. Events that could not be
+    recorded only get a local timestamp.
+    """
+    if recorded:
+        data['seq'], data['ts'] = recorded
+    else:
+        data['ts'] = int(time.time() * 1000)
+    return data
 
 
 class WebSocketManager:
-    """Manages WebSocket connections and broadcasts."""
+    """Manages WebSocket connections and broadcasts.
+    
+    Task events pass through a ``TaskEventCoalescer``; events it holds back
+    are sent by a background flush loop that runs while any are pending.
+    Every emitted event is recorded in the instance's event stream and
+    carries its ``seq`` and ``ts`` (see ``stamp_event``), so clients can
+    resubscribe with ``last_seq`` and have what they missed replayed.
+    Task updates are deltas of the changed fields (see ``task_delta``).
+    """
     
-    def __init__(self, socketio_server: AsyncServer = sio):
+    def __init__(
+        self,
+        socketio_server: AsyncServer = sio,
+        coalescer: Optional[TaskEventCoalescer] = None,
+        subscriber_counts: Optional[SubscriberCounts] = None,
+        event_stream: Optional[AsyncTaskEventStream] = None
+    ):
         self.sio = socketio_server
+        self.coalescer = coalescer or TaskEventCoalescer()
+        self.subscriber_counts = subscriber_counts or SubscriberCounts()
+        self.event_stream = event_stream or AsyncTaskEventStream()
+        self.flush_interval = settings.websocket_flush_interval_seconds
+        self._flusher: Optional[asyncio.Task] = None
+        self._heartbeat: Optional[asyncio.Task] = None
         self._setup_handlers()
     
     def _setup_handlers(self):
@@ -46,15 +243,19 @@ class WebSocketManager:
         async def disconnect(sid):
             """Handle client disconnection."""
             logger.info(f"Client {sid} disconnected")
-            # Clean up client from all instance rooms
-            for instance_id, clients in connected_clients.items():
-                if sid in clients:
-                    clients.remove(sid)
-                    await self.sio.leave_room(sid, f"instance_{instance_id}")
+            # Socket.IO drops the sid from its rooms itself
+            instances = untrack_client(sid)
+            if instances:
+                await self._publish_counts(instances)
         
         @self.sio.event
         async def subscribe_instance(sid, data):
-            """Subscribe to instance updates."""
+            """Subscribe to instance updates.
+            
+            With ``last_seq`` the events after it are replayed to the client,
+            followed by ``replay_complete``. Live events may arrive during the
+            replay, so clients drop events whose seq they have already seen.
+            """
             try:
                 instance_id = data.get('instance_id')
                 if not instance_id:
@@ -62,17 +263,19 @@ class WebSocketManager:
                     return
                 
                 # Join instance room
-                room = f"instance_{instance_id}"
+                room = instance_room(instance_id)
                 await self.sio.enter_room(sid, room)
                 
                 # Track client
-                if instance_id not in connected_clients:
-                    connected_clients[instance_id] = set()
-                connected_clients[instance_id].add(sid)
+                track_subscription(sid, instance_id)
+                await self._publish_counts([instance_id])
                 
                 logger.info(f"Client {sid} subscribed to instance {instance_id}")
                 await self.sio.emit('subscribed', {'instance_id': instance_id}, to=sid)
                 
+                if data.get('last_seq') is not None:
+                    await self._replay(sid, instance_id, int(data['last_seq']))
+                
             except Exception as e:
                 logger.error(f"Error subscribing client {sid}: {e}")
                 await self.sio.emit('error', {'message': str(e)}, to=sid)
@@ -86,12 +289,12 @@ class WebSocketManager:
                     return
                 
                 # Leave instance room
-                room = f"instance_{instance_id}"
+                room = instance_room(instance_id)
                 await self.sio.leave_room(sid, room)
                 
                 # Remove from tracking
-                if instance_id in connected_clients:
-                    connected_clients[instance_id].discard(sid)
+                untrack_subscription(sid, instance_id)
+                await self._publish_counts([instance_id])
                 
                 logger.info(f"Client {sid} unsubscribed from instance {instance_id}")
                 await self.sio.emit('unsubscribed', {'instance_id': instance_id}, to=sid)
@@ -101,58 +304,154 @@ class WebSocketManager:
     
     async def broadcast_task_update(self, instance_id: str, task_id: str, update_data: Dict[str, Any]):
         """Broadcast task update to all clients subscribed to an instance."""
-        room = f"instance_{instance_id}"
-        
-        event_data = {
-            'instance_id': instance_id,
-            'task_id': task_id,
-            'type': 'task_update',
-            'data': update_data
-        }
-        
-        await self.sio.emit('task_update', event_data, room=room)
-        logger.debug(f"Broadcast task update for task {task_id} to room {room}")
+        await self._emit_events(self.coalescer.add_update(instance_id, task_id, update_data))
+        logger.debug(f"Broadcast task update for task {task_id}")
     
-    async def broadcast_task_progress(self, instance_id: str, task_id: str, 
-                                    progress: int, message: Optional[str] = None):
+    async def broadcast_task_progress(self, instance_id: str, task_id: str, progress: int):
         """Broadcast task progress update."""
-        update_data = {
-            'progress': progress,
-            'message': message,
-            'timestamp': 'now'  # Add proper timestamp
-        }
-        
-        await self.broadcast_task_update(instance_id, task_id, update_data)
+        await self.broadcast_task_update(instance_id, task_id, progress_update(progress))
     
     async def broadcast_task_status(self, instance_id: str, task_id: str, 
                                   status: str, error_message: Optional[str] = None):
         """Broadcast task status change."""
-        update_data = {
-            'status': status,
-            'error_message': error_message,
-            'timestamp': 'now'  # Add proper timestamp
-        }
-        
-        await self.broadcast_task_update(instance_id, task_id, update_data)
+        await self.broadcast_task_update(instance_id, task_id, status_update(status, error_message))
     
     async def broadcast_execution_step(self, instance_id: str, task_id: str, 
                                      step: Dict[str, Any]):
         """Broadcast new execution step."""
-        room = f"instance_{instance_id}"
-        
-        event_data = {
-            'instance_id': instance_id,
-            'task_id': task_id,
-            'type': 'execution_step',
-            'data': step
-        }
-        
-        await self.sio.emit('execution_step', event_data, room=room)
+        await self._emit_events(self.coalescer.add_step(instance_id, task_id, step))
         logger.debug(f"Broadcast execution step for task {task_id}")
     
+    async def _emit_events(self, events: List[Event]):
+        """Emit coalesced events and make sure held-back ones get flushed."""
+        for event, room, data in events:
+            await self._emit(event, room, data)
+        if self.coalescer.pending and (self._flusher is None or self._flusher.done()):
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def _emit(self, event: str, room: str, data: Dict[str, Any]):
+        """Record an event in its instance's stream, then emit it with its seq."""
+        recorded = None
+        try:
+            recorded = await self.event_stream.append(data['instance_id'], event, data)
+        except Exception as e:
+            # Live delivery still works; only replay of this event is lost
+            logger.error(f"Failed to record {event} for replay: {e}")
+        await self.sio.emit(event, stamp_event(data, recorded), room=room)
+    
+    async def _flush_loop(self):
+        """Send held-back events as the rate limits allow."""
+        while self.coalescer.pending:
+            await asyncio.sleep(self.flush_interval)
+            for event, room, data in self.coalescer.flush_due():
+                try:
+                    await self._emit(event, room, data)
+                except Exception as e:
+                    logger.error(f"Failed to emit {event} to {room}: {e}")
+    
+    async def _replay(self, sid: str, instance_id: str, last_seq: int):
+        """Send a client the recorded events it missed."""
+        events, complete = await self.event_stream.replay(instance_id, last_seq)
+        for seq, event, data in events:
+            data['seq'] = seq
+            await self.sio.emit(event, data, to=sid)
+        await self.sio.emit('replay_complete', {
+            'instance_id': instance_id,
+            'last_seq': events[-1][0] if events else last_seq,
+            # Older events are gone; the client must reload task state
+            'truncated': not complete
+        }, to=sid)
+    
+    async def _publish_counts(self, instance_ids: Iterable[str]):
+        """Share this replica's subscriber counts; never fails the handler."""
+        try:
+            await self.subscriber_counts.publish(instance_ids)
+        except Exception as e:
+            logger.error(f"Failed to publish subscriber counts: {e}")
+        if connected_clients and (self._heartbeat is None or self._heartbeat.done()):
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+    
+    async def _heartbeat_loop(self):
+        """Keep shared counts alive while this replica has subscribers."""
+        while connected_clients:
+            await asyncio.sleep(self.subscriber_counts.ttl_seconds / 3)
+            try:
+                await self.subscriber_counts.heartbeat()
+            except Exception as e:
+                logger.error(f"Subscriber count heartbeat failed: {e}")
+    
     def get_connected_clients(self, instance_id: str) -> int:
-        """Get count of connected clients for an instance."""
+        """Get count of clients connected to this process for an instance."""
         return len(connected_clients.get(instance_id, set()))
+    
+    async def get_subscriber_count(self, instance_id: str) -> int:
+        """Get count of clients subscribed to an instance on every replica."""
+        return await self.subscriber_counts.count(instance_id)
+
+
+class TaskEventPublisher:
+    """Emits task events from processes that do not run the Socket.IO server.
+    
+    Publishing is a synchronous Redis PUBLISH on the channel the API servers
+    listen on, so callers need no event loop. Events are coalesced like the
+    server's own broadcasts; without a loop, held-back events go out with
+    the next event of any task, and a terminal status sends the rest.
+    Events are recorded in the instance's event stream before publishing.
+    """
+    
+    def __init__(
+        self,
+        manager: Optional[socketio.RedisManager] = None,
+        coalescer: Optional[TaskEventCoalescer] = None,
+        event_stream: Optional[TaskEventStream] = None
+    ):
+        self.manager = manager or socketio.RedisManager(
+            settings.redis_url,
+            channel=settings.socketio_channel,
+            write_only=True
+        )
+        self.coalescer = coalescer or TaskEventCoalescer()
+        self.event_stream = event_stream or TaskEventStream()
+    
+    def task_update(self, instance_id: str, task_id: str, update_data: Dict[str, Any]):
+        """Publish a task update to the instance's room."""
+        self._emit_events(self.coalescer.add_update(instance_id, task_id, update_data))
+    
+    def task_progress(self, instance_id: str, task_id: str, progress: int):
+        """Publish a task progress update."""
+        self.task_update(instance_id, task_id, progress_update(progress))
+    
+    def task_status(self, instance_id: str, task_id: str, status: str, error_message: Optional[str] = None):
+        """Publish a task status change."""
+        self.task_update(instance_id, task_id, status_update(status, error_message))
+    
+    def execution_step(self, instance_id: str, task_id: str, step: Dict[str, Any]):
+        """Publish a new execution step."""
+        self._emit_events(self.coalescer.add_step(instance_id, task_id, step))
+    
+    def flush(self, task_id: Optional[str] = None):
+        """Publish everything held back for one task, or for all tasks."""
+        self._emit_events(self.coalescer.flush(task_id))
+    
+    def _emit_events(self, events: List[Event]):
+        for event, room, data in events + self.coalescer.flush_due():
+            recorded = None
+            try:
+                recorded = self.event_stream.append(data['instance_id'], event, data)
+            except Exception as e:
+                logger.error(f"Failed to record {event} for replay: {e}")
+            self.manager.emit(event, stamp_event(data, recorded), room=room)
+
+
+_event_publisher: Optional[TaskEventPublisher] = None
+
+
+def get_event_publisher() -> TaskEventPublisher:
+    """Get the process-wide event publisher, created on first use."""
+    global _event_publisher
+    if _event_publisher is None:
+        _event_publisher = TaskEventPublisher()
+    return _event_publisher
 
 
 # Global WebSocket manager instance
@@ -6,7 +6,8 @@ from .research import (
     TrendData, TrendSource, CompetitionLevel, MarketMaturity,
     MarketAnalysis, SupplierOption, MarketOpportunity, OpportunityScore
 )
-from .instance import Instance, InstanceAgent, InstanceTask, InstanceMedia, InstanceType, InstanceTaskStatus, TaskPriority
+from .user import User
+from .instance import Instance, InstanceAgent, InstanceTask, InstanceTaskStep, InstanceMedia, InstanceType, InstanceTaskStatus, TaskPriority
 from .instance_schemas import (
     InstanceCreate, InstanceResponse, TaskSubmission, InstanceTaskResponse, InstanceMediaResponse,
     TaskUpdateRequest, TaskExecutionStep, TaskListFilters
@@ -32,6 +33,7 @@ __all__ = [
     "Instance",
     "InstanceAgent",
     "InstanceTask",
+    "InstanceTaskStep",
     "InstanceMedia",
     "InstanceType",
     "InstanceTaskStatus",
@@ -45,4 +47,5 @@ __all__ = [
     "TaskUpdateRequest",
     "TaskExecutionStep",
     "TaskListFilters",
+    "User",
 ]
\ No newline at end of file
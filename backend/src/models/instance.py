@@ -4,7 +4,7 @@ from datetime import datetime, timezone
 import uuid
 import enum
 
-from sqlalchemy import Column, String, DateTime, Boolean, JSON, ForeignKey, Text, Enum as SQLEnum, Integer, Index
+from sqlalchemy import Column, String, DateTime, Boolean, JSON, ForeignKey, Text, Enum as SQLEnum, Integer, Index, DDL, LargeBinary, event
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.orm import relationship
 
@@ -31,6 +31,10 @@ class InstanceTaskStatus(str, enum.Enum):
     REJECTED = "rejected"
 
 
+# Statuses of tasks that are waiting or running
+LIVE_TASK_STATUSES = (InstanceTaskStatus.SUBMITTED, InstanceTaskStatus.QUEUED, InstanceTaskStatus.IN_PROGRESS)
+
+
 class TaskPriority(str, enum.Enum):
     """Task priority levels."""
     URGENT = "urgent"
@@ -99,7 +103,12 @@ class InstanceAgent(Base):
 
 
 class InstanceTask(Base):
-    """Tasks submitted by users for instance agents to execute."""
+    """Tasks submitted by users for instance agents to execute.
+    
+    The table is partitioned by month of ``created_at``, which is therefore
+    part of its primary key; the ORM still identifies tasks by ``id`` alone.
+    Filtering on ``created_at`` lets PostgreSQL skip whole months.
+    """
     __tablename__ = "instance_tasks"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
@@ -116,7 +125,8 @@ class InstanceTask(Base):
     
     # Structured task data
     parsed_intent = Column(JSONB, nullable=True)  # {intent, platforms, entities, parameters}
-    execution_steps = Column(JSONB, default=list, nullable=False)  # [{step_id, agent, action, status, output, timestamp}]
+    execution_steps = Column(JSONB, default=list, nullable=False)  # Legacy - steps live in task_execution_steps
+    step_count = Column(Integer, default=0, server_default="0", nullable=False)  # Last InstanceTaskStep.seq
     progress_percentage = Column(Integer, default=0, nullable=False)
     
     # Results
@@ -141,9 +151,10 @@ class InstanceTask(Base):
     processing_ended_at = Column(DateTime, nullable=True)
     retry_count = Column(Integer, default=0, nullable=False)
     parent_task_id = Column(UUID(as_uuid=True), nullable=True)  # For subtasks
+    archived_at = Column(DateTime, nullable=True)  # Payloads and steps moved to instance_task_archives
     
     # Timestamps
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), primary_key=True)  # Partition key
     updated_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), onupdate=lambda: datetime.now(timezone.utc), nullable=False)
     started_at = Column(DateTime, nullable=True)  # Legacy - use processing_started_at
     completed_at = Column(DateTime, nullable=True)  # Legacy - use processing_ended_at
@@ -156,8 +167,13 @@ class InstanceTask(Base):
         Index('idx_instance_tasks_instance_status', 'instance_id', 'status'),
         Index('idx_instance_tasks_created', 'instance_id', 'created_at'),
         Index('idx_instance_tasks_priority', 'instance_id', 'priority', 'created_at'),
-        Index('idx_instance_tasks_scheduled', 'scheduled_for', 'status'),
+        Index('idx_instance_tasks_updated', 'instance_id', 'updated_at'),  # Change feeds
+        # Partial indexes stay small however many finished tasks pile up
+        Index('idx_instance_tasks_due', 'scheduled_for', postgresql_where=status == InstanceTaskStatus.SUBMITTED),
+        Index('idx_instance_tasks_live', 'instance_id', 'status', postgresql_where=status.in_(LIVE_TASK_STATUSES)),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
     )
+    __mapper_args__ = {'primary_key': [id]}
     
     # Helper methods for TikTok posting
     def get_video_url(self) -> str | None:
@@ -207,6 +223,78 @@ class InstanceTask(Base):
         self.updated_at = datetime.now(timezone.utc)
 
 
+# Rows outside every monthly partition land in the default partition; the
+# trigger stands in for the ON DELETE CASCADE of task steps and archives and
+# leaves a tombstone for change feeds
+for _ddl in (
+    "CREATE TABLE IF NOT EXISTS instance_tasks_default PARTITION OF instance_tasks DEFAULT",
+    """
+    CREATE OR REPLACE FUNCTION instance_tasks_delete_steps() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM task_execution_steps WHERE task_id = OLD.id;
+        DELETE FROM instance_task_archives WHERE task_id = OLD.id;
+        INSERT INTO instance_task_tombstones (task_id, instance_id, deleted_at)
+        VALUES (OLD.id, OLD.instance_id, timezone('utc', now()))
+        ON CONFLICT (task_id) DO NOTHING;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER instance_tasks_delete_steps AFTER DELETE ON instance_tasks
+    FOR EACH ROW EXECUTE FUNCTION instance_tasks_delete_steps()
+    """,
+):
+    event.listen(InstanceTask.__table__, "after_create", DDL(_ddl).execute_if(dialect="postgresql"))
+
+
+class InstanceTaskStep(Base):
+    """Append-only execution step of an instance task.
+    
+    ``seq`` numbers a task's steps from 1 in the order they were reported and
+    is handed out by incrementing ``InstanceTask.step_count``. A foreign key
+    would have to include the partition key of ``instance_tasks``, so steps
+    of deleted tasks are removed by the ``instance_tasks_delete_steps``
+    trigger instead.
+    """
+    __tablename__ = "task_execution_steps"
+    
+    task_id = Column(UUID(as_uuid=True), primary_key=True)
+    seq = Column(Integer, primary_key=True, autoincrement=False)
+    step = Column(JSONB, nullable=False)  # {step_id, agent, action, status, output, error, started_at, completed_at}
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class InstanceTaskArchive(Base):
+    """Cold copy of the large payloads and steps of an archived task.
+    
+    ``payload`` is zlib-compressed JSON written by ``src.tasks.archiver``;
+    the task row keeps everything else and has ``archived_at`` set.
+    """
+    __tablename__ = "instance_task_archives"
+    
+    task_id = Column(UUID(as_uuid=True), primary_key=True)
+    payload = Column(LargeBinary, nullable=False)
+    archived_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class InstanceTaskTombstone(Base):
+    """Marker of a deleted task, kept so change feeds can report the deletion.
+    
+    Written by the ``instance_tasks_delete_steps`` trigger and pruned after
+    ``task_tombstone_retention_days``.
+    """
+    __tablename__ = "instance_task_tombstones"
+    
+    task_id = Column(UUID(as_uuid=True), primary_key=True)
+    instance_id = Column(UUID(as_uuid=True), nullable=False)
+    deleted_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    
+    __table_args__ = (
+        Index('idx_instance_task_tombstones_deleted', 'instance_id', 'deleted_at'),
+    )
+
+
 class InstanceMedia(Base):
     """Media files (images) associated with an instance."""
     __tablename__ = "instance_media"
@@ -3,6 +3,7 @@
 from datetime import datetime, timezone
 from typing import Optional, List, Dict, Any, Literal
 from uuid import UUID
+from dateutil.rrule import rrulestr
 from pydantic import BaseModel, Field, ConfigDict, field_validator
 
 from src.models.instance import InstanceType, InstanceTaskStatus, TaskPriority
@@ -46,6 +47,26 @@ class TaskSubmission(BaseModel):
         if v and v < datetime.now(timezone.utc):
             raise ValueError("Scheduled time must be in the future")
         return v
+    
+    @field_validator('recurring_pattern')
+    @classmethod
+    def validate_recurring_pattern(cls, v: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Ensure recurring patterns carry a parseable RRULE."""
+        if v is None:
+            return v
+        rule = v.get('rrule')
+        if not isinstance(rule, str) or not rule.strip():
+            raise ValueError("recurring_pattern must contain an 'rrule' string, e.g. 'FREQ=DAILY;BYHOUR=9'")
+        try:
+            rrulestr(rule.strip().removeprefix("RRULE:"), dtstart=datetime.now(timezone.utc))
+        except (ValueError, TypeError) as e:
+            raise ValueError(f"Invalid RRULE: {e}")
+        return v
+
+
+class TaskBatchSubmission(BaseModel):
+    """Request model for submitting several tasks at once."""
+    tasks: List[TaskSubmission] = Field(..., min_length=1, max_length=100, description="Tasks to submit")
 
 
 class InstanceTaskResponse(BaseModel):
@@ -62,7 +83,7 @@ class InstanceTaskResponse(BaseModel):
     
     # Structured task data
     parsed_intent: Optional[Dict[str, Any]] = None
-    execution_steps: List[Dict[str, Any]] = Field(default_factory=list)
+    execution_steps: List[Dict[str, Any]] = Field(default_factory=list)  # Legacy - see /tasks/{id}/steps
     progress_percentage: int = 0
     
     # Results
@@ -121,6 +142,43 @@ class TaskListFilters(BaseModel):
     scheduled_before: Optional[datetime] = None
     limit: int = Field(default=50, ge=1, le=100)
     offset: int = Field(default=0, ge=0)
+    cursor: Optional[str] = Field(None, description="Keyset cursor; continues after the last task of the previous page")
+    
+
+# Large JSONB columns left out of summary task listings
+TASK_SUMMARY_EXCLUDED_FIELDS = ("execution_steps", "output_data")
+
+
+class TaskTombstone(BaseModel):
+    """A task deleted since the change cursor."""
+    id: UUID
+    deleted_at: datetime
+
+
+class TaskChangesResponse(BaseModel):
+    """Tasks changed and deleted since a change cursor, oldest change first."""
+    tasks: List[InstanceTaskResponse] = Field(default_factory=list)
+    deleted: List[TaskTombstone] = Field(default_factory=list)
+    change_cursor: str = Field(..., description="Pass as change_cursor to get the changes after these")
+    has_more: bool = Field(False, description="More changes are ready; fetch again right away")
+    
+
+class TaskWaitTimePercentiles(BaseModel):
+    """Dispatch wait time percentiles in seconds over recent tasks."""
+    samples: int
+    p50: Optional[float] = None
+    p90: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+
+
+class TaskDispatchStats(BaseModel):
+    """Fair-share and concurrency state of an instance's task dispatch."""
+    instance_id: UUID
+    running: int
+    held: int
+    backlog: Dict[str, int] = Field(..., description="Tasks waiting per Celery queue")
+    wait_time: TaskWaitTimePercentiles
     
 
 # Media Models
@@ -150,6 +208,7 @@ class TaskPlanningStep(BaseModel):
 
 class TaskExecutionLog(BaseModel):
     """A log entry from agent execution."""
+    seq: Optional[int] = None  # Position in task_execution_steps, usable as a paging cursor
     timestamp: datetime
     agent_name: str
     action: str
@@ -172,8 +231,10 @@ class TaskDetailResponse(BaseModel):
     # Planning section (generated for all tasks)
     planning: List[TaskPlanningStep] = Field(default_factory=list)
     
-    # Execution logs (from execution_steps in DB)
+    # Execution logs (one page of task_execution_steps)
     execution_logs: List[TaskExecutionLog] = Field(default_factory=list)
+    total_steps: int = 0
+    next_steps_seq: Optional[int] = None  # Pass as steps_after_seq for the next page
     
     # Output (may contain video_url for content creation tasks)
     output_format: Optional[str] = None
@@ -109,6 +109,7 @@ class InstanceService:
         """Get default configuration based on instance type."""
         base_config = {
             "max_concurrent_tasks": 3,
+            "fair_share_weight": 1,
             "task_timeout_minutes": 30,
             "enable_auto_retry": True
         }
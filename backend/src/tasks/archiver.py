@@ -0,0 +1,202 @@
+"""Cold storage of the payloads and execution steps of finished tasks.
+
+Old completed and failed tasks keep a stub row in ``instance_tasks`` while
+their large JSONB payloads and their ``task_execution_steps`` rows move,
+zlib-compressed, into ``instance_task_archives``. Readers call
+``load_task_archive`` to put the payloads back on a loaded task.
+"""
+
+import json
+import logging
+import zlib
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import delete, insert, null, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.core.config import get_settings
+from src.models.instance import InstanceTask, InstanceTaskArchive, InstanceTaskStep
+from src.tasks.execution_steps import list_execution_steps_async
+from src.tasks.queue_service import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+# Task columns moved to the archive and the values left in the stub row
+ARCHIVED_FIELDS = {
+    "output_data": null(),
+    "result_data": null(),
+    "tiktok_post_data": null(),
+    "execution_steps": [],
+}
+
+# Tasks whose TikTok post is still running need their output
+_POSTING_STATUSES = ("PENDING", "PROCESSING")
+
+
+@dataclass
+class ArchivedTask:
+    """Unpacked archive of one task."""
+    fields: Dict[str, Any]
+    steps: List[InstanceTaskStep] = field(default_factory=list)
+
+    def steps_after(self, after_seq: int, limit: Optional[int]) -> List[InstanceTaskStep]:
+        steps = [step for step in self.steps if step.seq > after_seq]
+        return steps if limit is None else steps[:limit]
+
+
+def pack_task_archive(fields: Dict[str, Any], steps: Sequence[Any]) -> bytes:
+    """Compress task payloads and step rows (with seq, step, created_at)."""
+    document = {
+        "fields": fields,
+        "steps": [
+            {
+                "seq": step.seq,
+                "step": step.step,
+                "created_at": step.created_at.isoformat() if step.created_at else None
+            }
+            for step in steps
+        ]
+    }
+    return zlib.compress(json.dumps(document, default=str).encode())
+
+
+def unpack_task_archive(task_id: UUID, payload: bytes) -> ArchivedTask:
+    """Decompress an archive written by ``pack_task_archive``."""
+    document = json.loads(zlib.decompress(payload))
+    steps = [
+        InstanceTaskStep(
+            task_id=task_id,
+            seq=step["seq"],
+            step=step["step"],
+            created_at=datetime.fromisoformat(step["created_at"]) if step["created_at"] else None
+        )
+        for step in document["steps"]
+    ]
+    return ArchivedTask(fields=document["fields"], steps=steps)
+
+
+class TaskArchiver:
+    """Moves finished tasks untouched for ``task_archive_after_days`` to cold storage."""
+
+    def __init__(
+        self,
+        db_session: Session,
+        archive_after: Optional[timedelta] = None,
+        batch_size: Optional[int] = None
+    ):
+        settings = get_settings()
+        self.db_session = db_session
+        self.archive_after = archive_after if archive_after is not None else timedelta(days=settings.task_archive_after_days)
+        self.batch_size = batch_size or settings.task_archive_batch_size
+
+    def archive_batch(self, now: Optional[datetime] = None) -> int:
+        """Archive up to ``batch_size`` due tasks in one transaction.
+
+        Rows are locked with ``SKIP LOCKED``, so a task being updated is
+        simply left for the next run. ``created_at`` is bounded as well as
+        ``updated_at`` so only partitions old enough are scanned.
+        """
+        now = now or datetime.now(timezone.utc)
+        cutoff = now - self.archive_after
+        rows = self.db_session.execute(
+            select(InstanceTask.id, *(getattr(InstanceTask, name) for name in ARCHIVED_FIELDS))
+            .where(
+                InstanceTask.status.in_(FINISHED_STATUSES),
+                InstanceTask.archived_at.is_(None),
+                InstanceTask.created_at < cutoff,
+                InstanceTask.updated_at < cutoff,
+                or_(
+                    InstanceTask.tiktok_post_status.is_(None),
+                    InstanceTask.tiktok_post_status.notin_(_POSTING_STATUSES)
+                )
+            )
+            .limit(self.batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            return 0
+
+        task_ids = [row.id for row in rows]
+        steps: Dict[UUID, List[Any]] = {task_id: [] for task_id in task_ids}
+        for step in self.db_session.execute(
+            select(InstanceTaskStep.task_id, InstanceTaskStep.seq, InstanceTaskStep.step, InstanceTaskStep.created_at)
+            .where(InstanceTaskStep.task_id.in_(task_ids))
+            .order_by(InstanceTaskStep.task_id, InstanceTaskStep.seq)
+        ):
+            steps[step.task_id].append(step)
+
+        self.db_session.execute(insert(InstanceTaskArchive), [
+            {
+                "task_id": row.id,
+                "payload": pack_task_archive({name: getattr(row, name) for name in ARCHIVED_FIELDS}, steps[row.id]),
+                "archived_at": now
+            }
+            for row in rows
+        ])
+        # updated_at is kept: archiving does not change what readers see
+        self.db_session.execute(
+            update(InstanceTask)
+            .where(InstanceTask.id.in_(task_ids))
+            .values(archived_at=now, updated_at=InstanceTask.updated_at, **ARCHIVED_FIELDS)
+            .execution_options(synchronize_session=False)
+        )
+        self.db_session.execute(delete(InstanceTaskStep).where(InstanceTaskStep.task_id.in_(task_ids)))
+        self.db_session.commit()
+        return len(rows)
+
+    def archive_due(self, max_batches: int = 50) -> int:
+        """Archive due tasks batch by batch; returns how many were archived."""
+        if self.archive_after <= timedelta(0):
+            return 0
+        archived = 0
+        for _ in range(max_batches):
+            count = self.archive_batch()
+            archived += count
+            if count < self.batch_size:
+                break
+        if archived:
+            logger.info(f"Archived {archived} finished tasks")
+        return archived
+
+
+async def load_task_archive(session: AsyncSession, task: InstanceTask) -> Optional[ArchivedTask]:
+    """Put the archived payloads back on ``task``, if it was archived.
+
+    The values are set as loaded state, so nothing is written back. Fields a
+    retried task filled again since archiving keep their new values. Returns
+    the archive for its steps.
+    """
+    if task.archived_at is None:
+        return None
+    payload = await session.scalar(
+        select(InstanceTaskArchive.payload).where(InstanceTaskArchive.task_id == task.id)
+    )
+    if payload is None:
+        return None
+
+    archived = unpack_task_archive(task.id, payload)
+    for name, value in archived.fields.items():
+        if not getattr(task, name):
+            set_committed_value(task, name, value)
+    return archived
+
+
+async def list_task_steps_async(
+    session: AsyncSession,
+    task_id: UUID,
+    after_seq: int,
+    limit: int,
+    archived: Optional[ArchivedTask] = None
+) -> List[InstanceTaskStep]:
+    """Steps after ``after_seq`` from the archive, then from task_execution_steps."""
+    steps = archived.steps_after(after_seq, limit) if archived else []
+    if len(steps) < limit:
+        steps += await list_execution_steps_async(
+            session, task_id, steps[-1].seq if steps else after_seq, limit - len(steps)
+        )
+    return steps
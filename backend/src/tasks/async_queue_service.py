@@ -0,0 +1,344 @@
+"""Task queue service for the API, built on ``AsyncSession``."""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID, uuid4
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only
+
+from src.models.instance import Instance, InstanceTask
+from src.models.instance_schemas import TaskListFilters, TaskSubmission, TaskUpdateRequest
+from src.tasks.archiver import list_task_steps_async, load_task_archive
+from src.tasks.execution_steps import DEFAULT_STEP_PAGE_SIZE, append_execution_steps_async
+from src.tasks.queue_service import FINISHED_STATUSES, TaskQueueBase
+from src.tasks.recurrence import RecurrenceEngine, is_recurring
+from src.tasks.task_changes import (
+    TaskChanges, changed_tasks_statement, collect_changes, decode_change_cursor, tombstones_statement
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncTaskQueueService(TaskQueueBase):
+    """Task queue operations for request handlers.
+
+    Database round trips are awaited on the event loop instead of holding a
+    threadpool thread for their whole duration. Redis, Celery and the intent
+    classifier (which may call OpenAI) only have blocking clients, so those
+    calls run in a worker thread once the database work is done; the session
+    itself never leaves the event loop. Recurring series are expanded by the
+    synchronous ``RecurrenceEngine`` through ``AsyncSession.run_sync``.
+
+    Returned tasks stay usable after commit only with a session that does
+    not expire on commit, such as ``AsyncSessionLocal``.
+    """
+
+    def __init__(self, db_session: AsyncSession, **kwargs):
+        super().__init__(**kwargs)
+        self.db_session = db_session
+
+    async def submit_task(
+        self,
+        instance_id: UUID,
+        submission: TaskSubmission,
+        idempotency_key: Optional[str] = None
+    ) -> InstanceTask:
+        """Submit a new task to the queue.
+
+        A repeated ``idempotency_key``, or an identical submission within the
+        instance's dedup window, returns the task created the first time
+        instead of creating (and paying for) another one.
+        """
+        # Usually already in the identity map from the access check
+        instance = await self.db_session.get(Instance, instance_id)
+        if not instance:
+            raise ValueError(f"Instance {instance_id} not found")
+
+        task_id = uuid4()
+        dedup_keys = self._dedup_keys(instance, submission, idempotency_key)
+        existing = await self._reserve_submission(instance_id, dedup_keys, task_id)
+        if existing:
+            return existing
+
+        try:
+            task, occurrences = await self._create_task(instance_id, submission, task_id)
+        except Exception:
+            if dedup_keys:
+                await asyncio.to_thread(self._release_submission, dedup_keys, task_id)
+            raise
+
+        if dedup_keys:
+            await asyncio.to_thread(self._confirm_submission, dedup_keys, task_id)
+
+        # Queue for processing if not scheduled (recurring templates never run)
+        if is_recurring(submission.recurring_pattern):
+            await asyncio.to_thread(self._schedule_delayed, occurrences)
+        elif not submission.scheduled_for or submission.scheduled_for <= datetime.now(timezone.utc):
+            await self._queue_task(task, instance.configuration)
+        else:
+            await asyncio.to_thread(self._schedule_delayed, {task.id: submission.scheduled_for})
+
+        return task
+
+    async def _create_task(
+        self,
+        instance_id: UUID,
+        submission: TaskSubmission,
+        task_id: UUID
+    ) -> Tuple[InstanceTask, Dict[UUID, datetime]]:
+        """Create and commit the task row for a submission.
+
+        Also returns the due times of the first occurrences of a recurring task.
+        """
+        task = self._new_task(instance_id, submission, task_id)
+        self.db_session.add(task)
+
+        # Recurring tasks are series templates: schedule their occurrences instead
+        due_times = {}
+        if is_recurring(submission.recurring_pattern):
+            occurrences = await self.db_session.run_sync(
+                lambda session: RecurrenceEngine(session).start_series(task, submission.scheduled_for)
+            )
+            due_times = {child.id: child.scheduled_for for child in occurrences}
+
+        await self.db_session.commit()
+        return task, due_times
+
+    async def _reserve_submission(
+        self,
+        instance_id: UUID,
+        dedup_keys: Dict[str, int],
+        task_id: UUID
+    ) -> Optional[InstanceTask]:
+        """Reserve the dedup keys, returning the original task for a duplicate."""
+        if not dedup_keys:
+            return None
+        existing_id = await asyncio.to_thread(self._reserve_keys, dedup_keys, task_id)
+        if not existing_id:
+            return None
+
+        existing = await self.db_session.scalar(self._task_statement(existing_id, instance_id))
+        if existing:
+            logger.info(f"Duplicate submission for instance {instance_id} collapsed into task {existing.id}")
+            return existing
+
+        # The original task no longer exists; take the keys over
+        logger.warning(f"Dedup keys point at missing task {existing_id}, creating a new task")
+        await asyncio.to_thread(self._confirm_submission, dedup_keys, task_id)
+        return None
+
+    async def submit_tasks_bulk(self, instance_id: UUID, submissions: List[TaskSubmission]) -> List[InstanceTask]:
+        """Submit several tasks for one instance in a constant number of round trips.
+
+        The instance is checked once, every task row is written by a single
+        INSERT, the due tasks are moved to QUEUED by a single UPDATE and the
+        dispatches are handed to the fair-share dispatcher in one pipeline.
+        """
+        instance = await self.db_session.get(Instance, instance_id)
+        if not instance:
+            raise ValueError(f"Instance {instance_id} not found")
+
+        if not submissions:
+            return []
+
+        rows, due_processors, delayed, series_starts = await asyncio.to_thread(
+            self._build_task_rows, instance_id, submissions, datetime.now(timezone.utc)
+        )
+
+        # Single multi-row INSERT ... RETURNING for all tasks
+        tasks = list(await self.db_session.scalars(self._insert_tasks_statement(), rows))
+
+        # Single UPDATE for every task that is due now
+        if due_processors:
+            await self.db_session.execute(self._queue_tasks_statement(list(due_processors)))
+
+        dispatches = [
+            self._build_dispatch(task, due_processors[task.id], instance.configuration)
+            for task in tasks if task.id in due_processors
+        ]
+
+        # Expand recurring series; their occurrences are flushed with the commit
+        if series_starts:
+            def start_series(session):
+                engine = RecurrenceEngine(session)
+                for task in tasks:
+                    if task.id in series_starts:
+                        for child in engine.start_series(task, series_starts[task.id]):
+                            delayed[child.id] = child.scheduled_for
+                session.flush()
+
+            await self.db_session.run_sync(start_series)
+
+        # Detach the rows before committing so that returning them does not
+        # trigger a refresh SELECT per task
+        for task in tasks:
+            self.db_session.expunge(task)
+        await self.db_session.commit()
+
+        dispatched = await asyncio.to_thread(self._hand_off, dispatches, delayed)
+
+        logger.info(
+            f"Bulk submitted {len(tasks)} tasks for instance {instance_id} "
+            f"({dispatched} dispatched, {len(dispatches) - dispatched} held)"
+        )
+        return tasks
+
+    async def _queue_task(self, task: InstanceTask, configuration: Optional[Dict[str, Any]]):
+        """Queue a task for processing."""
+        intent_type, processor_class = await asyncio.to_thread(self._resolve_processor, task.description)
+        processor_class = self._set_processor(task, intent_type, processor_class)
+        await self.db_session.commit()
+
+        if not processor_class:
+            return
+
+        payload, limit = self._build_dispatch(task, processor_class, configuration)
+        if not await asyncio.to_thread(self._publish, [(payload, limit)]):
+            logger.info(f"Instance {task.instance_id} is at its concurrency limit, holding task {task.id}")
+            return
+
+        logger.info(f"Queued task {task.id} to {payload['queue']} queue with processor {processor_class.__name__}")
+
+    async def _get_task(self, task_id: UUID) -> InstanceTask:
+        """Load a task, usually from the identity map filled by the access check.
+
+        On a miss the lookup filters on the id alone, which cannot prune the
+        monthly ``instance_tasks`` partitions and probes each one's id index.
+        """
+        task = await self.db_session.get(InstanceTask, task_id)
+        if not task:
+            raise ValueError(f"Task {task_id} not found")
+        return task
+
+    async def get_task_status(self, task_id: UUID) -> Dict[str, Any]:
+        """Get current status of a task.
+
+        Only the newest ``DEFAULT_STEP_PAGE_SIZE`` execution steps are
+        included, oldest first; while ``step_count`` is larger, the earlier
+        ones are paged through ``/tasks/{id}/steps``. Steps of an archived
+        task are read from its archive.
+        """
+        task = await self._get_task(task_id)
+        archived = await load_task_archive(self.db_session, task)
+        after_seq = self._newest_steps_after(task, DEFAULT_STEP_PAGE_SIZE)
+        records = await list_task_steps_async(self.db_session, task.id, after_seq, DEFAULT_STEP_PAGE_SIZE, archived)
+        celery_status = await asyncio.to_thread(self._celery_status, task)
+        return self._status_payload(task, [record.step for record in records], celery_status)
+
+    async def update_task(self, task_id: UUID, update: TaskUpdateRequest) -> InstanceTask:
+        """Update task details."""
+        task = await self._get_task(task_id)
+
+        steps = self._apply_update(task, update)
+        if steps:
+            await append_execution_steps_async(self.db_session, task.id, steps)
+
+        await self.db_session.commit()
+        return task
+
+    async def cancel_task(self, task_id: UUID) -> bool:
+        """Cancel a task."""
+        task = await self._get_task(task_id)
+
+        # Can only cancel if not completed
+        if task.status in FINISHED_STATUSES:
+            return False
+
+        release_slot = self._mark_cancelled(task)
+        if release_slot:
+            await asyncio.to_thread(self._revoke, task_id)
+
+        # Cancelling a series also cancels its occurrences that have not started
+        if is_recurring(task.recurring_pattern):
+            await self.db_session.execute(self._cancel_occurrences_statement(task))
+
+        await self.db_session.commit()
+
+        if release_slot:
+            await asyncio.to_thread(self._release_slot, task)
+
+        return True
+
+    async def retry_task(self, task_id: UUID) -> InstanceTask:
+        """Retry a failed task.
+
+        The reset and the move to QUEUED are committed together.
+        """
+        task = await self._get_task(task_id)
+        self._reset_for_retry(task)
+
+        configuration = await self.db_session.scalar(self._configuration_statement(task.instance_id))
+        await self._queue_task(task, configuration)
+
+        return task
+
+    async def list_tasks(
+        self,
+        instance_id: UUID,
+        filters: TaskListFilters,
+        fields: Optional[Sequence[str]] = None
+    ) -> List[InstanceTask]:
+        """List tasks with filters, newest first (see ``TaskQueueBase._list_statement``)."""
+        return list(await self.db_session.scalars(self._list_statement(instance_id, filters, fields)))
+
+    async def list_task_changes(
+        self,
+        instance_id: UUID,
+        change_cursor: str,
+        limit: int,
+        fields: Optional[Sequence[str]] = None
+    ) -> TaskChanges:
+        """Tasks updated and deleted after a change cursor.
+
+        Only the columns of the response (or of ``fields``) are loaded, plus
+        ``updated_at`` for the next cursor. Raises ``ChangeCursorExpiredError``
+        for cursors older than the kept tombstones.
+        """
+        position = decode_change_cursor(change_cursor)
+        stmt = changed_tasks_statement(instance_id, position, limit)
+        stmt = stmt.options(load_only(*self._list_columns(fields), InstanceTask.updated_at, raiseload=True))
+        tasks = list(await self.db_session.scalars(stmt))
+        tombstones = (await self.db_session.execute(tombstones_statement(instance_id, position))).all()
+        return collect_changes(position, tasks, tombstones, limit)
+
+    async def get_dispatch_stats(self, instance_id: UUID) -> Dict[str, Any]:
+        """Get concurrency, backlog and wait time statistics of an instance."""
+        return await asyncio.to_thread(super().get_dispatch_stats, instance_id)
+
+    async def _instance_configurations(self, instance_ids) -> Dict[UUID, Optional[Dict[str, Any]]]:
+        """Load the configuration of several instances in one query."""
+        if not instance_ids:
+            return {}
+        result = await self.db_session.execute(self._configurations_statement(instance_ids))
+        configurations = dict(result.all())
+        return {instance_id: configurations.get(instance_id) for instance_id in instance_ids}
+
+    async def claim_due_tasks(self, task_ids: Optional[List[UUID]] = None, limit: int = 100) -> int:
+        """Claim due SUBMITTED tasks and queue them (see ``TaskQueueService.claim_due_tasks``)."""
+        if task_ids is not None and not task_ids:
+            return 0
+        due_tasks = list(await self.db_session.scalars(self._due_tasks_statement(task_ids, limit)))
+
+        configurations = await self._instance_configurations({task.instance_id for task in due_tasks})
+        resolutions = await asyncio.to_thread(
+            self._resolve_processors, [task.description for task in due_tasks]
+        )
+        dispatches, series_ids = self._queue_claimed(due_tasks, configurations, resolutions)
+        due_times = await self.db_session.run_sync(self._advance_series, series_ids) if series_ids else {}
+
+        # One commit releases the row locks for the whole batch
+        await self.db_session.commit()
+
+        return await asyncio.to_thread(self._hand_off, due_tasks, dispatches, due_times)
+
+    async def process_scheduled_tasks(self, batch_size: int = 100) -> int:
+        """Sweep the database for due tasks the delayed scheduler missed."""
+        total = 0
+        while True:
+            claimed = await self.claim_due_tasks(limit=batch_size)
+            total += claimed
+            if claimed < batch_size:
+                return total
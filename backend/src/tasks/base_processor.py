@@ -5,15 +5,16 @@ from abc import ABC, abstractmethod
 from datetime import datetime, timezone
 from typing import Dict, Any, Optional, List
 from uuid import UUID
-import json
-import asyncio
 
 from celery import Task
 from sqlalchemy.orm import Session
 
 from src.core.celery_app import celery_app
 from src.core.database import get_session
-from src.core.websocket import ws_manager
+from src.core.websocket import get_event_publisher, task_delta
+from src.tasks.concurrency import get_concurrency_limiter
+from src.tasks.execution_steps import append_execution_steps
+from src.tasks.progress_buffer import ProgressBuffer
 from src.models.instance import InstanceTask, InstanceTaskStatus, TaskPriority
 from src.models.instance_schemas import TaskExecutionStep
 
@@ -21,13 +22,19 @@ logger = logging.getLogger(__name__)
 
 
 class BaseTaskProcessor(ABC):
-    """Base class for all task processors."""
+    """Base class for all task processors.
+
+    Progress updates and execution steps are buffered and written in batches
+    (see ``ProgressBuffer``); status changes and output are written through
+    immediately, together with anything still buffered.
+    """
     
     def __init__(self, task_id: UUID, instance_id: UUID):
         self.task_id = task_id
         self.instance_id = instance_id
         self.db_session: Optional[Session] = None
         self.task: Optional[InstanceTask] = None
+        self.progress_buffer = ProgressBuffer()
         
     def __enter__(self):
         """Enter context manager."""
@@ -47,7 +54,15 @@ class BaseTaskProcessor(ABC):
         if self.db_session:
             if exc_type:
                 self.db_session.rollback()
+                # Keep the steps that led up to the error
+                if self.progress_buffer.pending:
+                    try:
+                        self.flush_progress()
+                    except Exception as e:
+                        logger.error(f"Failed to write buffered steps of task {self.task_id}: {e}")
+                        self.db_session.rollback()
             else:
+                self._write_buffered()
                 self.db_session.commit()
             self.db_session.close()
     
@@ -61,28 +76,34 @@ class BaseTaskProcessor(ABC):
         if not self.task or not self.db_session:
             raise RuntimeError("Processor not initialized. Use within context manager.")
             
-        self.task.status = status
+        changes: Dict[str, Any] = {"status": status}
         if error_message:
-            self.task.error_message = error_message
+            changes["error_message"] = error_message
             
         # Update timestamps
         if status == InstanceTaskStatus.IN_PROGRESS and not self.task.processing_started_at:
-            self.task.processing_started_at = datetime.now(timezone.utc)
+            changes["processing_started_at"] = datetime.now(timezone.utc)
         elif status in [InstanceTaskStatus.COMPLETED, InstanceTaskStatus.FAILED]:
-            self.task.processing_ended_at = datetime.now(timezone.utc)
+            changes["processing_ended_at"] = datetime.now(timezone.utc)
+        
+        for name, value in changes.items():
+            setattr(self.task, name, value)
             
+        self._write_buffered()
         self.db_session.commit()
         
-        # Broadcast status update via WebSocket
-        self._broadcast_status_update(status, error_message)
+        # Broadcast the changed fields via WebSocket
+        self._broadcast_task_changes(changes)
     
     def update_progress(self, percentage: int, message: Optional[str] = None):
-        """Update task progress."""
+        """Update task progress. Written with the next flush."""
         if not self.task or not self.db_session:
             raise RuntimeError("Processor not initialized. Use within context manager.")
             
-        self.task.progress_percentage = max(0, min(100, percentage))
+        percentage = max(0, min(100, percentage))
+        self.progress_buffer.set_progress(percentage)
         
+        step = None
         if message:
             # Add to execution steps
             step = {
@@ -92,28 +113,26 @@ class BaseTaskProcessor(ABC):
                 "status": "in_progress",
                 "started_at": datetime.now(timezone.utc).isoformat()
             }
+            self.progress_buffer.add_step(step)
             
-            if not self.task.execution_steps:
-                self.task.execution_steps = []
-            self.task.execution_steps.append(step)
-            
-        self.db_session.commit()
+        if self.progress_buffer.should_flush():
+            self.flush_progress()
         
         # Broadcast progress update via WebSocket
-        self._broadcast_progress_update(percentage, message)
+        if step:
+            self._broadcast_execution_step(step)
+        self._broadcast_progress_update(percentage)
     
     def add_execution_step(self, step: TaskExecutionStep):
-        """Add an execution step to the task."""
+        """Add an execution step to the task. Written with the next flush."""
         if not self.task or not self.db_session:
             raise RuntimeError("Processor not initialized. Use within context manager.")
             
-        step_dict = step.model_dump()
+        step_dict = step.model_dump(mode="json")
+        self.progress_buffer.add_step(step_dict)
         
-        if not self.task.execution_steps:
-            self.task.execution_steps = []
-        self.task.execution_steps.append(step_dict)
-        
-        self.db_session.commit()
+        if self.progress_buffer.should_flush():
+            self.flush_progress()
         
         # Broadcast execution step via WebSocket
         self._broadcast_execution_step(step_dict)
@@ -128,10 +147,33 @@ class BaseTaskProcessor(ABC):
             
         self.task.output_format = output_format
         self.task.output_data = output_data
+        changes: Dict[str, Any] = {"output_format": output_format}
         if output_media_ids:
             self.task.output_media_ids = output_media_ids
+            changes["output_media_ids"] = output_media_ids
             
+        self._write_buffered()
         self.db_session.commit()
+        
+        # output_data can be large; clients fetch it when they need it
+        self._broadcast_task_changes(changes)
+    
+    def flush_progress(self):
+        """Write buffered progress and execution steps now."""
+        if not self.task or not self.db_session:
+            raise RuntimeError("Processor not initialized. Use within context manager.")
+            
+        if self._write_buffered():
+            self.db_session.commit()
+    
+    def _write_buffered(self) -> bool:
+        """Stage buffered progress and steps in the current transaction."""
+        if not self.progress_buffer.pending:
+            return False
+            
+        progress, steps = self.progress_buffer.drain()
+        append_execution_steps(self.db_session, self.task_id, steps, progress)
+        return True
     
     def parse_intent(self) -> Dict[str, Any]:
         """Parse task description to extract intent."""
@@ -144,56 +186,36 @@ class BaseTaskProcessor(ABC):
             "confidence": 0.0
         }
     
-    def _broadcast_status_update(self, status: InstanceTaskStatus, error_message: Optional[str] = None):
-        """Broadcast status update via WebSocket."""
+    def _broadcast_task_changes(self, changes: Dict[str, Any]):
+        """Broadcast changed task fields via WebSocket."""
         try:
-            # Run async broadcast in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(
-                ws_manager.broadcast_task_status(
-                    str(self.instance_id),
-                    str(self.task_id),
-                    status.value,
-                    error_message
-                )
+            get_event_publisher().task_update(
+                str(self.instance_id),
+                str(self.task_id),
+                task_delta(changes)
             )
-            loop.close()
         except Exception as e:
-            logger.error(f"Failed to broadcast status update: {e}")
+            logger.error(f"Failed to broadcast task update: {e}")
     
-    def _broadcast_progress_update(self, percentage: int, message: Optional[str] = None):
+    def _broadcast_progress_update(self, percentage: int):
         """Broadcast progress update via WebSocket."""
         try:
-            # Run async broadcast in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(
-                ws_manager.broadcast_task_progress(
-                    str(self.instance_id),
-                    str(self.task_id),
-                    percentage,
-                    message
-                )
+            get_event_publisher().task_progress(
+                str(self.instance_id),
+                str(self.task_id),
+                percentage
             )
-            loop.close()
         except Exception as e:
             logger.error(f"Failed to broadcast progress update: {e}")
     
     def _broadcast_execution_step(self, step: Dict[str, Any]):
         """Broadcast execution step via WebSocket."""
         try:
-            # Run async broadcast in sync context
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            loop.run_until_complete(
-                ws_manager.broadcast_execution_step(
-                    str(self.instance_id),
-                    str(self.task_id),
-                    step
-                )
+            get_event_publisher().execution_step(
+                str(self.instance_id),
+                str(self.task_id),
+                step
             )
-            loop.close()
         except Exception as e:
             logger.error(f"Failed to broadcast execution step: {e}")
 
@@ -219,6 +241,14 @@ class CeleryTaskProcessor(Task):
         
         # Execute processor
         with ProcessorClass(task_uuid, instance_uuid) as processor:
+            if processor.task.status == InstanceTaskStatus.CANCELLED:
+                # Cancelled while waiting in the instance's pending lane
+                logger.info(f"Skipping cancelled task {task_id}")
+                return {"skipped": True, "reason": "cancelled"}
+            if processor.task.status == InstanceTaskStatus.COMPLETED:
+                # Published again by a restored or reconciled dispatch
+                logger.info(f"Skipping completed task {task_id}")
+                return {"skipped": True, "reason": "completed"}
             try:
                 processor.update_status(InstanceTaskStatus.IN_PROGRESS)
                 result = processor.process()
@@ -230,13 +260,28 @@ class CeleryTaskProcessor(Task):
                 processor.task.retry_count += 1
                 raise
     
+    def on_success(self, retval, task_id, args, kwargs):
+        """Handle successful completion."""
+        self._release_slot(args)
+    
     def on_retry(self, exc, task_id, args, kwargs, einfo):
         """Handle retry event."""
+        # The concurrency slot is kept across retries
         logger.warning(f"Retrying task {args[0]} due to: {exc}")
     
     def on_failure(self, exc, task_id, args, kwargs, einfo):
         """Handle final failure."""
         logger.error(f"Task {args[0]} failed permanently: {exc}")
+        self._release_slot(args)
+    
+    def _release_slot(self, args):
+        """Free the task's in-flight and concurrency slots and dispatch the next tasks."""
+        try:
+            limiter = get_concurrency_limiter()
+            limiter.dispatcher.complete(args[0])
+            limiter.release_and_dispatch(args[1], args[0])
+        except Exception as e:
+            logger.error(f"Error releasing concurrency slot of task {args[0]}: {e}")
 
 
 # Register the Celery task
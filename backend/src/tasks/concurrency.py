@@ -0,0 +1,184 @@
+"""Per-instance concurrency limiting for task dispatch."""
+
+import json
+import logging
+import time
+from typing import Any, Dict, List, Optional, Sequence, Set
+from uuid import UUID
+
+import redis
+
+from src.core.config import get_settings
+from src.tasks.fair_share import DEFAULT_FAIR_SHARE_WEIGHT, FairShareDispatcher
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENT_TASKS = 3
+
+# KEYS: active slots (ZSET task_id -> lease expiry), pending lane (LIST), limit
+# ARGV: task_id, limit, now, lease expiry, dispatch payload
+# Returns 1 if a slot was acquired, 0 if the payload was parked in the lane.
+_ACQUIRE_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[3])
+redis.call('SET', KEYS[3], ARGV[2])
+if redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+    return 1
+end
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[2]) and redis.call('LLEN', KEYS[2]) == 0 then
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[1])
+    return 1
+end
+redis.call('RPUSH', KEYS[2], ARGV[5])
+return 0
+"""
+
+# KEYS: active slots, pending lane, limit
+# ARGV: task_id ('' to only reclaim expired slots), now, lease expiry
+# Frees the slot and moves as many pending payloads as fit into the active set;
+# returns the payloads that now own a slot and must be published.
+_RELEASE_SCRIPT = """
+if ARGV[1] ~= '' then
+    redis.call('ZREM', KEYS[1], ARGV[1])
+end
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+local limit = tonumber(redis.call('GET', KEYS[3]) or '1')
+local released = {}
+while redis.call('ZCARD', KEYS[1]) < limit do
+    local payload = redis.call('LPOP', KEYS[2])
+    if not payload then
+        break
+    end
+    redis.call('ZADD', KEYS[1], ARGV[3], cjson.decode(payload)['task_id'])
+    table.insert(released, payload)
+end
+return released
+"""
+
+
+def get_concurrency_limit(configuration: Optional[Dict[str, Any]]) -> int:
+    """Read max_concurrent_tasks from an instance configuration."""
+    limit = (configuration or {}).get("max_concurrent_tasks", DEFAULT_MAX_CONCURRENT_TASKS)
+    try:
+        return max(1, int(limit))
+    except (TypeError, ValueError):
+        return DEFAULT_MAX_CONCURRENT_TASKS
+
+
+def build_dispatch_payload(
+    task_id: UUID,
+    instance_id: UUID,
+    processor_path: str,
+    queue: str,
+    weight: float = DEFAULT_FAIR_SHARE_WEIGHT
+) -> Dict[str, Any]:
+    """Everything needed to publish a held task once a slot frees up."""
+    return {
+        "task_id": str(task_id),
+        "instance_id": str(instance_id),
+        "processor_path": processor_path,
+        "queue": queue,
+        "weight": weight,
+        "queued_at": time.time(),
+    }
+
+
+class InstanceConcurrencyLimiter:
+    """Redis-backed counting semaphore per instance with a pending lane.
+
+    Each running task holds a slot in a sorted set scored by lease expiry, so
+    slots leaked by a crashed worker are reclaimed automatically. Tasks over
+    the limit wait in a FIFO list and are handed a slot, in order, whenever a
+    running task of the same instance finishes.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        lease_seconds: Optional[int] = None,
+        dispatcher: Optional[FairShareDispatcher] = None
+    ):
+        settings = get_settings()
+        if redis_client:
+            self.redis = redis_client
+        else:
+            self.redis = redis.from_url(settings.redis_url, decode_responses=True)
+        self.lease_seconds = lease_seconds or settings.concurrency_slot_lease_seconds
+        self.dispatcher = dispatcher or FairShareDispatcher(redis_client=self.redis)
+        self.namespace = "swallowtail:concurrency:"
+        self._acquire_script = self.redis.register_script(_ACQUIRE_SCRIPT)
+        self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+
+    def _keys(self, instance_id: str) -> List[str]:
+        """Active, pending and limit keys for an instance."""
+        prefix = f"{self.namespace}{instance_id}"
+        return [f"{prefix}:active", f"{prefix}:pending", f"{prefix}:limit"]
+
+    def acquire(self, payload: Dict[str, str], limit: int) -> bool:
+        """Take a slot for the task, or park it in the pending lane."""
+        return self.acquire_many([(payload, limit)])[0]
+
+    def acquire_many(self, requests: Sequence[tuple]) -> List[bool]:
+        """Acquire slots for several (payload, limit) pairs in one round trip."""
+        if not requests:
+            return []
+        now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for payload, limit in requests:
+            self._acquire_script(
+                keys=self._keys(payload["instance_id"]),
+                args=[payload["task_id"], limit, now, now + self.lease_seconds, json.dumps(payload)],
+                client=pipe
+            )
+        return [bool(result) for result in pipe.execute()]
+
+    def release(self, instance_id: str, task_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """Free a task's slot and return the pending payloads that took over."""
+        now = time.time()
+        released = self._release_script(
+            keys=self._keys(str(instance_id)),
+            args=[str(task_id) if task_id else '', now, now + self.lease_seconds]
+        )
+        return [json.loads(payload) for payload in released]
+
+    def release_and_dispatch(self, instance_id: str, task_id: Optional[str] = None) -> int:
+        """Free a slot and hand the tasks that were waiting for it to the dispatcher."""
+        payloads = self.release(instance_id, task_id)
+        if payloads:
+            self.dispatcher.enqueue_many(payloads)
+            logger.info(f"Released {len(payloads)} held tasks for instance {instance_id}")
+        self.dispatcher.pump()
+        return len(payloads)
+
+    def reclaim_expired(self) -> int:
+        """Dispatch pending tasks of instances whose slots expired without a release."""
+        dispatched = 0
+        for key in self.redis.scan_iter(match=f"{self.namespace}*:pending"):
+            instance_id = key[len(self.namespace):-len(":pending")]
+            dispatched += self.release_and_dispatch(instance_id)
+        return dispatched
+
+    def held_task_ids(self) -> Set[str]:
+        """Ids of the tasks waiting in a pending lane for a slot."""
+        task_ids: Set[str] = set()
+        for key in self.redis.scan_iter(match=f"{self.namespace}*:pending"):
+            task_ids.update(json.loads(raw)["task_id"] for raw in self.redis.lrange(key, 0, -1))
+        return task_ids
+
+    def pending_count(self, instance_id: str) -> int:
+        """Number of tasks waiting for a slot."""
+        return self.redis.llen(self._keys(str(instance_id))[1])
+
+    def active_count(self, instance_id: str) -> int:
+        """Number of slots currently held (including not yet expired leases)."""
+        return self.redis.zcount(self._keys(str(instance_id))[0], time.time(), '+inf')
+
+
+_limiter: Optional[InstanceConcurrencyLimiter] = None
+
+
+def get_concurrency_limiter() -> InstanceConcurrencyLimiter:
+    """Get the process-wide concurrency limiter, created on first use."""
+    global _limiter
+    if _limiter is None:
+        _limiter = InstanceConcurrencyLimiter()
+    return _limiter
@@ -0,0 +1,137 @@
+"""Redis sorted-set scheduler for tasks with a future execution time."""
+
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+from uuid import UUID
+
+import redis
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Atomically pop every member whose score (due timestamp) is <= ARGV[1].
+# Running ZRANGEBYSCORE and ZREM in one script means two scheduler replicas
+# can never pop the same task id.
+_POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+class DelayedTaskScheduler:
+    """Tracks due times of scheduled tasks in a Redis sorted set.
+
+    Each scheduled task is a ZSET member scored by its due timestamp, so
+    finding the next due task is O(log n) and the runner can wake up with
+    sub-second precision instead of scanning the database on a crontab.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None, key: Optional[str] = None):
+        if redis_client:
+            self.redis = redis_client
+        else:
+            settings = get_settings()
+            self.redis = redis.from_url(settings.redis_url, decode_responses=True)
+        self.key = key or "swallowtail:scheduler:due_tasks"
+        self._pop_due_script = self.redis.register_script(_POP_DUE_SCRIPT)
+
+    def schedule(self, task_id: UUID, due_at: datetime) -> None:
+        """Schedule a single task."""
+        self.schedule_many({task_id: due_at})
+
+    def schedule_many(self, due_times: Dict[UUID, datetime]) -> None:
+        """Schedule several tasks with a single ZADD."""
+        if not due_times:
+            return
+        self.redis.zadd(self.key, {
+            str(task_id): self._to_timestamp(due_at)
+            for task_id, due_at in due_times.items()
+        })
+
+    def unschedule(self, task_ids: Iterable[UUID]) -> None:
+        """Remove tasks from the schedule."""
+        members = [str(task_id) for task_id in task_ids]
+        if members:
+            self.redis.zrem(self.key, *members)
+
+    def pop_due(self, now: Optional[datetime] = None, limit: int = 100) -> List[UUID]:
+        """Atomically remove and return up to ``limit`` task ids that are due."""
+        now_ts = self._to_timestamp(now or datetime.now(timezone.utc))
+        members = self._pop_due_script(keys=[self.key], args=[now_ts, limit])
+        return [UUID(member) for member in members]
+
+    def seconds_until_next(self, now: Optional[datetime] = None) -> Optional[float]:
+        """Seconds until the earliest scheduled task is due, or None if empty."""
+        head = self.redis.zrange(self.key, 0, 0, withscores=True)
+        if not head:
+            return None
+        now_ts = self._to_timestamp(now or datetime.now(timezone.utc))
+        return max(0.0, head[0][1] - now_ts)
+
+    def run_forever(self, poll_interval: Optional[float] = None, batch_size: int = 100) -> None:
+        """Pop due tasks and hand them to the queue until interrupted."""
+        from src.core.database import SessionLocal
+        from src.tasks.concurrency import get_concurrency_limiter
+        from src.tasks.processors import register_task_processors
+        from src.tasks.queue_service import TaskQueueService
+
+        settings = get_settings()
+        poll_interval = poll_interval or settings.scheduler_poll_interval_seconds
+        register_task_processors()
+        limiter = get_concurrency_limiter()
+        dispatcher = limiter.dispatcher
+        logger.info(f"Delayed task scheduler started (key={self.key}, poll={poll_interval}s)")
+
+        while True:
+            try:
+                task_ids = self.pop_due(limit=batch_size)
+                if task_ids:
+                    db = SessionLocal()
+                    try:
+                        queued = TaskQueueService(
+                            db, scheduler=self, limiter=limiter, dispatcher=dispatcher
+                        ).claim_due_tasks(task_ids)
+                        logger.info(f"Scheduler queued {queued} of {len(task_ids)} due tasks")
+                    finally:
+                        db.close()
+                    # A full batch probably means more are already due
+                    if len(task_ids) == batch_size:
+                        continue
+
+                # Catch in-flight budget freed by expired leases or missed pumps
+                dispatcher.pump()
+
+                wait = self.seconds_until_next()
+                time.sleep(poll_interval if wait is None else min(wait, poll_interval))
+            except KeyboardInterrupt:
+                logger.info("Delayed task scheduler stopped")
+                return
+            except Exception as e:
+                logger.error(f"Error in delayed task scheduler: {e}")
+                time.sleep(poll_interval)
+
+    @staticmethod
+    def _to_timestamp(value: datetime) -> float:
+        """Convert a datetime to a POSIX timestamp, treating naive values as UTC."""
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+
+
+def main() -> None:
+    """Run the delayed task scheduler as a standalone process."""
+    logging.basicConfig(
+        level=getattr(logging, get_settings().log_level),
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    DelayedTaskScheduler().run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Storage for task execution steps in the append-only task_execution_steps table."""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import Select, Update, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.models.instance import InstanceTask, InstanceTaskStep
+from src.models.instance_schemas import TaskExecutionLog
+
+DEFAULT_STEP_PAGE_SIZE = 100
+MAX_STEP_PAGE_SIZE = 500
+
+# TaskExecutionStep.status -> TaskExecutionLog.status
+_LOG_STATUSES = {
+    "completed": "success",
+    "failed": "error",
+}
+
+
+def _reserve_statement(
+    task_id: UUID,
+    step_count: int,
+    progress: Optional[int]
+) -> Optional[Update]:
+    """UPDATE setting progress and reserving ``step_count`` seq numbers, if any."""
+    values: Dict[str, Any] = {}
+    if progress is not None:
+        values["progress_percentage"] = progress
+    if step_count:
+        values["step_count"] = InstanceTask.step_count + step_count
+    if not values:
+        return None
+    stmt = (
+        update(InstanceTask)
+        .where(InstanceTask.id == task_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if step_count:
+        stmt = stmt.returning(InstanceTask.step_count)
+    return stmt
+
+
+def _step_rows(task_id: UUID, steps: Sequence[Dict[str, Any]], last_seq: int) -> List[Dict[str, Any]]:
+    """Rows of a batch numbered up to the reserved ``last_seq``."""
+    first_seq = last_seq - len(steps) + 1
+    return [
+        {"task_id": task_id, "seq": first_seq + offset, "step": step}
+        for offset, step in enumerate(steps)
+    ]
+
+
+def _steps_select(task_id: UUID, after_seq: int, limit: Optional[int]) -> Select:
+    stmt = select(InstanceTaskStep).where(
+        InstanceTaskStep.task_id == task_id,
+        InstanceTaskStep.seq > after_seq
+    ).order_by(InstanceTaskStep.seq)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return stmt
+
+
+def append_execution_steps(
+    session: Session,
+    task_id: UUID,
+    steps: Sequence[Dict[str, Any]],
+    progress: Optional[int] = None
+) -> None:
+    """Append steps (JSON-serializable dicts) and optionally set progress.
+
+    One UPDATE reserves a block of ``seq`` numbers on the task row, which
+    serializes concurrent writers of the same task, and one INSERT writes the
+    batch. Neither depends on how many steps the task already has. The caller
+    commits.
+    """
+    stmt = _reserve_statement(task_id, len(steps), progress)
+    if stmt is None:
+        return
+    if not steps:
+        session.execute(stmt)
+        return
+
+    last_seq = session.execute(stmt).scalar_one()
+    session.execute(insert(InstanceTaskStep), _step_rows(task_id, steps, last_seq))
+
+
+async def append_execution_steps_async(
+    session: AsyncSession,
+    task_id: UUID,
+    steps: Sequence[Dict[str, Any]],
+    progress: Optional[int] = None
+) -> None:
+    """``append_execution_steps`` on an ``AsyncSession``."""
+    stmt = _reserve_statement(task_id, len(steps), progress)
+    if stmt is None:
+        return
+    if not steps:
+        await session.execute(stmt)
+        return
+
+    last_seq = (await session.execute(stmt)).scalar_one()
+    await session.execute(insert(InstanceTaskStep), _step_rows(task_id, steps, last_seq))
+
+
+def list_execution_steps(
+    session: Session,
+    task_id: UUID,
+    after_seq: int = 0,
+    limit: Optional[int] = DEFAULT_STEP_PAGE_SIZE
+) -> List[InstanceTaskStep]:
+    """Steps of a task with ``seq`` greater than ``after_seq``, oldest first."""
+    query = session.query(InstanceTaskStep).filter(
+        InstanceTaskStep.task_id == task_id,
+        InstanceTaskStep.seq > after_seq
+    ).order_by(InstanceTaskStep.seq)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+
+async def list_execution_steps_async(
+    session: AsyncSession,
+    task_id: UUID,
+    after_seq: int = 0,
+    limit: Optional[int] = DEFAULT_STEP_PAGE_SIZE
+) -> List[InstanceTaskStep]:
+    """``list_execution_steps`` on an ``AsyncSession``."""
+    return list(await session.scalars(_steps_select(task_id, after_seq, limit)))
+
+
+def step_to_log(record: InstanceTaskStep, default_timestamp: datetime) -> TaskExecutionLog:
+    """Convert a stored step into the log entry shown in task details."""
+    step = record.step if isinstance(record.step, dict) else {}
+    output = step.get('output')
+    return TaskExecutionLog(
+        seq=record.seq,
+        timestamp=step.get('started_at') or step.get('timestamp') or record.created_at or default_timestamp,
+        agent_name=step.get('agent', 'System'),
+        action=step.get('action', 'Processing'),
+        status=_LOG_STATUSES.get(step.get('status'), 'info'),
+        message=output.get('message', '') if isinstance(output, dict) else str(output or step.get('error') or ''),
+        details=output if isinstance(output, dict) else None
+    )
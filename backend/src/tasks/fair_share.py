@@ -0,0 +1,320 @@
+"""Weighted fair-share dispatching of tasks to the Celery queues."""
+
+import json
+import logging
+import math
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+import redis
+
+from src.core.celery_app import celery_app
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FAIR_SHARE_WEIGHT = 1.0
+MIN_FAIR_SHARE_WEIGHT = 0.1
+
+# Time a published task may wait in the broker before its hard time limit starts
+IN_FLIGHT_LEASE_MARGIN_SECONDS = 5 * 60
+
+# KEYS: instance sub-queue (LIST), ring members (SET), ring (LIST)
+# ARGV: payload, instance_id
+# Appends the payload and puts the instance at the back of the ring if it was idle.
+_ENQUEUE_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+if redis.call('SADD', KEYS[2], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+# KEYS: instance sub-queue (LIST), ring members (SET), ring (LIST)
+# ARGV: payload, instance_id
+# Puts a payload that was not published back at the head of its sub-queue.
+_RESTORE_SCRIPT = """
+redis.call('LPUSH', KEYS[1], ARGV[1])
+if redis.call('SADD', KEYS[2], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+# KEYS: instance sub-queue, ring members, ring, deficits (HASH)
+# ARGV: instance_id
+# Drops an instance from the ring only if its sub-queue is still empty, so a
+# concurrent enqueue can never strand a payload outside the ring.
+_RETIRE_SCRIPT = """
+if redis.call('LLEN', KEYS[1]) > 0 then
+    return 0
+end
+redis.call('LREM', KEYS[3], 1, ARGV[1])
+redis.call('SREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[4], ARGV[1])
+return 1
+"""
+
+
+def get_fair_share_weight(configuration: Optional[Dict[str, Any]]) -> float:
+    """Read fair_share_weight from an instance configuration."""
+    weight = (configuration or {}).get("fair_share_weight", DEFAULT_FAIR_SHARE_WEIGHT)
+    try:
+        return max(MIN_FAIR_SHARE_WEIGHT, float(weight))
+    except (TypeError, ValueError):
+        return DEFAULT_FAIR_SHARE_WEIGHT
+
+
+def default_in_flight() -> int:
+    """In-flight budget per Celery queue when none is configured.
+
+    One worker's concurrency (Celery's default is the CPU count). The budget
+    is shared by the whole cluster, so deployments with several workers
+    must set ``FAIR_SHARE_IN_FLIGHT_PER_QUEUE`` to their total.
+    """
+    return celery_app.conf.worker_concurrency or os.cpu_count() or 1
+
+
+def default_in_flight_lease() -> int:
+    """Seconds before the in-flight budget of an unfinished task is reclaimed.
+
+    A task that runs longer than Celery's hard time limit has been killed,
+    so a crashed worker holds its budget no longer than that.
+    """
+    return (celery_app.conf.task_time_limit or 0) + IN_FLIGHT_LEASE_MARGIN_SECONDS
+
+
+def publish_payload(payload: Dict[str, Any]) -> None:
+    """Publish a dispatch payload to its Celery queue."""
+    celery_app.send_task(
+        'process_task',
+        args=[payload["task_id"], payload["instance_id"], payload["processor_path"]],
+        queue=payload["queue"],
+        task_id=f"task_{payload['task_id']}"
+    )
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = math.ceil(percentile / 100 * len(sorted_values))
+    return sorted_values[max(0, min(len(sorted_values), rank) - 1)]
+
+
+class FairShareDispatcher:
+    """Deficit round-robin over per-instance sub-queues of each Celery queue.
+
+    Tasks are not sent to a Celery queue directly. Each instance gets its own
+    sub-queue per priority queue, and ``pump`` publishes from the sub-queues
+    in round-robin order, giving every instance ``fair_share_weight`` tasks
+    per round. Only ``in_flight`` tasks per Celery queue are published at a
+    time, so the broker queues stay short and a burst from one instance
+    cannot push everyone else's work back by hours.
+
+    A payload leaves its sub-queue with ``LMOVE`` into the queue's
+    ``publishing`` list and is only dropped from there once Celery accepted
+    it. A failed publish puts it back at the head of its sub-queue; so does
+    the next pump for anything a dead pump left behind.
+    """
+
+    def __init__(
+        self,
+        redis_client: Optional[redis.Redis] = None,
+        in_flight: Optional[int] = None,
+        lease_seconds: Optional[int] = None
+    ):
+        settings = get_settings()
+        if redis_client:
+            self.redis = redis_client
+        else:
+            self.redis = redis.from_url(settings.redis_url, decode_responses=True)
+        self.in_flight = in_flight or settings.fair_share_in_flight_per_queue or default_in_flight()
+        self.lease_seconds = lease_seconds or settings.fair_share_lease_seconds or default_in_flight_lease()
+        self.wait_samples = settings.fair_share_wait_samples
+        self.namespace = "swallowtail:fairshare:"
+        self.queues = [queue.name for queue in celery_app.conf.task_queues]
+        self._enqueue_script = self.redis.register_script(_ENQUEUE_SCRIPT)
+        self._retire_script = self.redis.register_script(_RETIRE_SCRIPT)
+        self._restore_script = self.redis.register_script(_RESTORE_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        """Build a namespaced key."""
+        return self.namespace + ":".join(parts)
+
+    def enqueue_many(self, payloads: Iterable[Dict[str, Any]]) -> int:
+        """Add payloads to their instance sub-queues in one round trip."""
+        pipe = self.redis.pipeline(transaction=False)
+        count = 0
+        for payload in payloads:
+            queue, instance_id = payload["queue"], payload["instance_id"]
+            pipe.hset(self._key("weights"), instance_id, payload.get("weight", DEFAULT_FAIR_SHARE_WEIGHT))
+            self._enqueue_script(
+                keys=[self._key(queue, "sub", instance_id), self._key(queue, "members"), self._key(queue, "ring")],
+                args=[json.dumps(payload), instance_id],
+                client=pipe
+            )
+            count += 1
+        if count:
+            pipe.execute()
+        return count
+
+    def complete(self, task_id: str) -> None:
+        """Give back the in-flight budget held by a finished task."""
+        pipe = self.redis.pipeline(transaction=False)
+        for queue in self.queues:
+            pipe.zrem(self._key(queue, "inflight"), task_id)
+        pipe.execute()
+
+    def pump(self) -> int:
+        """Publish as many tasks as the in-flight budgets allow.
+
+        Only one process pumps at a time; if another holds the lock it is
+        already publishing and will see any newly enqueued work.
+        """
+        lock = self.redis.lock(self._key("lock"), timeout=30, blocking_timeout=0)
+        if not lock.acquire(blocking=False):
+            return 0
+        try:
+            return sum(self._pump_queue(queue) for queue in self.queues)
+        finally:
+            try:
+                lock.release()
+            except redis.exceptions.LockError:
+                logger.warning("Fair-share pump lock expired before release")
+
+    def _pump_queue(self, queue: str) -> int:
+        """Run deficit round-robin rounds for one Celery queue."""
+        now = time.time()
+        inflight_key = self._key(queue, "inflight")
+        ring_key = self._key(queue, "ring")
+        deficits_key = self._key(queue, "deficit")
+        publishing_key = self._key(queue, "publishing")
+        self._restore_publishing(queue)
+
+        self.redis.zremrangebyscore(inflight_key, '-inf', now)
+        budget = self.in_flight - self.redis.zcard(inflight_key)
+        weights = self.redis.hgetall(self._key("weights"))
+
+        published = 0
+        while budget > 0:
+            instance_id = self.redis.lindex(ring_key, 0)
+            if instance_id is None:
+                break
+
+            sub_key = self._key(queue, "sub", instance_id)
+            weight = float(weights.get(instance_id, DEFAULT_FAIR_SHARE_WEIGHT))
+            deficit = float(self.redis.hget(deficits_key, instance_id) or 0) + weight
+
+            while deficit >= 1 and budget > 0:
+                raw = self.redis.lmove(sub_key, publishing_key, 'LEFT', 'RIGHT')
+                if raw is None:
+                    break
+                if not self._publish(queue, raw, now):
+                    # The broker is unavailable; the payload is back in its sub-queue
+                    return published
+                deficit -= 1
+                budget -= 1
+                published += 1
+
+            if self._retire_script(
+                keys=[sub_key, self._key(queue, "members"), ring_key, deficits_key],
+                args=[instance_id]
+            ):
+                # An idle instance does not bank credit for later
+                continue
+
+            self.redis.hset(deficits_key, instance_id, deficit)
+            if deficit < 1:
+                # Quantum used up: move to the back of the ring
+                self.redis.lmove(ring_key, ring_key, 'LEFT', 'RIGHT')
+
+        return published
+
+    def _publish(self, queue: str, raw: str, now: float) -> bool:
+        """Publish one task from the publishing list and record how long it waited.
+
+        Returns False, with the payload back at the head of its sub-queue, if
+        Celery did not accept it.
+        """
+        payload = json.loads(raw)
+        publishing_key = self._key(queue, "publishing")
+        try:
+            publish_payload(payload)
+        except Exception as e:
+            logger.error(f"Error publishing task {payload['task_id']} to {queue}, keeping it queued: {e}")
+            self._restore(queue, raw, payload)
+            return False
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lrem(publishing_key, 1, raw)
+        pipe.zadd(self._key(queue, "inflight"), {payload["task_id"]: now + self.lease_seconds})
+        if payload.get("queued_at"):
+            waits_key = self._key("waits", payload["instance_id"])
+            pipe.lpush(waits_key, round(now - float(payload["queued_at"]), 3))
+            pipe.ltrim(waits_key, 0, self.wait_samples - 1)
+        pipe.execute()
+        return True
+
+    def _restore_publishing(self, queue: str) -> int:
+        """Put payloads a dead pump was publishing back at the head of their sub-queues.
+
+        Runs under the pump lock, so nothing else is publishing. Such a
+        payload may already have reached Celery, which is preferred over
+        losing it.
+        """
+        restored = 0
+        publishing_key = self._key(queue, "publishing")
+        while True:
+            raw = self.redis.lindex(publishing_key, -1)
+            if raw is None:
+                return restored
+            payload = json.loads(raw)
+            logger.warning(f"Restoring task {payload['task_id']} left unpublished in {queue}")
+            self._restore(queue, raw, payload)
+            restored += 1
+
+    def _restore(self, queue: str, raw: str, payload: Dict[str, Any]) -> None:
+        """Move a payload from the publishing list back to the head of its sub-queue."""
+        instance_id = payload["instance_id"]
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.lrem(self._key(queue, "publishing"), 1, raw)
+        self._restore_script(
+            keys=[self._key(queue, "sub", instance_id), self._key(queue, "members"), self._key(queue, "ring")],
+            args=[raw, instance_id],
+            client=pipe
+        )
+        pipe.execute()
+
+    def tracked_task_ids(self) -> Set[str]:
+        """Ids of the tasks waiting in a sub-queue, being published or in flight.
+
+        Keys are read in the order tasks move through them, so a task that
+        moves on during the scan is still seen.
+        """
+        task_ids: Set[str] = set()
+        for queue in self.queues:
+            lists = list(self.redis.scan_iter(match=self._key(queue, "sub", "*")))
+            lists.append(self._key(queue, "publishing"))
+            for key in lists:
+                task_ids.update(json.loads(raw)["task_id"] for raw in self.redis.lrange(key, 0, -1))
+            task_ids.update(self.redis.zrange(self._key(queue, "inflight"), 0, -1))
+        return task_ids
+
+    def backlog(self, instance_id: str) -> Dict[str, int]:
+        """Number of tasks waiting in each of an instance's sub-queues."""
+        pipe = self.redis.pipeline(transaction=False)
+        for queue in self.queues:
+            pipe.llen(self._key(queue, "sub", instance_id))
+        return dict(zip(self.queues, pipe.execute()))
+
+    def wait_time_percentiles(self, instance_id: str) -> Dict[str, Any]:
+        """Percentiles of the most recent dispatch wait times of an instance."""
+        samples = sorted(float(value) for value in self.redis.lrange(self._key("waits", instance_id), 0, -1))
+        stats: Dict[str, Any] = {"samples": len(samples), "p50": None, "p90": None, "p99": None, "max": None}
+        if samples:
+            stats.update(
+                p50=_percentile(samples, 50),
+                p90=_percentile(samples, 90),
+                p99=_percentile(samples, 99),
+                max=samples[-1]
+            )
+        return stats
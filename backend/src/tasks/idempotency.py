@@ -0,0 +1,132 @@
+"""Duplicate task submission detection backed by Redis."""
+
+import hashlib
+import json
+import logging
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import redis
+
+from src.core.config import get_settings
+from src.models.instance_schemas import TaskSubmission
+from src.tasks.intent_classifier import normalize_description
+
+logger = logging.getLogger(__name__)
+
+PENDING_PREFIX = "pending:"
+
+# KEYS: dedup keys for one submission
+# ARGV: pending marker, pending TTL, final TTL per key
+# Returns the value already stored under any key (a task id or a pending
+# marker), or reserves every key with the pending marker and returns nil.
+_RESERVE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    local existing = redis.call('GET', key)
+    if existing then
+        if string.sub(existing, 1, 8) ~= 'pending:' then
+            for j, other in ipairs(KEYS) do
+                redis.call('SET', other, existing, 'EX', ARGV[j + 2], 'NX')
+            end
+        end
+        return existing
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('SET', key, ARGV[1], 'EX', ARGV[2])
+end
+return false
+"""
+
+# KEYS: dedup keys; ARGV: pending marker
+# Deletes only keys still holding our own pending marker.
+_RELEASE_SCRIPT = """
+for i, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+    end
+end
+return 1
+"""
+
+
+class SubmissionInProgressError(Exception):
+    """An identical submission is still being created."""
+
+
+def get_dedup_window(configuration: Optional[Dict[str, Any]]) -> int:
+    """Read dedup_window_seconds from an instance configuration."""
+    default = get_settings().task_dedup_window_seconds
+    window = (configuration or {}).get("dedup_window_seconds", default)
+    try:
+        return max(0, int(window))
+    except (TypeError, ValueError):
+        return default
+
+
+def submission_fingerprint(submission: TaskSubmission) -> str:
+    """Hash of the fields that make two submissions the same request."""
+    content = {
+        "description": normalize_description(submission.description),
+        "priority": submission.priority.value,
+        "scheduled_for": submission.scheduled_for.isoformat() if submission.scheduled_for else None,
+        "recurring_pattern": submission.recurring_pattern,
+        "attached_media_ids": sorted(str(media_id) for media_id in submission.attached_media_ids),
+    }
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class SubmissionDeduplicator:
+    """Maps idempotency keys and submission fingerprints to task ids.
+
+    A submission first reserves its keys with a short-lived pending marker;
+    once the task is committed the keys are pointed at the task id for their
+    full TTL. A retry that arrives while the original is still being created
+    sees the marker, and a failed creation removes it so retries can proceed.
+    """
+
+    def __init__(self, redis_client: Optional[redis.Redis] = None):
+        settings = get_settings()
+        if redis_client:
+            self.redis = redis_client
+        else:
+            self.redis = redis.from_url(settings.redis_url, decode_responses=True)
+        self.key_ttl = settings.idempotency_key_ttl_seconds
+        self.pending_ttl = settings.idempotency_pending_ttl_seconds
+        self.namespace = "swallowtail:idempotency:"
+        self._reserve_script = self.redis.register_script(_RESERVE_SCRIPT)
+        self._release_script = self.redis.register_script(_RELEASE_SCRIPT)
+
+    def keys_for(
+        self,
+        instance_id: UUID,
+        submission: TaskSubmission,
+        idempotency_key: Optional[str] = None,
+        dedup_window: int = 0
+    ) -> Dict[str, int]:
+        """Dedup keys of a submission mapped to their TTL in seconds."""
+        keys = {}
+        if idempotency_key:
+            keys[f"{self.namespace}{instance_id}:key:{idempotency_key}"] = self.key_ttl
+        if dedup_window > 0:
+            keys[f"{self.namespace}{instance_id}:content:{submission_fingerprint(submission)}"] = dedup_window
+        return keys
+
+    def reserve(self, keys: Dict[str, int], task_id: UUID) -> Optional[str]:
+        """Reserve the keys for a new task, or return what they already hold."""
+        names: List[str] = list(keys)
+        return self._reserve_script(
+            keys=names,
+            args=[f"{PENDING_PREFIX}{task_id}", self.pending_ttl] + [keys[name] for name in names]
+        )
+
+    def confirm(self, keys: Dict[str, int], task_id: UUID) -> None:
+        """Point the reserved keys at the committed task."""
+        pipe = self.redis.pipeline(transaction=False)
+        for name, ttl in keys.items():
+            pipe.set(name, str(task_id), ex=ttl)
+        pipe.execute()
+
+    def release(self, keys: Dict[str, int], task_id: UUID) -> None:
+        """Drop our reservation after a failed submission."""
+        self._release_script(keys=list(keys), args=[f"{PENDING_PREFIX}{task_id}"])
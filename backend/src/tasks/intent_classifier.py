@@ -0,0 +1,140 @@
+"""Intent classification for task descriptions."""
+
+import hashlib
+import logging
+import re
+from typing import Callable, List, Optional, Sequence, Tuple
+
+from src.core.cache import TTLCache
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+GENERAL_INTENT = 'general'
+
+# Ordered by precedence: when a description matches several intents the
+# earliest rule wins. Keywords also match inflections ("posts", "analyzed").
+DEFAULT_INTENT_RULES: List[Tuple[str, List[str]]] = [
+    ('content_creation', ['post', 'content', 'social']),
+    ('market_analysis', ['analyze', 'research', 'market']),
+    ('email_campaign', ['email', 'campaign', 'newsletter']),
+    ('product_management', ['product', 'listing', 'inventory']),
+]
+
+IntentFallback = Callable[[str], Optional[str]]
+
+
+def normalize_description(description: str) -> str:
+    """Lower-case and collapse whitespace so trivially different texts share a key."""
+    return " ".join(description.lower().split())
+
+
+class IntentClassifier:
+    """Two-stage intent classifier.
+
+    The first stage runs every keyword rule in one pass of a single compiled
+    regex. Descriptions no rule matches go to an optional ``fallback`` (LLM,
+    embeddings, ...) whose answers are memoized by a hash of the normalized
+    description, so a recurring description is only ever classified once.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[Sequence[Tuple[str, Sequence[str]]]] = None,
+        fallback: Optional[IntentFallback] = None,
+        cache_size: int = 1024,
+        cache_ttl_seconds: float = 24 * 60 * 60
+    ):
+        self.rules = list(rules or DEFAULT_INTENT_RULES)
+        self.intents = [intent for intent, _ in self.rules]
+        self.fallback = fallback
+        self._cache = TTLCache(cache_size, cache_ttl_seconds)
+        # One named group per rule; group name "r<index>" encodes precedence
+        alternatives = "|".join(
+            f"(?P<r{index}>{'|'.join(re.escape(keyword) for keyword in keywords)})"
+            for index, (_, keywords) in enumerate(self.rules)
+        )
+        self._pattern = re.compile(rf"\b(?:{alternatives})\w*", re.IGNORECASE)
+
+    def classify(self, description: str) -> str:
+        """Return the intent type of a task description."""
+        intent = self.match(description)
+        if intent:
+            return intent
+        if not self.fallback:
+            return GENERAL_INTENT
+        return self._classify_with_fallback(description)
+
+    def match(self, description: str) -> Optional[str]:
+        """Keyword stage: the highest-precedence rule matching the description."""
+        best = None
+        for found in self._pattern.finditer(description):
+            index = int(found.lastgroup[1:])
+            if best is None or index < best:
+                best = index
+                if best == 0:
+                    break
+        return None if best is None else self.intents[best]
+
+    def _classify_with_fallback(self, description: str) -> str:
+        """Fallback stage, memoized by normalized-description hash."""
+        key = hashlib.sha256(normalize_description(description).encode("utf-8")).hexdigest()
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            intent = self.fallback(description)
+        except Exception as e:
+            # Not cached, so the next submission tries again
+            logger.error(f"Intent fallback failed: {e}")
+            return GENERAL_INTENT
+
+        if intent not in self.intents:
+            intent = GENERAL_INTENT
+        self._cache.set(key, intent)
+        return intent
+
+
+def build_llm_fallback(intents: Sequence[str]) -> IntentFallback:
+    """Create a fallback that asks the configured OpenAI model for the intent."""
+    from openai import OpenAI
+
+    settings = get_settings()
+    client = OpenAI(api_key=settings.openai_api_key)
+    choices = ", ".join(list(intents) + [GENERAL_INTENT])
+
+    def classify(description: str) -> Optional[str]:
+        response = client.chat.completions.create(
+            model=settings.openai_model,
+            messages=[
+                {
+                    "role": "system",
+                    "content": f"Classify the task into exactly one of: {choices}. Reply with the label only."
+                },
+                {"role": "user", "content": description},
+            ],
+            temperature=0,
+            max_tokens=10,
+        )
+        return (response.choices[0].message.content or "").strip().lower()
+
+    return classify
+
+
+_default_classifier: Optional[IntentClassifier] = None
+
+
+def get_intent_classifier() -> IntentClassifier:
+    """Get the shared classifier, built from settings on first use."""
+    global _default_classifier
+    if _default_classifier is None:
+        settings = get_settings()
+        intents = [intent for intent, _ in DEFAULT_INTENT_RULES]
+        fallback = build_llm_fallback(intents) if settings.intent_llm_fallback_enabled else None
+        _default_classifier = IntentClassifier(
+            fallback=fallback,
+            cache_size=settings.intent_cache_size,
+            cache_ttl_seconds=settings.intent_cache_ttl_seconds
+        )
+    return _default_classifier
@@ -0,0 +1,86 @@
+"""Monthly range partitions of the instance_tasks table."""
+
+import logging
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from src.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+TASKS_TABLE = "instance_tasks"
+
+
+def month_start(value: datetime) -> date:
+    """First day of the month of ``value``."""
+    return date(value.year, value.month, 1)
+
+
+def add_months(month: date, count: int) -> date:
+    """First day of the month ``count`` months after ``month``."""
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Name of the partition holding tasks created in ``month``."""
+    return f"{TASKS_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_ddl(month: date) -> str:
+    """CREATE TABLE statement of the partition of ``month``."""
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TASKS_TABLE} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def existing_partitions(session: Session) -> List[str]:
+    """Names of the partitions attached to instance_tasks."""
+    return list(session.scalars(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+    """), {"table": TASKS_TABLE}))
+
+
+def ensure_task_partitions(
+    session: Session,
+    months_ahead: Optional[int] = None,
+    now: Optional[datetime] = None
+) -> List[str]:
+    """Create the partitions of this month and the next ``months_ahead``.
+
+    Creating partitions ahead of time keeps new tasks out of the default
+    partition; a month that already has rows in the default partition cannot
+    be split off and is left there with an error logged. Returns the names of
+    the partitions created.
+    """
+    if months_ahead is None:
+        months_ahead = get_settings().task_partition_months_ahead
+    current = month_start(now or datetime.now(timezone.utc))
+    existing = set(existing_partitions(session))
+
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with session.begin_nested():
+                session.execute(text(partition_ddl(month)))
+            created.append(name)
+        except SQLAlchemyError as e:
+            logger.error(f"Could not create task partition {name}: {e}")
+    session.commit()
+
+    if created:
+        logger.info(f"Created task partitions {', '.join(created)}")
+    return created
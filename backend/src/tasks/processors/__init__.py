@@ -3,7 +3,18 @@
 from .default_processor import DefaultTaskProcessor
 from .content_creation_processor import ContentCreationProcessor
 
+
+def register_task_processors():
+    """Register all task processors with the queue service."""
+    from src.tasks.queue_service import TaskQueueService
+    
+    TaskQueueService.register_processor('default', DefaultTaskProcessor)
+    TaskQueueService.register_processor('general', DefaultTaskProcessor)
+    TaskQueueService.register_processor('content_creation', ContentCreationProcessor)
+
+
 __all__ = [
     'DefaultTaskProcessor',
     'ContentCreationProcessor',
+    'register_task_processors',
 ]
\ No newline at end of file
@@ -0,0 +1,52 @@
+"""Write-behind buffer for task progress and execution steps."""
+
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.config import get_settings
+
+
+class ProgressBuffer:
+    """Collects progress updates and execution steps between database writes.
+
+    Progress updates are coalesced to the latest value and steps are queued
+    in order. ``should_flush`` turns true once ``max_steps`` steps are queued
+    or ``max_interval`` seconds have passed since the last flush with
+    something pending. Thresholds are only checked when a new update arrives;
+    the owner flushes whatever is left when the task changes status or ends.
+    """
+
+    def __init__(self, max_steps: Optional[int] = None, max_interval: Optional[float] = None):
+        settings = get_settings()
+        self.max_steps = max_steps or settings.progress_flush_max_steps
+        self.max_interval = max_interval if max_interval is not None else settings.progress_flush_interval_seconds
+        self.progress: Optional[int] = None
+        self.steps: List[Dict[str, Any]] = []
+        self.last_flush = time.monotonic()
+
+    @property
+    def pending(self) -> bool:
+        """Whether anything is waiting to be written."""
+        return self.progress is not None or bool(self.steps)
+
+    def set_progress(self, percentage: int) -> None:
+        """Record the latest progress, replacing any unwritten value."""
+        self.progress = percentage
+
+    def add_step(self, step: Dict[str, Any]) -> None:
+        """Queue an execution step."""
+        self.steps.append(step)
+
+    def should_flush(self) -> bool:
+        """Whether a size or time threshold has been reached."""
+        if len(self.steps) >= self.max_steps:
+            return True
+        return self.pending and time.monotonic() - self.last_flush >= self.max_interval
+
+    def drain(self) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """Take everything pending and reset the flush timer."""
+        progress, steps = self.progress, self.steps
+        self.progress = None
+        self.steps = []
+        self.last_flush = time.monotonic()
+        return progress, steps
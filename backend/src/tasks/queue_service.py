@@ -1,48 +1,183 @@
 """Task queue service for managing task lifecycle."""
 
+import base64
 import logging
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional, List, Type
-from uuid import UUID
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Sequence, Tuple, Type, Union
+from uuid import UUID, uuid4
 
-from sqlalchemy.orm import Session
+from sqlalchemy import Insert, Select, Update, insert, select, tuple_, update
+from sqlalchemy.orm import Session, load_only
+from celery import group
+from celery.canvas import Signature
 from celery.result import AsyncResult
 
 from src.core.celery_app import celery_app
-from src.core.database import get_session
+from src.core.config import get_settings
 from src.models.instance import (
     Instance, InstanceTask, InstanceTaskStatus, TaskPriority
 )
-from src.models.instance_schemas import TaskSubmission, TaskListFilters, TaskUpdateRequest
+from src.models.instance_schemas import (
+    InstanceTaskResponse, TaskSubmission, TaskListFilters, TaskUpdateRequest
+)
 from src.tasks.base_processor import BaseTaskProcessor
+from src.tasks.concurrency import (
+    InstanceConcurrencyLimiter, build_dispatch_payload, get_concurrency_limit, get_concurrency_limiter
+)
+from src.tasks.delayed_scheduler import DelayedTaskScheduler
+from src.tasks.fair_share import FairShareDispatcher, get_fair_share_weight
+from src.tasks.idempotency import (
+    PENDING_PREFIX, SubmissionDeduplicator, SubmissionInProgressError, get_dedup_window
+)
+from src.tasks.intent_classifier import IntentClassifier, get_intent_classifier
+from src.tasks.recurrence import RecurrenceEngine, is_recurring
 
 logger = logging.getLogger(__name__)
 
+# Statuses a task can no longer be cancelled from
+FINISHED_STATUSES = (InstanceTaskStatus.COMPLETED, InstanceTaskStatus.FAILED)
+
+# (intent type, processor class), or the error resolving them
+Resolution = Union[Tuple[str, Optional[Type[BaseTaskProcessor]]], Exception]
+
+
+def encode_task_cursor(created_at: datetime, task_id: UUID) -> str:
+    """Encode a task's (created_at, id) position as an opaque cursor."""
+    raw = f"{created_at.isoformat()}|{task_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_task_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a cursor created by ``encode_task_cursor``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, task_id = raw.split("|")
+        return datetime.fromisoformat(created_at), UUID(task_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
 
-class TaskQueueService:
-    """Service for managing task queue operations."""
+
+class TaskQueueBase:
+    """Statements, processor registry, dispatch and Redis helpers of the queue services.
+    
+    Nothing here uses a database session: the synchronous
+    ``TaskQueueService`` and the API's ``AsyncTaskQueueService`` only
+    execute the statements built here and commit.
+    """
     
     # Registry of task processors
     _processor_registry: Dict[str, Type[BaseTaskProcessor]] = {}
     
+    # Classifier mapping descriptions to intent types (shared default if unset)
+    _intent_classifier: Optional[IntentClassifier] = None
+    
     @classmethod
     def register_processor(cls, intent_type: str, processor_class: Type[BaseTaskProcessor]):
         """Register a task processor for a specific intent type."""
         cls._processor_registry[intent_type] = processor_class
         logger.info(f"Registered processor {processor_class.__name__} for intent type: {intent_type}")
     
-    def __init__(self, db_session: Session):
-        self.db_session = db_session
+    @classmethod
+    def set_intent_classifier(cls, classifier: Optional[IntentClassifier]):
+        """Replace the intent classifier (None restores the default)."""
+        cls._intent_classifier = classifier
+    
+    def __init__(
+        self,
+        scheduler: Optional[DelayedTaskScheduler] = None,
+        limiter: Optional[InstanceConcurrencyLimiter] = None,
+        dispatcher: Optional[FairShareDispatcher] = None,
+        deduplicator: Optional[SubmissionDeduplicator] = None
+    ):
+        self._scheduler = scheduler
+        self._limiter = limiter
+        self._dispatcher = dispatcher
+        self._deduplicator = deduplicator
+    
+    @property
+    def scheduler(self) -> DelayedTaskScheduler:
+        """Delayed task scheduler, created on first use."""
+        if self._scheduler is None:
+            self._scheduler = DelayedTaskScheduler()
+        return self._scheduler
+    
+    @property
+    def limiter(self) -> InstanceConcurrencyLimiter:
+        """Per-instance concurrency limiter (the process-wide one unless a dispatcher was given)."""
+        if self._limiter is None:
+            if self._dispatcher is None:
+                self._limiter = get_concurrency_limiter()
+            else:
+                self._limiter = InstanceConcurrencyLimiter(dispatcher=self._dispatcher)
+        return self._limiter
     
-    def submit_task(self, instance_id: UUID, submission: TaskSubmission) -> InstanceTask:
-        """Submit a new task to the queue."""
-        # Verify instance exists
-        instance = self.db_session.query(Instance).filter_by(id=instance_id).first()
-        if not instance:
-            raise ValueError(f"Instance {instance_id} not found")
+    @property
+    def dispatcher(self) -> FairShareDispatcher:
+        """Fair-share dispatcher in front of the Celery queues, shared with the limiter."""
+        if self._dispatcher is None:
+            self._dispatcher = self.limiter.dispatcher
+        return self._dispatcher
+    
+    @property
+    def deduplicator(self) -> SubmissionDeduplicator:
+        """Duplicate submission detector, created on first use."""
+        if self._deduplicator is None:
+            self._deduplicator = SubmissionDeduplicator()
+        return self._deduplicator
+    
+    def _dedup_keys(
+        self,
+        instance: Instance,
+        submission: TaskSubmission,
+        idempotency_key: Optional[str]
+    ) -> Dict[str, int]:
+        """Dedup keys that apply to a submission (empty if none do)."""
+        window = get_dedup_window(instance.configuration)
+        if not idempotency_key and not window:
+            return {}
+        return self.deduplicator.keys_for(instance.id, submission, idempotency_key, window)
+    
+    def _reserve_keys(self, dedup_keys: Dict[str, int], task_id: UUID) -> Optional[UUID]:
+        """Reserve the dedup keys, returning the id of the task that already holds them.
         
-        # Create task record
-        task = InstanceTask(
+        Redis errors are logged and the submission goes ahead unprotected.
+        """
+        if not dedup_keys:
+            return None
+        try:
+            existing_id = self.deduplicator.reserve(dedup_keys, task_id)
+        except Exception as e:
+            logger.error(f"Duplicate submission check unavailable: {e}")
+            return None
+        if not existing_id:
+            return None
+        if existing_id.startswith(PENDING_PREFIX):
+            raise SubmissionInProgressError("An identical submission is still being processed")
+        return UUID(existing_id)
+    
+    def _confirm_submission(self, dedup_keys: Dict[str, int], task_id: UUID):
+        """Point the dedup keys at the committed task."""
+        if not dedup_keys:
+            return
+        try:
+            self.deduplicator.confirm(dedup_keys, task_id)
+        except Exception as e:
+            logger.error(f"Error recording dedup keys for task {task_id}: {e}")
+    
+    def _release_submission(self, dedup_keys: Dict[str, int], task_id: UUID):
+        """Drop the dedup reservation of a submission that failed."""
+        if not dedup_keys:
+            return
+        try:
+            self.deduplicator.release(dedup_keys, task_id)
+        except Exception as e:
+            logger.error(f"Error releasing dedup keys for task {task_id}: {e}")
+    
+    @staticmethod
+    def _new_task(instance_id: UUID, submission: TaskSubmission, task_id: UUID) -> InstanceTask:
+        """Task row of a single submission."""
+        return InstanceTask(
+            id=task_id,
             instance_id=instance_id,
             description=submission.description,
             priority=submission.priority,
@@ -51,31 +186,176 @@ class TaskQueueService:
             attached_media_ids=submission.attached_media_ids,
             status=InstanceTaskStatus.SUBMITTED
         )
+    
+    @staticmethod
+    def _task_statement(task_id: UUID, instance_id: UUID) -> Select:
+        """A task, only if it belongs to the instance."""
+        return select(InstanceTask).where(
+            InstanceTask.id == task_id,
+            InstanceTask.instance_id == instance_id
+        )
+    
+    @staticmethod
+    def _insert_tasks_statement() -> Insert:
+        """Multi-row INSERT ... RETURNING for the rows of ``_build_task_rows``."""
+        return insert(InstanceTask).returning(InstanceTask, sort_by_parameter_order=True)
+    
+    @staticmethod
+    def _queue_tasks_statement(task_ids: List[UUID]) -> Update:
+        """Single UPDATE moving freshly inserted tasks to QUEUED."""
+        return (
+            update(InstanceTask)
+            .where(InstanceTask.id.in_(task_ids))
+            .values(status=InstanceTaskStatus.QUEUED)
+        )
+    
+    def _build_task_rows(
+        self,
+        instance_id: UUID,
+        submissions: List[TaskSubmission],
+        now: datetime
+    ) -> Tuple[List[Dict[str, Any]], Dict[UUID, Type[BaseTaskProcessor]], Dict[UUID, datetime], Dict[UUID, Optional[datetime]]]:
+        """Build the INSERT rows of a bulk submission.
         
-        self.db_session.add(task)
-        self.db_session.commit()
-        
-        # Queue for processing if not scheduled
-        if not submission.scheduled_for or submission.scheduled_for <= datetime.now(timezone.utc):
-            self._queue_task(task)
-        
-        return task
+        Also returns the processors of the tasks due now, the due times of
+        delayed tasks and the start times of recurring series.
+        """
+        rows = []
+        due_processors: Dict[UUID, Type[BaseTaskProcessor]] = {}
+        delayed: Dict[UUID, datetime] = {}
+        series_starts: Dict[UUID, Optional[datetime]] = {}
+        for submission in submissions:
+            row = {
+                "id": uuid4(),
+                "instance_id": instance_id,
+                "description": submission.description,
+                "priority": submission.priority,
+                "scheduled_for": submission.scheduled_for,
+                "recurring_pattern": submission.recurring_pattern,
+                "attached_media_ids": [str(media_id) for media_id in submission.attached_media_ids],
+                "status": InstanceTaskStatus.SUBMITTED,
+                "created_at": now,
+                "updated_at": now,
+            }
+            if is_recurring(submission.recurring_pattern):
+                series_starts[row["id"]] = submission.scheduled_for
+            elif not submission.scheduled_for or submission.scheduled_for <= now:
+                # Resolve the processor up front so queued rows carry their
+                # parsed intent from the INSERT and only need a status flip
+                intent_type, processor_class = self._resolve_processor(submission.description)
+                if processor_class:
+                    row["parsed_intent"] = {
+                        "intent_type": intent_type,
+                        "processor": processor_class.__name__
+                    }
+                    due_processors[row["id"]] = processor_class
+                else:
+                    logger.error(f"No processor found for intent type: {intent_type}")
+                    row["status"] = InstanceTaskStatus.FAILED
+                    row["error_message"] = f"No processor available for intent type: {intent_type}"
+            else:
+                delayed[row["id"]] = submission.scheduled_for
+            rows.append(row)
+        return rows, due_processors, delayed, series_starts
     
-    def _queue_task(self, task: InstanceTask):
-        """Queue a task for processing."""
-        # Parse intent to determine processor
-        intent_type = self._parse_intent_type(task.description)
+    def _resolve_processor(self, description: str) -> Tuple[str, Optional[Type[BaseTaskProcessor]]]:
+        """Resolve the intent type and processor class for a task description."""
+        intent_type = self._parse_intent_type(description)
         processor_class = self._processor_registry.get(intent_type)
-        
         if not processor_class:
             # Use default processor
             processor_class = self._processor_registry.get('default')
-            if not processor_class:
-                logger.error(f"No processor found for intent type: {intent_type}")
-                task.status = InstanceTaskStatus.FAILED
-                task.error_message = f"No processor available for intent type: {intent_type}"
-                self.db_session.commit()
-                return
+        return intent_type, processor_class
+    
+    def _build_dispatch(
+        self,
+        task: InstanceTask,
+        processor_class: Type[BaseTaskProcessor],
+        configuration: Optional[Dict[str, Any]]
+    ) -> Tuple[Dict[str, Any], int]:
+        """Build the dispatch payload of a queued task and its instance's concurrency limit."""
+        processor_path = f"{processor_class.__module__}.{processor_class.__name__}"
+        payload = build_dispatch_payload(
+            task.id,
+            task.instance_id,
+            processor_path,
+            self._get_queue_name(task.priority),
+            weight=get_fair_share_weight(configuration)
+        )
+        return payload, get_concurrency_limit(configuration)
+    
+    def _build_signature(self, payload: Dict[str, Any]) -> Signature:
+        """Build the Celery signature for a dispatch payload."""
+        return celery_app.signature(
+            'process_task',
+            args=[payload["task_id"], payload["instance_id"], payload["processor_path"]],
+            queue=payload["queue"],
+            task_id=f"task_{payload['task_id']}"
+        )
+    
+    def _acquire_slots(self, dispatches: List[Tuple[Dict[str, Any], int]]) -> List[bool]:
+        """Ask the concurrency limiter which tasks may be published now.
+        
+        Tasks that do not get a slot stay QUEUED in their instance's pending
+        lane and are published by the worker that frees the next slot. If
+        Redis is unavailable every task is published, as before the limiter.
+        """
+        try:
+            return self.limiter.acquire_many(dispatches)
+        except Exception as e:
+            logger.error(f"Concurrency limiter unavailable, publishing {len(dispatches)} tasks unthrottled: {e}")
+            return [True] * len(dispatches)
+    
+    def _publish(self, dispatches: List[Tuple[Dict[str, Any], int]]) -> int:
+        """Hand the tasks that get a concurrency slot to the fair-share dispatcher.
+        
+        Returns the number of tasks that got a slot. If the dispatcher is
+        unavailable they are published straight to Celery as one group.
+        """
+        if not dispatches:
+            return 0
+        admitted = self._acquire_slots(dispatches)
+        payloads = [payload for (payload, _), has_slot in zip(dispatches, admitted) if has_slot]
+        if not payloads:
+            return 0
+        try:
+            self.dispatcher.enqueue_many(payloads)
+            self.dispatcher.pump()
+        except Exception as e:
+            logger.error(f"Fair-share dispatcher unavailable, publishing {len(payloads)} tasks directly: {e}")
+            group([self._build_signature(payload) for payload in payloads]).apply_async()
+        return len(payloads)
+    
+    def _recorded_processor(self, task: InstanceTask) -> Optional[Type[BaseTaskProcessor]]:
+        """Processor recorded in a queued task's parsed intent, resolved again if unknown."""
+        name = (task.parsed_intent or {}).get("processor")
+        for processor_class in self._processor_registry.values():
+            if processor_class.__name__ == name:
+                return processor_class
+        return self._resolve_processor(task.description)[1]
+    
+    def _resolve_processors(self, descriptions: List[str]) -> List[Resolution]:
+        """Resolve several descriptions, keeping the error of any that fails."""
+        resolutions: List[Resolution] = []
+        for description in descriptions:
+            try:
+                resolutions.append(self._resolve_processor(description))
+            except Exception as e:
+                resolutions.append(e)
+        return resolutions
+    
+    def _set_processor(
+        self,
+        task: InstanceTask,
+        intent_type: str,
+        processor_class: Optional[Type[BaseTaskProcessor]]
+    ) -> Optional[Type[BaseTaskProcessor]]:
+        """Record a resolved processor on a task, or fail the task without one."""
+        if not processor_class:
+            logger.error(f"No processor found for intent type: {intent_type}")
+            task.status = InstanceTaskStatus.FAILED
+            task.error_message = f"No processor available for intent type: {intent_type}"
+            return None
         
         # Update task status
         task.status = InstanceTaskStatus.QUEUED
@@ -83,38 +363,83 @@ class TaskQueueService:
             "intent_type": intent_type,
             "processor": processor_class.__name__
         }
-        self.db_session.commit()
+        return processor_class
+    
+    def _queue_claimed(
+        self,
+        due_tasks: List[InstanceTask],
+        configurations: Dict[UUID, Optional[Dict[str, Any]]],
+        resolutions: List[Resolution]
+    ) -> Tuple[List[Tuple[Dict[str, Any], int]], List[UUID]]:
+        """Move claimed tasks to QUEUED (or FAILED) without committing.
         
-        # Determine queue based on priority
-        queue_name = self._get_queue_name(task.priority)
+        Returns the dispatches of the queued tasks and the series whose
+        occurrences were claimed.
+        """
+        dispatches = []
+        series_ids = []
+        for task, resolution in zip(due_tasks, resolutions):
+            try:
+                if isinstance(resolution, Exception):
+                    raise resolution
+                processor_class = self._set_processor(task, *resolution)
+                if processor_class:
+                    dispatches.append(
+                        self._build_dispatch(task, processor_class, configurations[task.instance_id])
+                    )
+            except Exception as e:
+                logger.error(f"Error queuing scheduled task {task.id}: {e}")
+                task.status = InstanceTaskStatus.FAILED
+                task.error_message = str(e)
+            if task.parent_task_id:
+                series_ids.append(task.parent_task_id)
+        return dispatches, series_ids
+    
+    @staticmethod
+    def _advance_series(session: Session, series_ids: List[UUID]) -> Dict[UUID, datetime]:
+        """Create the next occurrence of each series and return their due times.
         
-        # Submit to Celery
-        processor_path = f"{processor_class.__module__}.{processor_class.__name__}"
-        result = celery_app.send_task(
-            'process_task',
-            args=[str(task.id), str(task.instance_id), processor_path],
-            queue=queue_name,
-            task_id=f"task_{task.id}"
+        Each dispatched occurrence moves its series cursor one step forward.
+        """
+        if not series_ids:
+            return {}
+        return {child.id: child.scheduled_for for child in RecurrenceEngine(session).advance(series_ids)}
+    
+    def _hand_off(
+        self,
+        due_tasks: List[InstanceTask],
+        dispatches: List[Tuple[Dict[str, Any], int]],
+        due_times: Dict[UUID, datetime]
+    ) -> int:
+        """Publish committed claims and schedule delayed ones.
+        
+        Returns the number of claimed tasks.
+        """
+        dispatched = self._publish(dispatches)
+        self._schedule_delayed(due_times)
+        logger.info(
+            f"Claimed {len(due_tasks)} scheduled tasks "
+            f"({dispatched} dispatched, {len(dispatches) - dispatched} held)"
         )
+        return len(due_tasks)
+    
+    def _schedule_delayed(self, due_times: Dict[UUID, datetime]):
+        """Register future tasks with the delayed scheduler.
         
-        logger.info(f"Queued task {task.id} to {queue_name} queue with processor {processor_class.__name__}")
+        Failures are only logged: the periodic sweep in
+        ``process_scheduled_tasks`` still picks the task up from the database.
+        """
+        if not due_times:
+            return
+        try:
+            self.scheduler.schedule_many(due_times)
+        except Exception as e:
+            logger.error(f"Error scheduling {len(due_times)} delayed tasks: {e}")
     
     def _parse_intent_type(self, description: str) -> str:
         """Parse task description to determine intent type."""
-        # This will be enhanced with NLP/LLM integration
-        # For now, use simple keyword matching
-        description_lower = description.lower()
-        
-        if any(word in description_lower for word in ['post', 'content', 'social']):
-            return 'content_creation'
-        elif any(word in description_lower for word in ['analyze', 'research', 'market']):
-            return 'market_analysis'
-        elif any(word in description_lower for word in ['email', 'campaign', 'newsletter']):
-            return 'email_campaign'
-        elif any(word in description_lower for word in ['product', 'listing', 'inventory']):
-            return 'product_management'
-        else:
-            return 'general'
+        classifier = self._intent_classifier or get_intent_classifier()
+        return classifier.classify(description)
     
     def _get_queue_name(self, priority: TaskPriority) -> str:
         """Get queue name based on priority."""
@@ -125,29 +450,32 @@ class TaskQueueService:
         else:
             return 'default'
     
-    def get_task_status(self, task_id: UUID) -> Dict[str, Any]:
-        """Get current status of a task."""
-        task = self.db_session.query(InstanceTask).filter_by(id=task_id).first()
-        if not task:
-            raise ValueError(f"Task {task_id} not found")
-        
-        # Get Celery task status if queued or processing
-        celery_status = None
-        if task.status in [InstanceTaskStatus.QUEUED, InstanceTaskStatus.IN_PROGRESS]:
-            try:
-                result = AsyncResult(f"task_{task_id}", app=celery_app)
-                celery_status = {
-                    "state": result.state,
-                    "info": result.info if result.info else {}
-                }
-            except Exception as e:
-                logger.error(f"Error getting Celery status for task {task_id}: {e}")
-        
+    def _celery_status(self, task: InstanceTask) -> Optional[Dict[str, Any]]:
+        """Celery state of a queued or running task (None otherwise)."""
+        if task.status not in [InstanceTaskStatus.QUEUED, InstanceTaskStatus.IN_PROGRESS]:
+            return None
+        try:
+            result = AsyncResult(f"task_{task.id}", app=celery_app)
+            return {
+                "state": result.state,
+                "info": result.info if result.info else {}
+            }
+        except Exception as e:
+            logger.error(f"Error getting Celery status for task {task.id}: {e}")
+            return None
+    
+    @staticmethod
+    def _status_payload(
+        task: InstanceTask,
+        steps: List[Dict[str, Any]],
+        celery_status: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
         return {
             "task_id": task.id,
             "status": task.status,
             "progress": task.progress_percentage,
-            "execution_steps": task.execution_steps,
+            "execution_steps": steps,
+            "step_count": task.step_count,
             "celery_status": celery_status,
             "error_message": task.error_message,
             "created_at": task.created_at,
@@ -155,13 +483,14 @@ class TaskQueueService:
             "processing_ended_at": task.processing_ended_at
         }
     
-    def update_task(self, task_id: UUID, update: TaskUpdateRequest) -> InstanceTask:
-        """Update task details."""
-        task = self.db_session.query(InstanceTask).filter_by(id=task_id).first()
-        if not task:
-            raise ValueError(f"Task {task_id} not found")
-        
-        # Update fields
+    @staticmethod
+    def _newest_steps_after(task: InstanceTask, limit: int) -> int:
+        """``after_seq`` of the page holding a task's newest ``limit`` steps."""
+        return max(0, task.step_count - limit)
+    
+    @staticmethod
+    def _apply_update(task: InstanceTask, update: TaskUpdateRequest) -> List[Dict[str, Any]]:
+        """Set the updated fields on a task; returns the steps to append."""
         if update.status:
             task.status = update.status
         if update.priority:
@@ -171,104 +500,260 @@ class TaskQueueService:
         if update.error_message:
             task.error_message = update.error_message
         if update.execution_step:
-            if not task.execution_steps:
-                task.execution_steps = []
-            task.execution_steps.append(update.execution_step.model_dump())
-        
-        self.db_session.commit()
-        return task
+            return [update.execution_step.model_dump(mode="json")]
+        return []
     
-    def cancel_task(self, task_id: UUID) -> bool:
-        """Cancel a task."""
-        task = self.db_session.query(InstanceTask).filter_by(id=task_id).first()
-        if not task:
-            raise ValueError(f"Task {task_id} not found")
-        
-        # Can only cancel if not completed
-        if task.status in [InstanceTaskStatus.COMPLETED, InstanceTaskStatus.FAILED]:
-            return False
+    @staticmethod
+    def _revoke(task_id: UUID):
+        """Stop the Celery task of a task being cancelled."""
+        try:
+            celery_app.control.revoke(f"task_{task_id}", terminate=True)
+        except Exception as e:
+            logger.error(f"Error revoking Celery task {task_id}: {e}")
+    
+    def _release_slot(self, task: InstanceTask):
+        """Free the concurrency slot of a revoked task.
         
-        # Try to revoke Celery task
-        if task.status in [InstanceTaskStatus.QUEUED, InstanceTaskStatus.IN_PROGRESS]:
-            try:
-                celery_app.control.revoke(f"task_{task_id}", terminate=True)
-            except Exception as e:
-                logger.error(f"Error revoking Celery task {task_id}: {e}")
+        A revoked task never reaches the worker hooks, so nothing else does.
+        """
+        try:
+            self.dispatcher.complete(str(task.id))
+            self.limiter.release_and_dispatch(str(task.instance_id), str(task.id))
+        except Exception as e:
+            logger.error(f"Error releasing concurrency slot of task {task.id}: {e}")
+    
+    @staticmethod
+    def _mark_cancelled(task: InstanceTask) -> bool:
+        """Move an unfinished task to CANCELLED without committing.
         
-        # Update status
+        Returns whether the task may hold a Celery task and a concurrency slot.
+        """
+        holds_slot = task.status in [InstanceTaskStatus.QUEUED, InstanceTaskStatus.IN_PROGRESS]
         task.status = InstanceTaskStatus.CANCELLED
         task.processing_ended_at = datetime.now(timezone.utc)
-        self.db_session.commit()
-        
-        return True
+        return holds_slot
     
-    def retry_task(self, task_id: UUID) -> InstanceTask:
-        """Retry a failed task."""
-        task = self.db_session.query(InstanceTask).filter_by(id=task_id).first()
-        if not task:
-            raise ValueError(f"Task {task_id} not found")
-        
+    @staticmethod
+    def _cancel_occurrences_statement(task: InstanceTask) -> Update:
+        """Cancel the occurrences of a cancelled series that have not started."""
+        return (
+            update(InstanceTask)
+            .where(
+                InstanceTask.parent_task_id == task.id,
+                InstanceTask.status == InstanceTaskStatus.SUBMITTED
+            )
+            .values(
+                status=InstanceTaskStatus.CANCELLED,
+                processing_ended_at=task.processing_ended_at
+            )
+            .execution_options(synchronize_session=False)
+        )
+    
+    @staticmethod
+    def _reset_for_retry(task: InstanceTask):
+        """Reset a failed task to SUBMITTED so it can be queued again."""
         # Can only retry failed tasks
         if task.status != InstanceTaskStatus.FAILED:
             raise ValueError(f"Can only retry failed tasks. Current status: {task.status}")
         
-        # Reset task for retry
         task.status = InstanceTaskStatus.SUBMITTED
         task.error_message = None
         task.processing_started_at = None
         task.processing_ended_at = None
         task.retry_count += 1
-        
-        self.db_session.commit()
-        
-        # Queue for processing
-        self._queue_task(task)
-        
-        return task
     
-    def list_tasks(self, instance_id: UUID, filters: TaskListFilters) -> List[InstanceTask]:
-        """List tasks with filters."""
-        query = self.db_session.query(InstanceTask).filter_by(instance_id=instance_id)
+    @staticmethod
+    def _list_criteria(instance_id: UUID, filters: TaskListFilters) -> List[Any]:
+        """WHERE clauses of a task listing.
         
-        # Apply filters
+        Every bound on ``created_at``, the partition key, is a plain
+        comparison so PostgreSQL can prune the months outside it; a cursor
+        adds one next to its row comparison, which pruning does not use.
+        """
+        criteria = [InstanceTask.instance_id == instance_id]
         if filters.status:
-            query = query.filter(InstanceTask.status == filters.status)
+            criteria.append(InstanceTask.status == filters.status)
         if filters.priority:
-            query = query.filter(InstanceTask.priority == filters.priority)
+            criteria.append(InstanceTask.priority == filters.priority)
         if filters.created_after:
-            query = query.filter(InstanceTask.created_at >= filters.created_after)
+            criteria.append(InstanceTask.created_at >= filters.created_after)
         if filters.created_before:
-            query = query.filter(InstanceTask.created_at <= filters.created_before)
+            criteria.append(InstanceTask.created_at <= filters.created_before)
         if filters.scheduled_after:
-            query = query.filter(InstanceTask.scheduled_for >= filters.scheduled_after)
+            criteria.append(InstanceTask.scheduled_for >= filters.scheduled_after)
         if filters.scheduled_before:
-            query = query.filter(InstanceTask.scheduled_for <= filters.scheduled_before)
+            criteria.append(InstanceTask.scheduled_for <= filters.scheduled_before)
         
-        # Order by creation date desc
-        query = query.order_by(InstanceTask.created_at.desc())
+        if filters.cursor:
+            created_at, task_id = decode_task_cursor(filters.cursor)
+            criteria.append(InstanceTask.created_at <= created_at)
+            criteria.append(
+                tuple_(InstanceTask.created_at, InstanceTask.id) < tuple_(created_at, task_id)
+            )
+        return criteria
+    
+    @staticmethod
+    def _list_columns(fields: Optional[Sequence[str]]) -> List[Any]:
+        """Columns to load for a listing; id and created_at are needed for cursors."""
+        names = set(fields or InstanceTaskResponse.model_fields) | {"id", "created_at"}
+        return [getattr(InstanceTask, name) for name in sorted(names)]
+    
+    @classmethod
+    def _list_statement(
+        cls,
+        instance_id: UUID,
+        filters: TaskListFilters,
+        fields: Optional[Sequence[str]] = None
+    ) -> Select:
+        """SELECT of one page of a task listing, newest first.
         
-        # Apply pagination
-        query = query.limit(filters.limit).offset(filters.offset)
+        With ``filters.cursor`` the page starts after the cursor's
+        ``(created_at, id)`` position, which walks ``idx_instance_tasks_created``
+        instead of skipping ``offset`` rows, and only reads the partitions up
+        to the cursor's month. Only the columns of the response
+        (or of ``fields``) are loaded; touching any other column raises.
+        """
+        stmt = select(InstanceTask).where(*cls._list_criteria(instance_id, filters))
+        stmt = stmt.options(load_only(*cls._list_columns(fields), raiseload=True))
+        
+        # Order by creation date desc; id breaks ties so cursors are stable
+        stmt = stmt.order_by(InstanceTask.created_at.desc(), InstanceTask.id.desc())
         
-        return query.all()
+        # Apply pagination
+        stmt = stmt.limit(filters.limit)
+        if not filters.cursor:
+            stmt = stmt.offset(filters.offset)
+        return stmt
     
-    def process_scheduled_tasks(self):
-        """Process tasks that are due for execution."""
-        # Find tasks that are scheduled and due
-        due_tasks = self.db_session.query(InstanceTask).filter(
+    @staticmethod
+    def _due_tasks_statement(task_ids: Optional[List[UUID]], limit: int) -> Select:
+        """Lock due SUBMITTED tasks with ``SELECT ... FOR UPDATE SKIP LOCKED``.
+        
+        Several schedulers can run it at once without claiming a task twice.
+        """
+        stmt = select(InstanceTask).where(
             InstanceTask.status == InstanceTaskStatus.SUBMITTED,
             InstanceTask.scheduled_for <= datetime.now(timezone.utc)
-        ).all()
+        )
+        if task_ids is not None:
+            stmt = stmt.where(InstanceTask.id.in_(task_ids))
+        return stmt.order_by(InstanceTask.scheduled_for).limit(limit).with_for_update(skip_locked=True)
+    
+    @staticmethod
+    def _stale_queued_statement(queued_before: datetime, limit: int) -> Select:
+        """QUEUED tasks last touched before ``queued_before``, oldest first."""
+        return (
+            select(InstanceTask)
+            .where(
+                InstanceTask.status == InstanceTaskStatus.QUEUED,
+                InstanceTask.updated_at < queued_before
+            )
+            .order_by(InstanceTask.updated_at)
+            .limit(limit)
+        )
+    
+    @staticmethod
+    def _configuration_statement(instance_id: UUID) -> Select:
+        """Configuration of one instance."""
+        return select(Instance.configuration).where(Instance.id == instance_id)
+    
+    @staticmethod
+    def _configurations_statement(instance_ids) -> Select:
+        """Configuration of several instances in one query."""
+        return select(Instance.id, Instance.configuration).where(Instance.id.in_(list(instance_ids)))
+    
+    def get_dispatch_stats(self, instance_id: UUID) -> Dict[str, Any]:
+        """Get concurrency, backlog and wait time statistics of an instance."""
+        instance_key = str(instance_id)
+        return {
+            "instance_id": instance_id,
+            "running": self.limiter.active_count(instance_key),
+            "held": self.limiter.pending_count(instance_key),
+            "backlog": self.dispatcher.backlog(instance_key),
+            "wait_time": self.dispatcher.wait_time_percentiles(instance_key)
+        }
+
+
+class TaskQueueService(TaskQueueBase):
+    """Task queue operations for Celery workers and the schedulers.
+    
+    Works on a synchronous ``Session`` for code without an event loop. The
+    API submits, updates, cancels, retries and lists tasks through
+    ``AsyncTaskQueueService``.
+    """
+    
+    def __init__(self, db_session: Session, **kwargs):
+        super().__init__(**kwargs)
+        self.db_session = db_session
+    
+    def _instance_configurations(self, instance_ids) -> Dict[UUID, Optional[Dict[str, Any]]]:
+        """Load the configuration of several instances in one query."""
+        if not instance_ids:
+            return {}
+        configurations = dict(self.db_session.execute(self._configurations_statement(instance_ids)).all())
+        return {instance_id: configurations.get(instance_id) for instance_id in instance_ids}
+    
+    def claim_due_tasks(self, task_ids: Optional[List[UUID]] = None, limit: int = 100) -> int:
+        """Claim due SUBMITTED tasks and queue them.
         
-        for task in due_tasks:
-            try:
-                self._queue_task(task)
-                logger.info(f"Queued scheduled task {task.id}")
-            except Exception as e:
-                logger.error(f"Error queuing scheduled task {task.id}: {e}")
-                task.status = InstanceTaskStatus.FAILED
-                task.error_message = str(e)
+        Rows are locked with ``SELECT ... FOR UPDATE SKIP LOCKED`` so several
+        schedulers can run at once without queuing a task twice. All claimed
+        tasks are committed together and dispatched in one pipeline.
+        """
+        if task_ids is not None and not task_ids:
+            return 0
+        due_tasks = list(self.db_session.scalars(self._due_tasks_statement(task_ids, limit)))
         
+        configurations = self._instance_configurations({task.instance_id for task in due_tasks})
+        resolutions = self._resolve_processors([task.description for task in due_tasks])
+        dispatches, series_ids = self._queue_claimed(due_tasks, configurations, resolutions)
+        due_times = self._advance_series(self.db_session, series_ids)
+        
+        # One commit releases the row locks for the whole batch
         self.db_session.commit()
         
-        return len(due_tasks)
\ No newline at end of file
+        return self._hand_off(due_tasks, dispatches, due_times)
+    
+    def process_scheduled_tasks(self, batch_size: int = 100) -> int:
+        """Sweep the database for due tasks the delayed scheduler missed."""
+        total = 0
+        while True:
+            claimed = self.claim_due_tasks(limit=batch_size)
+            total += claimed
+            if claimed < batch_size:
+                return total
+    
+    def reconcile_queued_tasks(self, limit: int = 500) -> int:
+        """Dispatch again the QUEUED tasks that Redis lost track of.
+        
+        Until a worker starts it, a queued task only exists in Redis: in its
+        instance's pending lane, a fair-share sub-queue or publishing list,
+        or the in-flight set. A flush or eviction drops it from all of them
+        while its row stays QUEUED. Redis is read before the database, in the
+        order tasks move through it, so a task that moves on meanwhile is
+        still seen; tasks queued within ``queued_task_reconcile_after_seconds``
+        are skipped because their dispatch may not have reached Redis yet.
+        """
+        tracked = self.limiter.held_task_ids() | self.dispatcher.tracked_task_ids()
+        
+        queued_before = datetime.now(timezone.utc) - timedelta(
+            seconds=get_settings().queued_task_reconcile_after_seconds
+        )
+        queued = list(self.db_session.scalars(self._stale_queued_statement(queued_before, limit)))
+        lost = [task for task in queued if str(task.id) not in tracked]
+        if not lost:
+            return 0
+        
+        configurations = self._instance_configurations({task.instance_id for task in lost})
+        dispatches = []
+        for task in lost:
+            processor_class = self._recorded_processor(task)
+            if processor_class:
+                dispatches.append(self._build_dispatch(task, processor_class, configurations[task.instance_id]))
+        
+        dispatched = self._publish(dispatches)
+        logger.warning(
+            f"Re-dispatched {len(dispatches)} queued tasks missing from Redis "
+            f"({dispatched} dispatched, {len(dispatches) - dispatched} held)"
+        )
+        return len(dispatches)
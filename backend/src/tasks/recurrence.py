@@ -0,0 +1,137 @@
+"""Incremental RRULE expansion for recurring tasks."""
+
+import logging
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from uuid import UUID, uuid4
+
+from dateutil.rrule import rrule, rrulestr
+from sqlalchemy.orm import Session
+
+from src.core.config import get_settings
+from src.models.instance import InstanceTask, InstanceTaskStatus
+
+logger = logging.getLogger(__name__)
+
+
+def is_recurring(pattern: Optional[Dict[str, Any]]) -> bool:
+    """Check whether a recurring_pattern describes an RRULE series."""
+    return isinstance(pattern, dict) and bool(pattern.get("rrule"))
+
+
+@lru_cache(maxsize=1024)
+def compile_rule(rule_text: str, dtstart_iso: str) -> rrule:
+    """Parse an RRULE once per (rule, dtstart) pair.
+
+    Series are only touched when one of their occurrences is dispatched, and
+    the parsed rule is shared across all of those calls.
+    """
+    rule_text = rule_text.strip()
+    if rule_text.upper().startswith("RRULE:"):
+        rule_text = rule_text[len("RRULE:"):]
+    return rrulestr(rule_text, dtstart=datetime.fromisoformat(dtstart_iso))
+
+
+class RecurrenceEngine:
+    """Materializes a rolling window of occurrences for recurring tasks.
+
+    A recurring task acts as the series parent and is never executed itself.
+    Only the next ``lookahead`` occurrences exist as child tasks (linked by
+    ``parent_task_id``). The series cursor - the last materialized occurrence -
+    lives in the parent's ``recurring_pattern`` and moves forward by one
+    occurrence each time a child is dispatched.
+    """
+
+    def __init__(self, db_session: Session, lookahead: Optional[int] = None):
+        self.db_session = db_session
+        self.lookahead = lookahead or get_settings().recurrence_lookahead
+
+    def start_series(self, parent: InstanceTask, start: Optional[datetime] = None) -> List[InstanceTask]:
+        """Initialize a new series and create its first occurrences (no commit)."""
+        dtstart = self._as_utc(start or datetime.now(timezone.utc))
+        parent.recurring_pattern = {
+            **parent.recurring_pattern,
+            "dtstart": dtstart.isoformat(),
+            "cursor": None,
+            "materialized": 0,
+        }
+        # The parent is a template; only its children are scheduled
+        parent.scheduled_for = None
+        return self._materialize(parent, self.lookahead)
+
+    def advance(self, parent_ids: Iterable[UUID]) -> List[InstanceTask]:
+        """Create one new occurrence per dispatched child (no commit).
+
+        ``parent_ids`` may repeat a series once per dispatched occurrence.
+        Parent rows are locked so concurrent schedulers advance a series
+        cursor one after the other.
+        """
+        counts: Dict[UUID, int] = {}
+        for parent_id in parent_ids:
+            counts[parent_id] = counts.get(parent_id, 0) + 1
+        if not counts:
+            return []
+
+        parents = self.db_session.query(InstanceTask).filter(
+            InstanceTask.id.in_(list(counts))
+        ).with_for_update().populate_existing().all()
+
+        created = []
+        for parent in parents:
+            if not is_recurring(parent.recurring_pattern):
+                continue
+            if parent.status in [InstanceTaskStatus.CANCELLED, InstanceTaskStatus.FAILED]:
+                continue
+            created.extend(self._materialize(parent, counts[parent.id]))
+        return created
+
+    def _materialize(self, parent: InstanceTask, count: int) -> List[InstanceTask]:
+        """Create the next ``count`` occurrences after the series cursor."""
+        pattern = parent.recurring_pattern
+        if pattern.get("exhausted"):
+            return []
+
+        rule = compile_rule(pattern["rrule"], pattern["dtstart"])
+        cursor = pattern.get("cursor")
+        if cursor:
+            occurrences = list(rule.xafter(datetime.fromisoformat(cursor), count=count))
+        else:
+            # First window starts at dtstart, skipping anything already past
+            now = datetime.now(timezone.utc)
+            start = max(datetime.fromisoformat(pattern["dtstart"]), now)
+            occurrences = list(rule.xafter(start, count=count, inc=True))
+
+        children = [
+            InstanceTask(
+                id=uuid4(),
+                instance_id=parent.instance_id,
+                description=parent.description,
+                priority=parent.priority,
+                scheduled_for=occurrence,
+                attached_media_ids=parent.attached_media_ids,
+                parent_task_id=parent.id,
+                status=InstanceTaskStatus.SUBMITTED
+            )
+            for occurrence in occurrences
+        ]
+        self.db_session.add_all(children)
+
+        updated = dict(pattern)
+        updated["materialized"] = pattern.get("materialized", 0) + len(occurrences)
+        if occurrences:
+            updated["cursor"] = occurrences[-1].isoformat()
+        if len(occurrences) < count:
+            # COUNT/UNTIL reached - nothing left to generate
+            updated["exhausted"] = True
+            logger.info(f"Recurring series {parent.id} exhausted after {updated['materialized']} occurrences")
+        parent.recurring_pattern = updated
+
+        return children
+
+    @staticmethod
+    def _as_utc(value: datetime) -> datetime:
+        """Normalize a datetime to aware UTC, treating naive values as UTC."""
+        if value.tzinfo is None:
+            return value.replace(tzinfo=timezone.utc)
+        return value.astimezone(timezone.utc)
@@ -7,22 +7,37 @@ from celery.schedules import crontab
 
 from src.core.celery_app import celery_app
 from src.core.database import SessionLocal
+from src.tasks.archiver import TaskArchiver
+from src.tasks.concurrency import get_concurrency_limiter
+from src.tasks.partitions import ensure_task_partitions
+from src.tasks.processors import register_task_processors
 from src.tasks.queue_service import TaskQueueService
+from src.tasks.task_changes import prune_task_tombstones
 
 logger = logging.getLogger(__name__)
 
 
 @celery_app.task(name='process_scheduled_tasks')
 def process_scheduled_tasks():
-    """Process all scheduled tasks that are due for execution."""
+    """Sweep for scheduled tasks the delayed scheduler did not queue.
+    
+    Due tasks are normally queued by ``DelayedTaskScheduler`` within a fraction
+    of a second; this sweep only catches tasks whose Redis entry was lost.
+    """
     logger.info("Starting scheduled task processing")
+    register_task_processors()
     
     db = SessionLocal()
     try:
         queue_service = TaskQueueService(db)
         count = queue_service.process_scheduled_tasks()
         logger.info(f"Processed {count} scheduled tasks")
-        return {"processed": count, "timestamp": datetime.now(timezone.utc).isoformat()}
+        released = _reclaim_expired_slots()
+        return {
+            "processed": count,
+            "released": released,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
     except Exception as e:
         logger.error(f"Error processing scheduled tasks: {e}")
         raise
@@ -30,10 +45,80 @@ def process_scheduled_tasks():
         db.close()
 
 
+def _reclaim_expired_slots() -> int:
+    """Publish held tasks whose instance only had slots leaked by dead workers."""
+    try:
+        released = get_concurrency_limiter().reclaim_expired()
+        if released:
+            logger.info(f"Released {released} held tasks from expired concurrency slots")
+        return released
+    except Exception as e:
+        logger.error(f"Error reclaiming expired concurrency slots: {e}")
+        return 0
+
+
+@celery_app.task(name='reconcile_queued_tasks')
+def reconcile_queued_tasks():
+    """Dispatch again the QUEUED tasks that are no longer anywhere in Redis."""
+    register_task_processors()
+    
+    db = SessionLocal()
+    try:
+        return {"redispatched": TaskQueueService(db).reconcile_queued_tasks()}
+    finally:
+        db.close()
+
+
+@celery_app.task(name='maintain_task_partitions')
+def maintain_task_partitions():
+    """Create the monthly instance_tasks partitions of the coming months."""
+    db = SessionLocal()
+    try:
+        return {"created": ensure_task_partitions(db)}
+    finally:
+        db.close()
+
+
+@celery_app.task(name='archive_finished_tasks')
+def archive_finished_tasks():
+    """Move the payloads of old completed and failed tasks to cold storage."""
+    db = SessionLocal()
+    try:
+        return {"archived": TaskArchiver(db).archive_due()}
+    finally:
+        db.close()
+
+
+@celery_app.task(name='prune_task_tombstones')
+def prune_tombstones():
+    """Delete tombstones of deleted tasks older than any valid change cursor."""
+    db = SessionLocal()
+    try:
+        return {"pruned": prune_task_tombstones(db)}
+    finally:
+        db.close()
+
+
 # Configure periodic task
 celery_app.conf.beat_schedule = {
     'process-scheduled-tasks': {
         'task': 'process_scheduled_tasks',
-        'schedule': crontab(minute='*/5'),  # Run every 5 minutes
+        'schedule': crontab(minute='*/5'),  # Safety-net sweep every 5 minutes
+    },
+    'reconcile-queued-tasks': {
+        'task': 'reconcile_queued_tasks',
+        'schedule': crontab(minute='2-59/5'),  # Between the scheduled-task sweeps
+    },
+    'maintain-task-partitions': {
+        'task': 'maintain_task_partitions',
+        'schedule': crontab(hour=3, minute=0),  # Daily, months ahead of need
+    },
+    'archive-finished-tasks': {
+        'task': 'archive_finished_tasks',
+        'schedule': crontab(minute=30),  # Hourly, in bounded batches
+    },
+    'prune-task-tombstones': {
+        'task': 'prune_task_tombstones',
+        'schedule': crontab(hour=3, minute=15),  # Daily
     },
 }
\ No newline at end of file
@@ -0,0 +1,155 @@
+"""Change feeds of an instance's tasks for polling clients.
+
+A change cursor is an ``(updated_at, id)`` position encoded like the listing
+cursors. Each poll returns the tasks updated after the position, oldest
+change first, and the tombstones of tasks deleted since, so a client moves
+O(changes) rather than re-listing every task.
+
+``updated_at`` is set when a transaction writes, not when it commits, so a
+slow transaction or a lagging read replica can surface a change older than
+one already returned. Once caught up, the cursor is therefore held back
+``task_change_overlap_seconds`` and the most recent changes may be returned
+twice; clients upsert by id.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import Select, delete, select, tuple_
+from sqlalchemy.orm import Session
+
+from src.core.config import get_settings
+from src.models.instance import InstanceTask, InstanceTaskTombstone
+from src.tasks.queue_service import decode_task_cursor, encode_task_cursor
+
+# Sorts before every task id at the same updated_at
+NIL_ID = UUID(int=0)
+
+Position = Tuple[datetime, UUID]
+
+
+class ChangeCursorExpiredError(ValueError):
+    """The cursor is older than the kept tombstones; list all tasks again."""
+
+
+@dataclass
+class TaskChanges:
+    """One page of an instance's change feed."""
+    tasks: List[InstanceTask]
+    deleted: List[Any]  # Rows with id and deleted_at
+    change_cursor: str
+    has_more: bool
+
+
+def _utc(value: datetime) -> datetime:
+    # Task timestamps are stored as naive UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def encode_change_cursor(position: Position) -> str:
+    return encode_task_cursor(_utc(position[0]), position[1])
+
+
+def initial_change_cursor(now: Optional[datetime] = None) -> str:
+    """Cursor for a client that has just listed every task."""
+    now = now or datetime.now(timezone.utc)
+    return encode_change_cursor((now - timedelta(seconds=get_settings().task_change_overlap_seconds), NIL_ID))
+
+
+def change_cursor_since(updated_since: datetime) -> str:
+    """Cursor of the changes made after ``updated_since``."""
+    return encode_change_cursor((updated_since, NIL_ID))
+
+
+def decode_change_cursor(cursor: str, now: Optional[datetime] = None) -> Position:
+    """Position of a change cursor.
+
+    Raises ``ChangeCursorExpiredError`` when deletions after the position
+    may already have been pruned.
+    """
+    since, after_id = decode_task_cursor(cursor)
+    since = _utc(since)
+    now = now or datetime.now(timezone.utc)
+    if since < now - timedelta(days=get_settings().task_tombstone_retention_days):
+        raise ChangeCursorExpiredError("Change cursor expired, list all tasks again")
+    return since, after_id
+
+
+def changed_tasks_statement(instance_id: UUID, position: Position, limit: int) -> Select:
+    """Tasks updated after ``position`` in change order, one more than ``limit``.
+
+    Walks ``idx_instance_tasks_updated``. The partition key is not bounded:
+    old tasks change too, when retried or posted.
+    """
+    since, after_id = position
+    return (
+        select(InstanceTask)
+        .where(
+            InstanceTask.instance_id == instance_id,
+            InstanceTask.updated_at >= since,
+            tuple_(InstanceTask.updated_at, InstanceTask.id) > tuple_(since, after_id)
+        )
+        .order_by(InstanceTask.updated_at, InstanceTask.id)
+        .limit(limit + 1)
+    )
+
+
+def tombstones_statement(instance_id: UUID, position: Position) -> Select:
+    """Tasks of the instance deleted after ``position``."""
+    return (
+        select(InstanceTaskTombstone.task_id.label("id"), InstanceTaskTombstone.deleted_at)
+        .where(
+            InstanceTaskTombstone.instance_id == instance_id,
+            InstanceTaskTombstone.deleted_at > position[0]
+        )
+        .order_by(InstanceTaskTombstone.deleted_at)
+    )
+
+
+def collect_changes(
+    position: Position,
+    tasks: Sequence[InstanceTask],
+    tombstones: Sequence[Any],
+    limit: int,
+    now: Optional[datetime] = None
+) -> TaskChanges:
+    """Page of changes and the cursor of the next poll.
+
+    A full page continues right after its last task, with the tombstones up
+    to it. Otherwise the cursor moves to the newest change, but no further
+    than ``task_change_overlap_seconds`` ago.
+    """
+    has_more = len(tasks) > limit
+    tasks = list(tasks[:limit])
+    if has_more:
+        last = tasks[-1]
+        next_position = (_utc(last.updated_at), last.id)
+        tombstones = [row for row in tombstones if _utc(row.deleted_at) <= next_position[0]]
+    else:
+        now = now or datetime.now(timezone.utc)
+        candidates = [position]
+        if tasks:
+            candidates.append((_utc(tasks[-1].updated_at), tasks[-1].id))
+        if tombstones:
+            candidates.append((_utc(tombstones[-1].deleted_at), NIL_ID))
+        next_position = max(candidates)
+        settled = (now - timedelta(seconds=get_settings().task_change_overlap_seconds), NIL_ID)
+        if next_position > settled:
+            next_position = max(settled, position)
+    return TaskChanges(
+        tasks=tasks,
+        deleted=list(tombstones),
+        change_cursor=encode_change_cursor(next_position),
+        has_more=has_more
+    )
+
+
+def prune_task_tombstones(session: Session, now: Optional[datetime] = None) -> int:
+    """Delete tombstones older than ``task_tombstone_retention_days``."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(days=get_settings().task_tombstone_retention_days)
+    result = session.execute(delete(InstanceTaskTombstone).where(InstanceTaskTombstone.deleted_at < cutoff))
+    session.commit()
+    return result.rowcount
@@ -0,0 +1,127 @@
+"""Tests for cached instance and task access checks."""
+
+import pytest
+from datetime import datetime
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+from fastapi import HTTPException
+
+from src.api.access import AccessCache
+from src.api.routes.tasks import check_instance_access, verify_instance_access, verify_task_access
+from src.models.instance import Instance, InstanceTask
+
+
+class TestAccessCache:
+    """Test cases for AccessCache."""
+
+    def test_grants(self):
+        """Test instance and task grants are remembered per user."""
+        cache = AccessCache(maxsize=10, ttl_seconds=60)
+        user_id, other_user_id, instance_id, task_id = uuid4(), uuid4(), uuid4(), uuid4()
+
+        cache.grant_instance(user_id, instance_id)
+        cache.grant_task(user_id, task_id, instance_id, datetime(2026, 10, 1))
+
+        assert cache.instance_granted(user_id, instance_id)
+        assert not cache.instance_granted(other_user_id, instance_id)
+        assert cache.task_instance(user_id, task_id) == instance_id
+        assert cache.task_instance(other_user_id, task_id) is None
+        assert cache.task_created_at(user_id, task_id) == datetime(2026, 10, 1)
+
+    def test_revoke_instance_revokes_its_tasks(self):
+        """Test revoking an instance also drops grants of its tasks."""
+        cache = AccessCache(maxsize=10, ttl_seconds=60)
+        user_id, instance_id, other_instance_id = uuid4(), uuid4(), uuid4()
+        task_id, other_task_id = uuid4(), uuid4()
+        cache.grant_instance(user_id, instance_id)
+        cache.grant_task(user_id, task_id, instance_id, datetime(2026, 10, 1))
+        cache.grant_task(user_id, other_task_id, other_instance_id, datetime(2026, 10, 1))
+
+        cache.revoke_instance(instance_id)
+
+        assert not cache.instance_granted(user_id, instance_id)
+        assert cache.task_instance(user_id, task_id) is None
+        assert cache.task_instance(user_id, other_task_id) == other_instance_id
+
+
+class TestCachedAccessChecks:
+    """Test cases for the access checks of the task routes."""
+
+    @pytest.fixture
+    def access_cache(self):
+        cache = AccessCache(maxsize=10, ttl_seconds=60)
+        with patch('src.api.routes.tasks.get_access_cache', return_value=cache):
+            yield cache
+
+    @pytest.fixture
+    def mock_db(self):
+        return AsyncMock()
+
+    @pytest.mark.asyncio
+    async def test_task_check_prunes_partitions_once_cached(self, access_cache, mock_db):
+        """Test only the first check joins through the instance."""
+        user_id = uuid4()
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        task.instance_id = uuid4()
+        task.created_at = datetime(2026, 10, 1)
+        mock_db.scalar.return_value = task
+
+        assert await verify_task_access(task.id, user_id, mock_db) is task
+        assert await verify_task_access(task.id, user_id, mock_db) is task
+
+        first, cached = [call.args[0] for call in mock_db.scalar.await_args_list]
+        assert "JOIN instances" in str(first)
+        assert "JOIN" not in str(cached)
+        assert "instance_tasks.created_at" in str(cached)
+
+    @pytest.mark.asyncio
+    async def test_denied_task_not_cached(self, access_cache, mock_db):
+        """Test a denied check is repeated next time."""
+        mock_db.scalar.return_value = None
+
+        for _ in range(2):
+            with pytest.raises(HTTPException) as exc_info:
+                await verify_task_access(uuid4(), uuid4(), mock_db)
+            assert exc_info.value.status_code == 404
+
+        assert mock_db.scalar.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_deleted_instance_revoked(self, access_cache, mock_db):
+        """Test a cached grant of a vanished instance is dropped."""
+        user_id, instance_id = uuid4(), uuid4()
+        access_cache.grant_instance(user_id, instance_id)
+        mock_db.get.return_value = None
+
+        with pytest.raises(HTTPException):
+            await verify_instance_access(instance_id, user_id, mock_db)
+
+        assert not access_cache.instance_granted(user_id, instance_id)
+
+    @pytest.mark.asyncio
+    async def test_denied_user_keeps_owner_grant(self, access_cache, mock_db):
+        """Test probing someone else's instance does not evict the owner's grant."""
+        owner_id, instance_id = uuid4(), uuid4()
+        access_cache.grant_instance(owner_id, instance_id)
+        mock_db.scalar.return_value = None
+
+        with pytest.raises(HTTPException):
+            await verify_instance_access(instance_id, uuid4(), mock_db)
+
+        assert access_cache.instance_granted(owner_id, instance_id)
+
+    @pytest.mark.asyncio
+    async def test_check_skips_query_when_cached(self, access_cache, mock_db):
+        """Test handlers that do not need the instance skip the query entirely."""
+        user_id = uuid4()
+        instance = Mock(spec=Instance)
+        instance.id = uuid4()
+        mock_db.scalar.return_value = instance
+
+        await check_instance_access(instance.id, user_id, mock_db)
+        await check_instance_access(instance.id, user_id, mock_db)
+
+        mock_db.scalar.assert_awaited_once()
+        mock_db.get.assert_not_awaited()
@@ -1,7 +1,7 @@
 """Tests for enhanced task API endpoints."""
 
 import pytest
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from datetime import datetime, timezone, timedelta
 from uuid import uuid4, UUID
 from fastapi.testclient import TestClient
@@ -14,15 +14,32 @@ class TestTaskAPI:
     """Test cases for task API endpoints."""
     
     @pytest.fixture
-    def client(self):
-        """Create test client."""
+    def app(self):
+        """FastAPI application."""
         from src.api.main import app
+        return app
+    
+    @pytest.fixture
+    def client(self, app):
+        """Create test client."""
         return TestClient(app)
     
     @pytest.fixture
-    def mock_db(self):
-        """Create mock database session."""
-        return Mock()
+    def mock_db(self, app):
+        """Create mock async database session served by the session dependencies."""
+        from src.api.deps import get_db, get_read_db
+        
+        session = AsyncMock()
+        session.add = Mock()
+        
+        async def override_get_db():
+            yield session
+        
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        yield session
+        app.dependency_overrides.pop(get_db, None)
+        app.dependency_overrides.pop(get_read_db, None)
     
     @pytest.fixture
     def mock_user_id(self):
@@ -48,18 +65,34 @@ class TestTaskAPI:
         task.status = InstanceTaskStatus.SUBMITTED
         task.priority = TaskPriority.NORMAL
         task.created_at = datetime.now(timezone.utc)
+        task.updated_at = task.created_at
+        task.scheduled_for = None
+        task.recurring_pattern = None
+        task.parsed_intent = None
+        task.progress_percentage = 0
+        task.output_format = None
+        task.output_data = None
+        task.output_media_ids = []
+        task.attached_media_ids = []
+        task.error_message = None
+        task.tiktok_post_status = None
+        task.tiktok_publish_id = None
+        task.tiktok_post_url = None
+        task.processing_started_at = None
+        task.processing_ended_at = None
+        task.retry_count = 0
+        task.parent_task_id = None
         task.execution_steps = []
+        task.archived_at = None
         return task
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_submit_task(self, mock_queue_service, mock_get_db, client, mock_db, mock_instance, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_submit_task(self, mock_queue_service, client, mock_db, mock_instance, mock_task):
         """Test task submission endpoint."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.filter.return_value.first.return_value = mock_instance
+        mock_db.scalar.return_value = mock_instance
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.submit_task.return_value = mock_task
         
@@ -80,17 +113,15 @@ class TestTaskAPI:
         assert data["description"] == mock_task.description
         
         # Verify queue service was called
-        mock_service.submit_task.assert_called_once()
+        mock_service.submit_task.assert_awaited_once()
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_list_tasks_with_filters(self, mock_queue_service, mock_get_db, client, mock_db, mock_instance):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_list_tasks_with_filters(self, mock_queue_service, client, mock_db, mock_instance):
         """Test listing tasks with filters."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.filter.return_value.first.return_value = mock_instance
+        mock_db.scalar.return_value = mock_instance
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.list_tasks.return_value = []
         
@@ -108,22 +139,80 @@ class TestTaskAPI:
         assert response.status_code == 200
         
         # Verify filters were passed
-        mock_service.list_tasks.assert_called_once()
+        mock_service.list_tasks.assert_awaited_once()
         call_args = mock_service.list_tasks.call_args
         filters = call_args[0][1]
         assert isinstance(filters, TaskListFilters)
         assert filters.status == InstanceTaskStatus.COMPLETED
         assert filters.priority == TaskPriority.URGENT
+        assert "X-Change-Cursor" in response.headers
+    
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_list_task_changes(self, mock_queue_service, client, mock_db, mock_instance):
+        """Test a change cursor returns only changes and tombstones."""
+        from src.tasks.task_changes import TaskChanges
+        
+        mock_db.scalar.return_value = mock_instance
+        mock_service = AsyncMock()
+        mock_queue_service.return_value = mock_service
+        deleted_id = uuid4()
+        mock_service.list_task_changes.return_value = TaskChanges(
+            tasks=[],
+            deleted=[Mock(id=deleted_id, deleted_at=datetime(2030, 1, 1))],
+            change_cursor="next",
+            has_more=False
+        )
+        
+        response = client.get(
+            f"/api/v1/tasks/instances/{mock_instance.id}/tasks",
+            params={"change_cursor": "previous", "limit": 20}
+        )
+        
+        assert response.status_code == 200
+        data = response.json()
+        assert data["tasks"] == []
+        assert data["deleted"][0]["id"] == str(deleted_id)
+        assert data["change_cursor"] == "next"
+        mock_service.list_task_changes.assert_awaited_once()
+        assert mock_service.list_task_changes.await_args[0][1:3] == ("previous", 20)
+        mock_service.list_tasks.assert_not_called()
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_get_task_status(self, mock_queue_service, mock_get_db, client, mock_db, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_list_task_changes_rejects_filters(self, mock_queue_service, client, mock_db, mock_instance):
+        """Test change feeds cannot be filtered."""
+        mock_db.scalar.return_value = mock_instance
+        
+        response = client.get(
+            f"/api/v1/tasks/instances/{mock_instance.id}/tasks",
+            params={"updated_since": "2030-01-01T00:00:00Z", "status": "completed"}
+        )
+        
+        assert response.status_code == 400
+    
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_list_task_changes_expired_cursor(self, mock_queue_service, client, mock_db, mock_instance):
+        """Test an expired change cursor asks the client to re-list."""
+        from src.tasks.task_changes import ChangeCursorExpiredError
+        
+        mock_db.scalar.return_value = mock_instance
+        mock_service = AsyncMock()
+        mock_queue_service.return_value = mock_service
+        mock_service.list_task_changes.side_effect = ChangeCursorExpiredError("expired")
+        
+        response = client.get(
+            f"/api/v1/tasks/instances/{mock_instance.id}/tasks",
+            params={"change_cursor": "old"}
+        )
+        
+        assert response.status_code == 410
+
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_get_task_status(self, mock_queue_service, client, mock_db, mock_task):
         """Test getting task status."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.get_task_status.return_value = {
             "task_id": mock_task.id,
@@ -139,32 +228,28 @@ class TestTaskAPI:
         assert data["progress"] == 50
         assert "celery_status" in data
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_cancel_task(self, mock_queue_service, mock_get_db, client, mock_db, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_cancel_task(self, mock_queue_service, client, mock_db, mock_task):
         """Test cancelling a task."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.cancel_task.return_value = True
         
         response = client.post(f"/api/v1/tasks/tasks/{mock_task.id}/cancel")
         
         assert response.status_code == 204
-        mock_service.cancel_task.assert_called_once_with(mock_task.id)
+        mock_service.cancel_task.assert_awaited_once_with(mock_task.id)
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_cancel_task_failed(self, mock_queue_service, mock_get_db, client, mock_db, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_cancel_task_failed(self, mock_queue_service, client, mock_db, mock_task):
         """Test cancelling a task that cannot be cancelled."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.cancel_task.return_value = False
         
@@ -173,16 +258,14 @@ class TestTaskAPI:
         assert response.status_code == 400
         assert "cannot be cancelled" in response.json()["detail"]
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_retry_task(self, mock_queue_service, mock_get_db, client, mock_db, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_retry_task(self, mock_queue_service, client, mock_db, mock_task):
         """Test retrying a failed task."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         mock_task.status = InstanceTaskStatus.FAILED
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.retry_task.return_value = mock_task
         
@@ -191,17 +274,15 @@ class TestTaskAPI:
         assert response.status_code == 200
         data = response.json()
         assert data["id"] == str(mock_task.id)
-        mock_service.retry_task.assert_called_once_with(mock_task.id)
+        mock_service.retry_task.assert_awaited_once_with(mock_task.id)
     
-    @patch('src.api.routes.tasks.get_db')
-    @patch('src.api.routes.tasks.TaskQueueService')
-    def test_update_task(self, mock_queue_service, mock_get_db, client, mock_db, mock_task):
+    @patch('src.api.routes.tasks.AsyncTaskQueueService')
+    def test_update_task(self, mock_queue_service, client, mock_db, mock_task):
         """Test updating task properties."""
-        mock_get_db.return_value = mock_db
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         # Mock queue service
-        mock_service = Mock()
+        mock_service = AsyncMock()
         mock_queue_service.return_value = mock_service
         mock_service.update_task.return_value = mock_task
         
@@ -218,9 +299,157 @@ class TestTaskAPI:
         assert response.status_code == 200
         
         # Verify update was called
-        mock_service.update_task.assert_called_once()
+        mock_service.update_task.assert_awaited_once()
         call_args = mock_service.update_task.call_args
         update_req = call_args[0][1]
         assert isinstance(update_req, TaskUpdateRequest)
         assert update_req.priority == TaskPriority.URGENT
-        assert update_req.progress_percentage == 75
\ No newline at end of file
+        assert update_req.progress_percentage == 75
+
+class TestServerSentEvents:
+    """Test cases for the task event stream encoding."""
+    
+    def test_format_sse(self):
+        """Test messages carry id, event and JSON data lines."""
+        from src.api.routes.tasks import format_sse
+        
+        message = format_sse('task_update', {'data': {'progress': 50}}, 12)
+        
+        assert message == 'id: 12\nevent: task_update\ndata: {"data": {"progress": 50}}\n\n'
+    
+    def test_format_sse_without_id(self):
+        """Test snapshots are sent without an id so they do not move the resume point."""
+        from src.api.routes.tasks import format_sse
+        
+        assert format_sse('snapshot', {'status': 'queued'}).startswith('event: snapshot\n')
+
+
+class TestTaskEventStream:
+    """Test cases for the task event stream endpoint."""
+    
+    @pytest.fixture
+    def task(self):
+        """Task the stream is opened for."""
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        task.instance_id = uuid4()
+        task.status = InstanceTaskStatus.IN_PROGRESS
+        task.progress_percentage = 40
+        task.error_message = None
+        return task
+    
+    @pytest.fixture
+    def event_stream(self):
+        """Fake instance event stream; tests set the items ``tail`` yields."""
+        stream = Mock()
+        stream.items = []
+        
+        async def tail(instance_id, last_seq=None, block_seconds=15):
+            stream.tail_args = (instance_id, last_seq)
+            for item in stream.items:
+                yield item
+        
+        stream.tail = tail
+        stream.replay = AsyncMock(return_value=([], True))
+        with patch('src.api.routes.tasks.get_async_event_stream', return_value=stream):
+            yield stream
+    
+    @staticmethod
+    def update(task, seq, status):
+        return seq, 'task_update', {'task_id': str(task.id), 'data': {'status': status}}
+    
+    async def open_stream(self, task, last_event_id=None):
+        from src.api.routes.tasks import stream_task_events
+        
+        request = Mock()
+        request.is_disconnected = AsyncMock(return_value=False)
+        with patch('src.api.routes.tasks.verify_task_access', AsyncMock(return_value=task)):
+            return await stream_task_events(
+                task_id=task.id,
+                request=request,
+                last_event_id=last_event_id,
+                db=AsyncMock(),
+                user_id=uuid4()
+            )
+    
+    @staticmethod
+    async def read(response):
+        return [chunk async for chunk in response.body_iterator]
+    
+    @staticmethod
+    def event_names(messages):
+        return [line.split(': ', 1)[1] for message in messages for line in message.split('\n') if line.startswith('event: ')]
+    
+    @pytest.mark.asyncio
+    async def test_fresh_connect_starts_with_snapshot(self, task, event_stream):
+        """Test a new stream sends a snapshot, then follows from now on."""
+        event_stream.items = [None, self.update(task, 8, 'completed')]
+        
+        messages = await self.read(await self.open_stream(task))
+        
+        assert self.event_names(messages) == ['snapshot', 'task_update']
+        assert '"progress": 40' in messages[0]
+        assert event_stream.tail_args == (str(task.instance_id), None)
+    
+    @pytest.mark.asyncio
+    async def test_resume_from_last_event_id(self, task, event_stream):
+        """Test a reconnect skips the snapshot and gets events after its id."""
+        other_task = {'task_id': str(uuid4()), 'data': {'status': 'queued'}}
+        event_stream.items = [(6, 'task_update', other_task), self.update(task, 7, 'in_progress'), self.update(task, 8, 'completed')]
+        
+        messages = await self.read(await self.open_stream(task, last_event_id='5'))
+        
+        assert self.event_names(messages) == ['task_update', 'task_update']
+        assert messages[0].startswith('id: 7\n')
+        assert event_stream.tail_args == (str(task.instance_id), 5)
+    
+    @pytest.mark.asyncio
+    async def test_reset_sends_snapshot(self, task, event_stream):
+        """Test a gap in the replay is answered with reset and a snapshot."""
+        event_stream.items = [(5, 'reset', {}), self.update(task, 9, 'failed')]
+        
+        messages = await self.read(await self.open_stream(task, last_event_id='5'))
+        
+        assert self.event_names(messages) == ['reset', 'snapshot', 'task_update']
+    
+    @pytest.mark.asyncio
+    async def test_closes_on_terminal_status(self, task, event_stream):
+        """Test nothing is read past the task's terminal update."""
+        event_stream.items = [self.update(task, 8, 'completed'), self.update(task, 9, 'in_progress')]
+        
+        messages = await self.read(await self.open_stream(task))
+        
+        assert self.event_names(messages) == ['snapshot', 'task_update']
+    
+    @pytest.mark.asyncio
+    async def test_finished_task_fresh_connect(self, task, event_stream):
+        """Test a finished task gets its snapshot without tailing the stream."""
+        task.status = InstanceTaskStatus.COMPLETED
+        event_stream.items = [None]
+        
+        messages = await self.read(await self.open_stream(task))
+        
+        assert self.event_names(messages) == ['snapshot']
+        assert not hasattr(event_stream, 'tail_args')
+    
+    @pytest.mark.asyncio
+    async def test_reconnect_after_terminal_event(self, task, event_stream):
+        """Test EventSource's reconnect after the end of the stream gets 204."""
+        task.status = InstanceTaskStatus.COMPLETED
+        event_stream.replay.return_value = ([(9, 'task_update', {'task_id': str(uuid4()), 'data': {}})], True)
+        
+        response = await self.open_stream(task, last_event_id='8')
+        
+        assert response.status_code == 204
+        event_stream.replay.assert_awaited_once_with(str(task.instance_id), 8)
+    
+    @pytest.mark.asyncio
+    async def test_reconnect_to_finished_task_gets_missed_events(self, task, event_stream):
+        """Test a finished task's missed events are replayed, then the stream ends."""
+        task.status = InstanceTaskStatus.COMPLETED
+        event_stream.replay.return_value = ([self.update(task, 8, 'completed')], True)
+        
+        messages = await self.read(await self.open_stream(task, last_event_id='7'))
+        
+        assert self.event_names(messages) == ['task_update']
+        assert not hasattr(event_stream, 'tail_args')
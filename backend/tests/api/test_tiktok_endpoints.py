@@ -7,7 +7,7 @@ from unittest.mock import AsyncMock, patch, MagicMock, Mock
 from fastapi.testclient import TestClient
 from fastapi import HTTPException
 
-from src.models.instance import InstanceTaskStatus, TaskPriority
+from src.models.instance import InstanceTaskStatus, InstanceTaskStep, TaskPriority
 from src.models.instance_schemas import TikTokPostRequest, TikTokPostResponse
 from src.api.routes.tasks import (
     post_task_to_tiktok,
@@ -22,7 +22,7 @@ class TestTikTokEndpoints:
     @pytest.mark.asyncio
     async def test_post_to_tiktok_validates_task_status(self):
         """Test that posting validates task must be completed."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -34,7 +34,7 @@ class TestTikTokEndpoints:
         mock_task.get_video_url = Mock(return_value=None)
         
         # Setup query chain
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         post_request = TikTokPostRequest(
             title="Test post",
@@ -56,7 +56,7 @@ class TestTikTokEndpoints:
     @pytest.mark.asyncio
     async def test_post_to_tiktok_validates_video_url(self):
         """Test that posting validates video URL from approved domains."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -69,7 +69,7 @@ class TestTikTokEndpoints:
         mock_task.get_video_url = Mock(return_value=None)
         mock_task.tiktok_post_status = None
         
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         post_request = TikTokPostRequest(
             title="Test post",
@@ -90,7 +90,7 @@ class TestTikTokEndpoints:
     @pytest.mark.asyncio
     async def test_post_to_tiktok_refreshes_expired_token(self):
         """Test that expired tokens are automatically refreshed."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         instance_id = uuid4()
@@ -116,12 +116,8 @@ class TestTikTokEndpoints:
         mock_credentials.refresh_token_encrypted = b"refresh"
         mock_credentials.expires_at = datetime.now(timezone.utc) - timedelta(hours=1)
         
-        # Setup database mocks - handle different query chains
-        mock_query = Mock()
-        mock_query.join.return_value.filter.return_value.first.return_value = mock_task
-        mock_query.filter.return_value.filter.return_value.first.return_value = mock_credentials
-        mock_query.filter.return_value.first.return_value = mock_credentials
-        mock_db.query.return_value = mock_query
+        # Setup database mocks - the task lookup, then the credentials lookup
+        mock_db.scalar.side_effect = [mock_task, mock_credentials]
         
         post_request = TikTokPostRequest(
             title="Test with token refresh",
@@ -174,7 +170,7 @@ class TestTikTokEndpoints:
     @pytest.mark.asyncio
     async def test_check_post_status_updates_on_completion(self):
         """Test that checking status updates task when post completes."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -196,12 +192,8 @@ class TestTikTokEndpoints:
         mock_credentials.tiktok_open_id = "open_id"
         mock_credentials.display_name = "testuser"
         
-        # Setup database mocks - handle different query chains
-        mock_query = Mock()
-        mock_query.join.return_value.filter.return_value.first.return_value = mock_task
-        mock_query.filter.return_value.filter.return_value.first.return_value = mock_credentials
-        mock_query.filter.return_value.first.return_value = mock_credentials
-        mock_db.query.return_value = mock_query
+        # Setup database mocks - the task lookup, then the credentials lookup
+        mock_db.scalar.side_effect = [mock_task, mock_credentials]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
              patch('src.services.tiktok.content_api.TikTokContentAPI') as MockAPI:
@@ -227,12 +219,12 @@ class TestTikTokEndpoints:
             status="PUBLISHED",
             post_url="https://www.tiktok.com/@testuser/video/7123456789"
         )
-        mock_db.commit.assert_called()
+        mock_db.commit.assert_awaited()
     
     @pytest.mark.asyncio
     async def test_check_post_status_handles_failure(self):
         """Test that checking status properly handles failed posts."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -252,12 +244,8 @@ class TestTikTokEndpoints:
         mock_credentials.tiktok_open_id = "open_id"
         mock_credentials.display_name = "testuser"
         
-        # Setup database mocks - handle different query chains
-        mock_query = Mock()
-        mock_query.join.return_value.filter.return_value.first.return_value = mock_task
-        mock_query.filter.return_value.filter.return_value.first.return_value = mock_credentials
-        mock_query.filter.return_value.first.return_value = mock_credentials
-        mock_db.query.return_value = mock_query
+        # Setup database mocks - the task lookup, then the credentials lookup
+        mock_db.scalar.side_effect = [mock_task, mock_credentials]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
              patch('src.services.tiktok.content_api.TikTokContentAPI') as MockAPI:
@@ -283,9 +271,10 @@ class TestTikTokEndpoints:
             error="video_format_not_supported"
         )
     
-    def test_task_detail_formats_execution_logs(self):
+    @pytest.mark.asyncio
+    async def test_task_detail_formats_execution_logs(self):
         """Test that task detail properly formats execution steps as logs."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -301,7 +290,7 @@ class TestTikTokEndpoints:
             "video_url": "https://test.supabase.co/storage/v1/videos/test.mp4",
             "caption": "Check out this product!"
         }
-        mock_task.execution_steps = [
+        steps = [
             {
                 "step_id": "1",
                 "agent": "TrendAnalyzer",
@@ -319,6 +308,8 @@ class TestTikTokEndpoints:
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
         ]
+        mock_task.step_count = len(steps)
+        mock_task.archived_at = None
         mock_task.attached_media_ids = []
         mock_task.error_message = None
         mock_task.tiktok_post_data = None
@@ -334,12 +325,15 @@ class TestTikTokEndpoints:
         mock_task.output_media_ids = []
         
         # Setup database mocks
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
-        mock_db.query.return_value.filter.return_value.all.return_value = []
+        mock_db.scalar.return_value = mock_task
+        records = [InstanceTaskStep(task_id=task_id, seq=seq, step=step) for seq, step in enumerate(steps, 1)]
         
-        with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id):
-            response = get_task_detail(
+        with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
+             patch('src.api.routes.tasks.list_task_steps_async', AsyncMock(return_value=records)):
+            response = await get_task_detail(
                 task_id=task_id,
+                steps_after_seq=0,
+                steps_limit=100,
                 db=mock_db,
                 user_id=mock_user_id
             )
@@ -359,7 +353,7 @@ class TestTikTokEndpoints:
     @pytest.mark.asyncio
     async def test_posting_prevents_duplicate_posts(self):
         """Test that tasks already being posted can't be posted again."""
-        mock_db = Mock()
+        mock_db = AsyncMock()
         mock_user_id = uuid4()
         task_id = uuid4()
         
@@ -371,7 +365,7 @@ class TestTikTokEndpoints:
         mock_task.can_post_to_tiktok = Mock(return_value=False)
         mock_task.get_video_url = Mock(return_value="https://test.supabase.co/storage/v1/videos/test.mp4")
         
-        mock_db.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task
+        mock_db.scalar.return_value = mock_task
         
         post_request = TikTokPostRequest(
             title="Duplicate post attempt",
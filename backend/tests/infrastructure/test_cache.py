@@ -0,0 +1,41 @@
+"""Tests for the shared in-process caches."""
+
+from unittest.mock import patch
+
+from src.core.cache import TTLCache
+
+
+class TestTTLCache:
+    """Test cases for TTLCache."""
+
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted."""
+        cache = TTLCache(maxsize=2, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        assert cache.get("a") == 1
+        assert cache.get("b") is None
+        assert len(cache) == 2
+
+    def test_expiry(self):
+        """Test entries expire after the TTL."""
+        cache = TTLCache(maxsize=2, ttl_seconds=10)
+        with patch('src.core.cache.time.monotonic', return_value=100.0):
+            cache.set("a", 1)
+        with patch('src.core.cache.time.monotonic', return_value=111.0):
+            assert cache.get("a") is None
+
+    def test_discard_where(self):
+        """Test entries can be removed by key and by predicate."""
+        cache = TTLCache(maxsize=3, ttl_seconds=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.set("c", 1)
+
+        cache.discard("b")
+        cache.discard_where(lambda key, value: value == 1)
+
+        assert len(cache) == 0
@@ -0,0 +1,97 @@
+"""Tests for task event coalescing."""
+
+import pytest
+
+from src.core.event_coalescing import TaskEventCoalescer
+
+
+class FakeClock:
+    """Manually advanced monotonic clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTaskEventCoalescer:
+    """Test cases for TaskEventCoalescer."""
+
+    @pytest.fixture
+    def clock(self):
+        return FakeClock()
+
+    @pytest.fixture
+    def coalescer(self, clock):
+        """Two emits per second per task, no room limit."""
+        return TaskEventCoalescer(task_rate=2, room_rate=0, clock=clock)
+
+    def test_first_event_emitted_immediately(self, coalescer):
+        """Test the leading event of a task is not delayed."""
+        events = coalescer.add_update("inst", "task", {"progress": 10})
+
+        assert len(events) == 1
+        event, room, data = events[0]
+        assert event == 'task_update'
+        assert room == "instance_inst"
+        assert data['data'] == {"progress": 10}
+
+    def test_progress_coalesced_to_latest(self, coalescer, clock):
+        """Test held-back updates merge so only the latest progress is sent."""
+        coalescer.add_update("inst", "task", {"progress": 10})
+        assert coalescer.add_update("inst", "task", {"progress": 20}) == []
+        assert coalescer.add_update("inst", "task", {"progress": 30}) == []
+        assert coalescer.flush_due() == []
+
+        clock.now += 0.5
+        events = coalescer.flush_due()
+
+        assert [data['data']['progress'] for _, _, data in events] == [30]
+        assert not coalescer.pending
+
+    def test_steps_batched(self, coalescer, clock):
+        """Test held-back steps are sent as one execution_steps event."""
+        coalescer.add_step("inst", "task", {"step_id": "a"})
+        coalescer.add_step("inst", "task", {"step_id": "b"})
+        coalescer.add_step("inst", "task", {"step_id": "c"})
+
+        clock.now += 0.5
+        events = coalescer.flush_due()
+
+        assert len(events) == 1
+        assert events[0][0] == 'execution_steps'
+        assert [step['step_id'] for step in events[0][2]['data']] == ["b", "c"]
+
+    def test_terminal_status_bypasses_limits(self, coalescer):
+        """Test a terminal status drains everything pending at once."""
+        coalescer.add_update("inst", "task", {"progress": 10})
+        coalescer.add_step("inst", "task", {"step_id": "a"})
+        coalescer.add_update("inst", "task", {"progress": 90})
+
+        events = coalescer.add_update("inst", "task", {"status": "completed"})
+
+        assert [event for event, _, _ in events] == ['execution_step', 'task_update']
+        assert events[1][2]['data'] == {"progress": 90, "status": "completed"}
+        assert not coalescer.pending
+
+    def test_room_rate_limit(self, clock):
+        """Test tasks sharing a room share its emit budget."""
+        coalescer = TaskEventCoalescer(task_rate=0, room_rate=2, clock=clock)
+
+        emitted = [coalescer.add_update("inst", f"task{i}", {"progress": 1}) for i in range(3)]
+        assert [len(events) for events in emitted] == [1, 1, 0]
+        assert coalescer.add_update("other", "task9", {"progress": 1})
+
+        clock.now += 0.5
+        assert len(coalescer.flush_due()) == 1
+
+    def test_flush(self, coalescer):
+        """Test flush drains regardless of the rate limits."""
+        coalescer.add_update("inst", "task", {"progress": 10})
+        coalescer.add_update("inst", "task", {"progress": 20})
+
+        events = coalescer.flush("task")
+
+        assert events[0][2]['data'] == {"progress": 20}
+        assert coalescer.flush() == []
@@ -0,0 +1,115 @@
+"""Tests for per-instance task event streams."""
+
+import json
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+
+from src.core.event_stream import AsyncTaskEventStream, TaskEventStream
+
+
+def entry(seq, event="task_update", data=None):
+    """Build an XREVRANGE entry."""
+    return (f"{seq}-0", {'seq': str(seq), 'event': event, 'data': json.dumps(data or {'n': seq})})
+
+
+class TestTaskEventStream:
+    """Test cases for TaskEventStream."""
+
+    def test_append(self):
+        """Test append runs the script on the instance's keys and returns the seq."""
+        client = Mock()
+        client.register_script.return_value = Mock(return_value=[12, "1700000000000-0"])
+        stream = TaskEventStream(client, maxlen=100, max_age=60)
+
+        assert stream.append("inst", 'task_update', {'task_id': "t1"}) == (12, 1700000000000)
+
+        call = client.register_script.return_value.call_args
+        assert call[1]['keys'] == ["swallowtail:events:inst", "swallowtail:events:inst:seq"]
+        maxlen, event, payload, _, ttl = call[1]['args']
+        assert (maxlen, event, json.loads(payload), ttl) == (100, 'task_update', {'task_id': "t1"}, 60)
+
+
+class TestAsyncTaskEventStream:
+    """Test cases for AsyncTaskEventStream.replay."""
+
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.pipeline.return_value = Mock(execute=AsyncMock())
+        return client
+
+    @pytest.mark.asyncio
+    async def test_replay_after_last_seq(self, client):
+        """Test only newer events are returned, oldest first."""
+        client.pipeline.return_value.execute.return_value = [[entry(9), entry(8), entry(7)], "9"]
+
+        events, complete = await AsyncTaskEventStream(client).replay("inst", 7)
+
+        assert [seq for seq, _, _ in events] == [8, 9]
+        assert events[0][2] == {'n': 8, 'ts': 8}
+        assert complete
+
+    @pytest.mark.asyncio
+    async def test_replay_truncated(self, client):
+        """Test a gap before the oldest kept event is reported."""
+        client.pipeline.return_value.execute.return_value = [[entry(20), entry(19)], "20"]
+
+        events, complete = await AsyncTaskEventStream(client).replay("inst", 3, limit=2)
+
+        assert [seq for seq, _, _ in events] == [19, 20]
+        assert not complete
+
+    @pytest.mark.asyncio
+    async def test_replay_nothing_missed(self, client):
+        """Test a client that is up to date gets nothing."""
+        client.pipeline.return_value.execute.return_value = [[entry(5)], "5"]
+
+        assert await AsyncTaskEventStream(client).replay("inst", 5) == ([], True)
+
+    @pytest.mark.asyncio
+    async def test_replay_expired_stream(self, client):
+        """Test events lost to stream expiry are reported."""
+        client.pipeline.return_value.execute.return_value = [[], "30"]
+
+        assert await AsyncTaskEventStream(client).replay("inst", 10) == ([], False)
+
+
+class TestTail:
+    """Test cases for AsyncTaskEventStream.tail."""
+
+    @pytest.fixture
+    def client(self):
+        client = Mock()
+        client.pipeline.return_value = Mock(execute=AsyncMock())
+        client.xread = AsyncMock()
+        return client
+
+    @pytest.mark.asyncio
+    async def test_follows_new_entries(self, client):
+        """Test tailing starts after the newest entry and yields None on timeout."""
+        client.pipeline.return_value.execute.return_value = [[entry(4)], "4"]
+        client.xread.side_effect = [[("stream", [entry(5), entry(6)])], []]
+
+        tail = AsyncTaskEventStream(client).tail("inst", block_seconds=1)
+        items = [await tail.__anext__() for _ in range(3)]
+        await tail.aclose()
+
+        assert [item[0] for item in items[:2]] == [5, 6]
+        assert items[2] is None
+        assert client.xread.call_args_list[0][0][0] == {"swallowtail:events:inst": "4-0"}
+        assert client.xread.call_args_list[1][0][0] == {"swallowtail:events:inst": "6-0"}
+        assert client.xread.call_args_list[0][1]['block'] == 1000
+
+    @pytest.mark.asyncio
+    async def test_resume_with_gap(self, client):
+        """Test a resume past trimmed events signals a reset before the replay."""
+        client.pipeline.return_value.execute.return_value = [[entry(9), entry(8)], "9"]
+        client.xread.return_value = []
+
+        tail = AsyncTaskEventStream(client).tail("inst", last_seq=2)
+        items = [await tail.__anext__() for _ in range(3)]
+        await tail.aclose()
+
+        assert items[0] == (2, 'reset', {})
+        assert [item[0] for item in items[1:]] == [8, 9]
@@ -0,0 +1,131 @@
+"""Tests for per-unit SQL instrumentation and the N+1 detector."""
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from src.core.query_stats import (
+    REQUEST,
+    TASK,
+    QueryMetrics,
+    QueryStats,
+    current_query_stats,
+    instrument_engine,
+    statement_shape,
+    track_queries,
+)
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    instrument_engine(engine)
+    return engine
+
+
+@pytest.fixture
+def metrics():
+    metrics = QueryMetrics()
+    with patch("src.core.query_stats.query_metrics", metrics):
+        yield metrics
+
+
+class TestStatementShape:
+    """Test cases for statement_shape."""
+
+    def test_parameters_and_literals(self):
+        """Test bound parameters and literals do not change the shape."""
+        assert statement_shape("SELECT * FROM t WHERE id = $1 AND name = 'x'") == \
+            statement_shape("SELECT * FROM t WHERE id = $2 AND name = 'y'")
+
+    def test_in_lists_collapse(self):
+        """Test expanded IN lists of any length share a shape."""
+        assert statement_shape("SELECT * FROM t WHERE id IN ($1, $2, $3)") == "SELECT * FROM t WHERE id IN (?)"
+        assert statement_shape("SELECT * FROM t WHERE id IN (%(id_1)s)") == "SELECT * FROM t WHERE id IN (?)"
+
+
+class TestTrackQueries:
+    """Test cases for counting statements per unit of work."""
+
+    def test_counts_statements_in_unit(self, engine, metrics):
+        """Test statements inside the unit are counted and timed."""
+        with track_queries(REQUEST, "GET /tasks") as stats, engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT 2"))
+
+        assert stats.count == 2
+        assert stats.seconds_total >= stats.slowest_seconds > 0
+        assert stats.slowest_statement in ("SELECT 1", "SELECT 2")
+        assert metrics.stats()[REQUEST]["units"] == 1
+        assert metrics.stats()[REQUEST]["queries"] == 2
+
+    def test_statements_outside_unit_ignored(self, engine, metrics):
+        """Test nothing is recorded without an open unit."""
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+        assert current_query_stats() is None
+        assert metrics.stats() == {}
+
+    def test_failed_statement_does_not_skew_timing(self, engine, metrics):
+        """Test a statement that raises leaves no start time behind."""
+        with track_queries(TASK) as stats, engine.connect() as connection:
+            with pytest.raises(Exception):
+                connection.execute(text("SELECT * FROM missing"))
+            connection.execute(text("SELECT 1"))
+            assert connection.info["query_stats_started"] == []
+
+        assert stats.count == 1
+
+    def test_instrumenting_twice_counts_once(self, engine, metrics):
+        """Test repeated instrumentation adds no second listener."""
+        instrument_engine(engine)
+
+        with track_queries(REQUEST) as stats, engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+
+        assert stats.count == 1
+
+
+class TestNPlusOne:
+    """Test cases for the N+1 detector."""
+
+    def test_warns_once_past_threshold(self, caplog):
+        """Test one warning when a shape runs more than the threshold."""
+        stats = QueryStats(kind=REQUEST, name="GET /tasks", n_plus_one_threshold=3)
+
+        for task_id in range(6):
+            stats.record(f"SELECT * FROM steps WHERE task_id = {task_id}", 0.001)
+
+        assert stats.repeated_shapes == {"SELECT * FROM steps WHERE task_id = ?"}
+        assert len([r for r in caplog.records if "N+1" in r.getMessage()]) == 1
+        assert stats.headers()["X-DB-N-Plus-One"] == "1"
+
+    def test_disabled(self):
+        """Test a zero threshold skips shape counting."""
+        stats = QueryStats(kind=TASK, n_plus_one_threshold=0)
+
+        for _ in range(50):
+            stats.record("SELECT 1", 0.001)
+
+        assert not stats.shapes
+        assert not stats.repeated_shapes
+
+
+class TestHeaders:
+    """Test cases for the debug response headers."""
+
+    def test_single_line_slowest_statement(self):
+        """Test the slowest statement is flattened into a valid header value."""
+        stats = QueryStats(kind=REQUEST)
+        stats.record("SELECT 1", 0.001)
+        stats.record("SELECT *\n  FROM instance_tasks\n  WHERE id = $1", 0.010)
+
+        headers = stats.headers()
+
+        assert headers["X-DB-Query-Count"] == "2"
+        assert headers["X-DB-Time-Ms"] == "11.0"
+        assert headers["X-DB-Slowest-Ms"] == "10.0"
+        assert headers["X-DB-Slowest-Statement"] == "SELECT * FROM instance_tasks WHERE id = $1"
+        assert "X-DB-N-Plus-One" not in headers
@@ -0,0 +1,122 @@
+"""Tests for read replica routing and read-your-writes."""
+
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+import redis
+from sqlalchemy import Column, Integer, create_engine, text, update
+from sqlalchemy.orm import Session, declarative_base
+
+from src.core import database
+from src.core.read_routing import ReadSessionRouter, ReadYourWrites, has_committed_writes
+
+Base = declarative_base()
+
+
+class Row(Base):
+    __tablename__ = "rows"
+    id = Column(Integer, primary_key=True)
+    value = Column(Integer)
+
+
+@pytest.fixture
+def sqlite_session():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+
+class TestWriteTracking:
+    """Test cases for detecting committed writes."""
+
+    def test_flush_then_commit(self, sqlite_session):
+        """Test committed ORM changes count as writes."""
+        sqlite_session.add(Row(id=1, value=1))
+        sqlite_session.commit()
+
+        assert has_committed_writes(sqlite_session)
+
+    def test_bulk_update(self, sqlite_session):
+        """Test UPDATE statements count as writes."""
+        sqlite_session.execute(update(Row).values(value=2))
+        sqlite_session.commit()
+
+        assert has_committed_writes(sqlite_session)
+
+    def test_reads_and_rollbacks_are_not_writes(self, sqlite_session):
+        """Test reads and rolled back changes do not count."""
+        sqlite_session.execute(text("SELECT 1"))
+        sqlite_session.commit()
+        sqlite_session.add(Row(id=1, value=1))
+        sqlite_session.flush()
+        sqlite_session.rollback()
+        sqlite_session.commit()
+
+        assert not has_committed_writes(sqlite_session)
+
+
+class TestReadSessionRouter:
+    """Test cases for ReadSessionRouter."""
+
+    @pytest.fixture
+    def sticky(self):
+        sticky = Mock(spec=ReadYourWrites)
+        sticky.wrote_recently = AsyncMock(return_value=False)
+        return sticky
+
+    @pytest.fixture
+    def router(self, sticky):
+        router = ReadSessionRouter(registry=Mock(), sticky=sticky)
+        router._replica_factories = [Mock(return_value="replica_0"), Mock(return_value="replica_1")]
+        return router
+
+    @pytest.mark.asyncio
+    async def test_round_robin_over_replicas(self, router):
+        """Test reads are spread over the replicas."""
+        sessions = [await router.session("user") for _ in range(4)]
+
+        assert sessions == ["replica_0", "replica_1", "replica_0", "replica_1"]
+
+    @pytest.mark.asyncio
+    async def test_recent_writer_reads_primary(self, router, sticky):
+        """Test a user who just wrote reads from the primary."""
+        sticky.wrote_recently.return_value = True
+
+        with patch.object(database, "AsyncSessionLocal", Mock(return_value="primary")):
+            assert await router.session("user") == "primary"
+
+        sticky.wrote_recently.assert_awaited_once_with("user")
+
+    @pytest.mark.asyncio
+    async def test_no_replicas_reads_primary(self, router, sticky):
+        """Test the primary is used without checking Redis when there are no replicas."""
+        router._replica_factories = []
+
+        with patch.object(database, "AsyncSessionLocal", Mock(return_value="primary")):
+            assert await router.session("user") == "primary"
+
+        sticky.wrote_recently.assert_not_awaited()
+
+
+class TestReadYourWrites:
+    """Test cases for the read-your-writes window."""
+
+    @pytest.mark.asyncio
+    async def test_mark_sets_expiring_key(self):
+        """Test a write is remembered for the window."""
+        sticky = ReadYourWrites(window_seconds=2.5)
+        sticky._redis = AsyncMock()
+
+        await sticky.mark("user")
+
+        sticky._redis.set.assert_awaited_once_with("swallowtail:rw:user", 1, px=2500)
+
+    @pytest.mark.asyncio
+    async def test_redis_failure_reads_primary(self):
+        """Test reads stay on the primary when Redis cannot be asked."""
+        sticky = ReadYourWrites()
+        sticky._redis = AsyncMock()
+        sticky._redis.exists.side_effect = redis.ConnectionError("down")
+
+        assert await sticky.wrote_recently("user") is True
@@ -1,10 +1,53 @@
 """Tests for WebSocket functionality."""
 
 import pytest
+import asyncio
+from datetime import datetime, timezone
 from unittest.mock import Mock, AsyncMock, patch
 from uuid import uuid4
 
-from src.core.websocket import WebSocketManager, connected_clients
+from src.core.event_coalescing import TaskEventCoalescer
+from src.core.websocket import (
+    SubscriberCounts,
+    TaskEventPublisher,
+    WebSocketManager,
+    client_subscriptions,
+    connected_clients,
+    stamp_event,
+    task_delta
+)
+from src.models.instance import InstanceTaskStatus
+
+
+class TestTaskDelta:
+    """Test cases for task update deltas."""
+    
+    def test_values_are_json_friendly(self):
+        """Test enums, datetimes and id lists are encoded for the wire."""
+        ended_at = datetime(2024, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        media_id = uuid4()
+        
+        delta = task_delta({
+            'status': InstanceTaskStatus.COMPLETED,
+            'processing_ended_at': ended_at,
+            'output_media_ids': [media_id]
+        })
+        
+        assert delta == {
+            'status': "completed",
+            'processing_ended_at': ended_at.isoformat(),
+            'output_media_ids': [str(media_id)]
+        }
+    
+    def test_unknown_fields_rejected(self):
+        """Test fields outside the delta schema are refused."""
+        with pytest.raises(ValueError, match="output_data"):
+            task_delta({'status': "completed", 'output_data': {}})
+    
+    def test_stamp_event(self):
+        """Test recorded events carry seq and ts, unrecorded ones only ts."""
+        assert stamp_event({}, (3, 1700000000000)) == {'seq': 3, 'ts': 1700000000000}
+        assert set(stamp_event({}, None)) == {'ts'}
 
 
 class TestWebSocketManager:
@@ -21,9 +64,16 @@ class TestWebSocketManager:
         return sio
     
     @pytest.fixture
-    def ws_manager(self, mock_sio):
+    def event_stream(self):
+        """Create a mock event stream."""
+        stream = AsyncMock()
+        stream.append.return_value = (42, 1700000000000)
+        return stream
+    
+    @pytest.fixture
+    def ws_manager(self, mock_sio, event_stream):
         """Create WebSocketManager with mock server."""
-        return WebSocketManager(mock_sio)
+        return WebSocketManager(mock_sio, subscriber_counts=AsyncMock(), event_stream=event_stream)
     
     @pytest.mark.asyncio
     async def test_broadcast_task_update(self, ws_manager, mock_sio):
@@ -40,6 +90,8 @@ class TestWebSocketManager:
         assert call_args[0][1]['instance_id'] == instance_id
         assert call_args[0][1]['task_id'] == task_id
         assert call_args[0][1]['data'] == update_data
+        assert call_args[0][1]['seq'] == 42
+        assert call_args[0][1]['ts'] == 1700000000000
         assert call_args[1]['room'] == f"instance_{instance_id}"
     
     @pytest.mark.asyncio
@@ -48,15 +100,13 @@ class TestWebSocketManager:
         instance_id = str(uuid4())
         task_id = str(uuid4())
         progress = 75
-        message = "Processing data..."
         
-        await ws_manager.broadcast_task_progress(instance_id, task_id, progress, message)
+        await ws_manager.broadcast_task_progress(instance_id, task_id, progress)
         
         mock_sio.emit.assert_called_once()
         call_args = mock_sio.emit.call_args
         event_data = call_args[0][1]
-        assert event_data['data']['progress'] == progress
-        assert event_data['data']['message'] == message
+        assert event_data['data'] == {'progress_percentage': progress}
     
     @pytest.mark.asyncio
     async def test_broadcast_task_status(self, ws_manager, mock_sio):
@@ -93,6 +143,39 @@ class TestWebSocketManager:
         assert call_args[0][0] == 'execution_step'
         assert call_args[0][1]['data'] == step
     
+    @pytest.mark.asyncio
+    @pytest.mark.asyncio
+    async def test_emit_without_event_stream(self, ws_manager, mock_sio, event_stream):
+        """Test events are still delivered when recording them fails."""
+        event_stream.append.side_effect = ConnectionError("redis down")
+        
+        await ws_manager.broadcast_task_status("inst", "task", "completed")
+        
+        mock_sio.emit.assert_called_once()
+        assert 'seq' not in mock_sio.emit.call_args[0][1]
+        assert 'ts' in mock_sio.emit.call_args[0][1]
+    
+    @pytest.mark.asyncio
+    async def test_held_back_progress_flushed(self, mock_sio, event_stream):
+        """Test rapid progress updates are coalesced and flushed in the background."""
+        manager = WebSocketManager(
+            mock_sio,
+            TaskEventCoalescer(task_rate=20, room_rate=0),
+            subscriber_counts=AsyncMock(),
+            event_stream=event_stream
+        )
+        manager.flush_interval = 0.01
+        
+        await manager.broadcast_task_progress("inst", "task", 10)
+        await manager.broadcast_task_progress("inst", "task", 20)
+        await manager.broadcast_task_progress("inst", "task", 30)
+        assert mock_sio.emit.call_count == 1
+        
+        await asyncio.wait_for(manager._flusher, timeout=1)
+        
+        assert mock_sio.emit.call_count == 2
+        assert mock_sio.emit.call_args[0][1]['data']['progress_percentage'] == 30
+    
     def test_get_connected_clients(self, ws_manager):
         """Test getting connected client count."""
         instance_id = "test-instance"
@@ -108,25 +191,166 @@ class TestWebSocketManager:
         del connected_clients[instance_id]
 
 
+class TestTaskEventPublisher:
+    """Test cases for TaskEventPublisher."""
+    
+    @pytest.fixture
+    def manager(self):
+        """Create a mock write-only Redis manager."""
+        return Mock()
+    
+    @pytest.fixture
+    def publisher(self, manager):
+        """Create a publisher with a mock event stream."""
+        return TaskEventPublisher(manager, event_stream=Mock(**{'append.return_value': (7, 1700000000000)}))
+    
+    def test_task_progress(self, manager, publisher):
+        """Test progress is published to the instance room."""
+        instance_id = str(uuid4())
+        task_id = str(uuid4())
+        
+        publisher.task_progress(instance_id, task_id, 40)
+        
+        manager.emit.assert_called_once()
+        call_args = manager.emit.call_args
+        assert call_args[0][0] == 'task_update'
+        assert call_args[0][1]['task_id'] == task_id
+        assert call_args[0][1]['data'] == {'progress_percentage': 40}
+        assert call_args[0][1]['seq'] == 7
+        publisher.event_stream.append.assert_called_once_with(instance_id, 'task_update', call_args[0][1])
+        assert call_args[1]['room'] == f"instance_{instance_id}"
+    
+    def test_task_status(self, manager, publisher):
+        """Test status changes use the same payload as the server broadcast."""
+        publisher.task_status("inst", "task", "failed", "API error")
+        
+        event_data = manager.emit.call_args[0][1]
+        assert event_data['type'] == 'task_update'
+        assert event_data['data']['status'] == "failed"
+        assert event_data['data']['error_message'] == "API error"
+    
+    def test_execution_step(self, manager, publisher):
+        """Test execution steps are published as execution_step events."""
+        step = {"step_id": "step_1", "status": "completed"}
+        
+        publisher.execution_step("inst", "task", step)
+        
+        call_args = manager.emit.call_args
+        assert call_args[0][0] == 'execution_step'
+        assert call_args[0][1]['data'] == step
+        assert call_args[1]['room'] == "instance_inst"
+
+
 class TestWebSocketHandlers:
     """Test Socket.io event handlers."""
     
     @pytest.fixture
-    def setup_handlers(self):
-        """Set up handlers for testing."""
-        # Import to register handlers
-        from src.core.websocket import ws_manager
-        return ws_manager
+    def sio(self):
+        """Create a mock server that records registered handlers."""
+        sio = AsyncMock()
+        sio.registered = {}
+        sio.event = lambda handler: sio.registered.setdefault(handler.__name__, handler)
+        return sio
+    
+    @pytest.fixture
+    def event_stream(self):
+        """Create a mock event stream."""
+        return AsyncMock()
+    
+    @pytest.fixture
+    def handlers(self, sio, event_stream):
+        """Register the manager's handlers on the recording server."""
+        with patch.object(WebSocketManager, '_heartbeat_loop', AsyncMock()):
+            WebSocketManager(sio, subscriber_counts=AsyncMock(), event_stream=event_stream)
+            yield sio.registered
+        connected_clients.clear()
+        client_subscriptions.clear()
+    
+    @pytest.mark.asyncio
+    async def test_subscribe_and_unsubscribe(self, handlers):
+        """Test both indexes are kept and emptied entries are pruned."""
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst1"})
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst2"})
+        
+        assert connected_clients == {"inst1": {"sid1"}, "inst2": {"sid1"}}
+        assert client_subscriptions == {"sid1": {"inst1", "inst2"}}
+        
+        await handlers['unsubscribe_instance']("sid1", {'instance_id': "inst1"})
+        
+        assert connected_clients == {"inst2": {"sid1"}}
+        assert client_subscriptions == {"sid1": {"inst2"}}
+    
+    @pytest.mark.asyncio
+    async def test_disconnect_cleanup(self, handlers):
+        """Test disconnect removes only the client's own subscriptions."""
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst1"})
+        await handlers['subscribe_instance']("sid2", {'instance_id': "inst1"})
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst2"})
+        
+        await handlers['disconnect']("sid1")
+        
+        assert connected_clients == {"inst1": {"sid2"}}
+        assert client_subscriptions == {"sid2": {"inst1"}}
+    
+    @pytest.mark.asyncio
+    async def test_subscribe_with_last_seq_replays(self, handlers, sio, event_stream):
+        """Test missed events are replayed to the subscriber before replay_complete."""
+        event_stream.replay.return_value = (
+            [(5, 'task_update', {'task_id': "t1"}), (6, 'execution_step', {'task_id': "t1"})],
+            True
+        )
+        
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst1", 'last_seq': 4})
+        
+        event_stream.replay.assert_awaited_once_with("inst1", 4)
+        emitted = [(call[0][0], call[0][1]) for call in sio.emit.call_args_list]
+        assert emitted[1:] == [
+            ('task_update', {'task_id': "t1", 'seq': 5}),
+            ('execution_step', {'task_id': "t1", 'seq': 6}),
+            ('replay_complete', {'instance_id': "inst1", 'last_seq': 6, 'truncated': False}),
+        ]
+        assert all(call[1] == {'to': "sid1"} for call in sio.emit.call_args_list)
+    
+    @pytest.mark.asyncio
+    async def test_subscribe_without_last_seq_skips_replay(self, handlers, event_stream):
+        """Test a fresh subscription does not read the stream."""
+        await handlers['subscribe_instance']("sid1", {'instance_id': "inst1"})
+        event_stream.replay.assert_not_called()
+
+
+class TestSubscriberCounts:
+    """Test cases for SubscriberCounts."""
+    
+    @pytest.fixture
+    def redis_client(self):
+        """Create a mock async Redis client."""
+        client = Mock()
+        client.pipeline.return_value = Mock(execute=AsyncMock(return_value=[]))
+        client.zremrangebyscore = AsyncMock()
+        client.zrangebyscore = AsyncMock(return_value=[])
+        return client
     
     @pytest.mark.asyncio
-    async def test_connection_handler(self, setup_handlers):
-        """Test client connection handling."""
-        # This would require more complex Socket.io test client setup
-        # For now, we're testing the manager methods directly
-        pass
+    async def test_publish_local_counts(self, redis_client):
+        """Test local counts are written and empty instances removed."""
+        counts = SubscriberCounts(redis_client, replica_id="r1", ttl_seconds=30)
+        connected_clients["inst1"] = {"sid1", "sid2"}
+        try:
+            await counts.publish(["inst1", "inst2"])
+        finally:
+            del connected_clients["inst1"]
+        
+        pipe = redis_client.pipeline.return_value
+        pipe.hset.assert_called_once_with("swallowtail:ws:subscribers:r1", "inst1", 2)
+        pipe.hdel.assert_called_once_with("swallowtail:ws:subscribers:r1", "inst2")
+        pipe.expire.assert_called_once_with("swallowtail:ws:subscribers:r1", 30)
+        pipe.execute.assert_awaited_once()
     
     @pytest.mark.asyncio
-    async def test_subscribe_instance_handler(self, setup_handlers):
-        """Test instance subscription handling."""
-        # This would require Socket.io test client
-        pass
\ No newline at end of file
+    async def test_count_sums_live_replicas(self, redis_client):
+        """Test the total sums the counts of every live replica."""
+        redis_client.zrangebyscore.return_value = ["r1", "r2", "r3"]
+        redis_client.pipeline.return_value.execute.return_value = ["2", None, "5"]
+        
+        assert await SubscriberCounts(redis_client, replica_id="r1").count("inst1") == 7
+        redis_client.zremrangebyscore.assert_awaited_once()
@@ -9,6 +9,7 @@ from src.models.instance import (
     Instance, 
     InstanceTask, 
     InstanceTaskStatus,
+    InstanceTaskStep,
     TaskPriority,
     InstanceType
 )
@@ -30,11 +31,8 @@ class TestTikTokPostingFlow:
     @pytest.fixture
     def mock_db_session(self):
         """Create a mock database session."""
-        session = Mock()
-        session.query = Mock()
+        session = AsyncMock()
         session.add = Mock()
-        session.commit = Mock()
-        session.refresh = Mock()
         return session
     
     @pytest.fixture
@@ -60,6 +58,7 @@ class TestTikTokPostingFlow:
         task.status = InstanceTaskStatus.COMPLETED
         task.priority = TaskPriority.NORMAL
         task.output_format = "video"
+        task.output_media_ids = []
         task.output_data = {
             "video_url": "https://test.supabase.co/storage/v1/videos/test.mp4",
             "caption": "Check out our amazing product! #product #demo",
@@ -75,6 +74,8 @@ class TestTikTokPostingFlow:
                 "timestamp": datetime.now(timezone.utc).isoformat()
             }
         ]
+        task.step_count = len(task.execution_steps)
+        task.archived_at = None
         task.created_at = datetime.now(timezone.utc)
         task.updated_at = datetime.now(timezone.utc)
         task.processing_started_at = None
@@ -126,13 +127,18 @@ class TestTikTokPostingFlow:
         from src.api.routes.tasks import get_task_detail
         
         # Setup mock query results
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task_with_video
-        mock_db_session.query.return_value.filter.return_value.all.return_value = []
+        mock_db_session.scalar.return_value = mock_task_with_video
+        records = [
+            InstanceTaskStep(task_id=mock_task_with_video.id, seq=seq, step=step)
+            for seq, step in enumerate(mock_task_with_video.execution_steps, 1)
+        ]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
-             patch('src.api.routes.tasks.get_db', return_value=mock_db_session):
-            response = get_task_detail(
+             patch('src.api.routes.tasks.list_task_steps_async', AsyncMock(return_value=records)):
+            response = await get_task_detail(
                 task_id=mock_task_with_video.id,
+                steps_after_seq=0,
+                steps_limit=100,
                 db=mock_db_session,
                 user_id=mock_user_id
             )
@@ -166,8 +172,7 @@ class TestTikTokPostingFlow:
         )
         
         # Setup mock database queries
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task_with_video
-        mock_db_session.query.return_value.filter.return_value.first.return_value = mock_tiktok_credentials
+        mock_db_session.scalar.side_effect = [mock_task_with_video, mock_tiktok_credentials]
         
         # Mock the TikTok API calls
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
@@ -224,7 +229,7 @@ class TestTikTokPostingFlow:
         task.can_post_to_tiktok = MagicMock(return_value=False)
         task.get_video_url = MagicMock(return_value=None)
         
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = task
+        mock_db_session.scalar.return_value = task
         
         post_request = TikTokPostRequest(
             title="Test post",
@@ -260,8 +265,7 @@ class TestTikTokPostingFlow:
         )
         
         # Setup mocks - no credentials found
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = mock_task_with_video
-        mock_db_session.query.return_value.filter.return_value.first.return_value = None  # No credentials
+        mock_db_session.scalar.side_effect = [mock_task_with_video, None]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
              patch('src.api.routes.tasks.get_db', return_value=mock_db_session):
@@ -305,8 +309,7 @@ class TestTikTokPostingFlow:
         task.update_tiktok_status = MagicMock()
         
         # Setup mock queries
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = task
-        mock_db_session.query.return_value.filter.return_value.first.return_value = mock_tiktok_credentials
+        mock_db_session.scalar.side_effect = [task, mock_tiktok_credentials]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
              patch('src.api.routes.tasks.get_db', return_value=mock_db_session), \
@@ -365,8 +368,7 @@ class TestTikTokPostingFlow:
         task.update_tiktok_status = MagicMock()
         
         # Setup mock queries
-        mock_db_session.query.return_value.join.return_value.filter.return_value.first.return_value = task
-        mock_db_session.query.return_value.filter.return_value.first.return_value = mock_tiktok_credentials
+        mock_db_session.scalar.side_effect = [task, mock_tiktok_credentials]
         
         with patch('src.api.routes.tasks.get_current_user_id', return_value=mock_user_id), \
              patch('src.api.routes.tasks.get_db', return_value=mock_db_session), \
@@ -0,0 +1,140 @@
+"""Tests for cold storage of finished tasks."""
+
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, Mock, patch
+from uuid import uuid4
+
+import pytest
+
+from src.models.instance import InstanceTaskStep
+from src.tasks.archiver import (
+    ArchivedTask,
+    TaskArchiver,
+    list_task_steps_async,
+    load_task_archive,
+    pack_task_archive,
+    unpack_task_archive
+)
+
+
+def _steps(task_id, count):
+    return [
+        InstanceTaskStep(task_id=task_id, seq=seq, step={"step_id": str(seq)}, created_at=datetime(2025, 1, 1, 10, seq))
+        for seq in range(1, count + 1)
+    ]
+
+
+class TestArchivePayload:
+    """Test cases for pack_task_archive and unpack_task_archive."""
+
+    def test_round_trip(self):
+        """Test payloads and steps survive compression."""
+        task_id = uuid4()
+        fields = {"output_data": {"video": "a.mp4"}, "result_data": None, "tiktok_post_data": None, "execution_steps": []}
+
+        archived = unpack_task_archive(task_id, pack_task_archive(fields, _steps(task_id, 2)))
+
+        assert archived.fields == fields
+        assert [step.seq for step in archived.steps] == [1, 2]
+        assert archived.steps[1].step == {"step_id": "2"}
+        assert archived.steps[1].created_at == datetime(2025, 1, 1, 10, 2)
+        assert archived.steps[0].task_id == task_id
+
+    def test_steps_after(self):
+        """Test archived steps page like the steps table."""
+        archived = ArchivedTask(fields={}, steps=_steps(uuid4(), 5))
+
+        assert [step.seq for step in archived.steps_after(2, 2)] == [3, 4]
+        assert [step.seq for step in archived.steps_after(3, None)] == [4, 5]
+
+
+class TestTaskArchiver:
+    """Test cases for TaskArchiver."""
+
+    def test_no_due_tasks(self):
+        """Test nothing is written or committed when no task is due."""
+        session = Mock()
+        session.execute.return_value.all.return_value = []
+
+        assert TaskArchiver(session, archive_after=timedelta(days=30), batch_size=10).archive_batch() == 0
+        session.execute.assert_called_once()
+        session.commit.assert_not_called()
+
+    def test_archives_batch(self):
+        """Test due tasks are copied to the archive, stubbed and their steps deleted."""
+        task_id = uuid4()
+        row = SimpleNamespace(id=task_id, output_data={"a": 1}, result_data=None, tiktok_post_data=None, execution_steps=[])
+        session = Mock()
+        session.execute.side_effect = [
+            Mock(all=Mock(return_value=[row])),
+            iter(_steps(task_id, 2)),
+            None,
+            None,
+            None,
+        ]
+
+        count = TaskArchiver(session, archive_after=timedelta(days=30), batch_size=10).archive_batch()
+
+        assert count == 1
+        archive_rows = session.execute.call_args_list[2][0][1]
+        assert archive_rows[0]["task_id"] == task_id
+        archived = unpack_task_archive(task_id, archive_rows[0]["payload"])
+        assert archived.fields["output_data"] == {"a": 1}
+        assert len(archived.steps) == 2
+        session.commit.assert_called_once()
+
+    def test_disabled(self):
+        """Test a zero age turns archiving off."""
+        session = Mock()
+        assert TaskArchiver(session, archive_after=timedelta(0), batch_size=10).archive_due() == 0
+        session.execute.assert_not_called()
+
+    def test_archive_due_stops_on_short_batch(self):
+        """Test batches run until one comes back short."""
+        archiver = TaskArchiver(Mock(), archive_after=timedelta(days=1), batch_size=10)
+        with patch.object(archiver, "archive_batch", side_effect=[10, 10, 3]) as archive_batch:
+            assert archiver.archive_due() == 23
+        assert archive_batch.call_count == 3
+
+
+class TestLoadTaskArchive:
+    """Test cases for load_task_archive and list_task_steps_async."""
+
+    @pytest.mark.asyncio
+    async def test_live_task_skips_lookup(self):
+        """Test tasks that were never archived cost no query."""
+        session = AsyncMock()
+        task = Mock(archived_at=None)
+
+        assert await load_task_archive(session, task) is None
+        session.scalar.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_rehydrates_payloads(self):
+        """Test archived payloads are put back without overwriting newer values."""
+        task_id = uuid4()
+        payload = pack_task_archive({"output_data": {"video": "a.mp4"}, "tiktok_post_data": {"old": True}}, [])
+        session = AsyncMock()
+        session.scalar.return_value = payload
+        task = Mock(id=task_id, archived_at=datetime(2025, 2, 1), output_data=None, tiktok_post_data={"new": True})
+
+        with patch("src.tasks.archiver.set_committed_value") as set_value:
+            archived = await load_task_archive(session, task)
+
+        assert archived is not None
+        set_value.assert_called_once_with(task, "output_data", {"video": "a.mp4"})
+
+    @pytest.mark.asyncio
+    async def test_steps_continue_past_archive(self):
+        """Test a page spanning the archive continues from the steps table."""
+        task_id = uuid4()
+        archived = ArchivedTask(fields={}, steps=_steps(task_id, 3))
+        live = [InstanceTaskStep(task_id=task_id, seq=4, step={})]
+
+        with patch("src.tasks.archiver.list_execution_steps_async", AsyncMock(return_value=live)) as list_steps:
+            steps = await list_task_steps_async(AsyncMock(), task_id, 1, 5, archived)
+
+        assert [step.seq for step in steps] == [2, 3, 4]
+        list_steps.assert_awaited_once()
+        assert list_steps.await_args[0][2:] == (3, 3)
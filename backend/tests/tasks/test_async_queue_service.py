@@ -0,0 +1,367 @@
+"""Tests for the async task queue service."""
+
+import pytest
+from unittest.mock import AsyncMock, Mock, patch
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from uuid import uuid4
+
+from src.tasks.async_queue_service import AsyncTaskQueueService
+from src.tasks.idempotency import SubmissionInProgressError
+from src.tasks.processors.content_creation_processor import ContentCreationProcessor
+from src.tasks.processors.default_processor import DefaultTaskProcessor
+from src.models.instance import Instance, InstanceTask, InstanceTaskStatus, TaskPriority
+from src.models.instance_schemas import TaskExecutionStep, TaskSubmission, TaskUpdateRequest, TaskListFilters
+
+
+class TestAsyncTaskQueueService:
+    """Test cases for AsyncTaskQueueService."""
+    
+    @pytest.fixture
+    def mock_db_session(self):
+        """Create a mock async database session."""
+        session = AsyncMock()
+        session.add = Mock()
+        session.expunge = Mock()
+        return session
+    
+    @pytest.fixture
+    def mock_instance(self):
+        """Create a mock instance."""
+        instance = Mock(spec=Instance)
+        instance.id = uuid4()
+        instance.configuration = {"max_concurrent_tasks": 2}
+        return instance
+    
+    @pytest.fixture
+    def mock_task(self, mock_instance):
+        """Create a mock task."""
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        task.instance_id = mock_instance.id
+        task.description = "Test task description"
+        task.status = InstanceTaskStatus.SUBMITTED
+        task.priority = TaskPriority.NORMAL
+        task.recurring_pattern = None
+        task.retry_count = 0
+        return task
+    
+    @pytest.fixture
+    def service(self, mock_db_session):
+        """Create an AsyncTaskQueueService instance."""
+        limiter = Mock()
+        limiter.acquire_many.side_effect = lambda dispatches: [True] * len(dispatches)
+        deduplicator = Mock()
+        deduplicator.reserve.return_value = None
+        service = AsyncTaskQueueService(
+            mock_db_session, scheduler=Mock(), limiter=limiter, dispatcher=Mock(), deduplicator=deduplicator
+        )
+        AsyncTaskQueueService.register_processor('default', DefaultTaskProcessor)
+        AsyncTaskQueueService.register_processor('content_creation', ContentCreationProcessor)
+        return service
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_queues_immediately(self, service, mock_db_session, mock_instance):
+        """Test a task without a schedule is committed and queued."""
+        mock_db_session.get.return_value = mock_instance
+        
+        with patch.object(service, '_queue_task', new_callable=AsyncMock) as mock_queue:
+            task = await service.submit_task(mock_instance.id, TaskSubmission(description="Write a post"))
+        
+        assert isinstance(task, InstanceTask)
+        assert task.status == InstanceTaskStatus.SUBMITTED
+        mock_db_session.add.assert_called_once_with(task)
+        mock_db_session.commit.assert_awaited()
+        mock_queue.assert_awaited_once_with(task, mock_instance.configuration)
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_instance_not_found(self, service, mock_db_session):
+        """Test submission to a missing instance."""
+        mock_db_session.get.return_value = None
+        
+        with pytest.raises(ValueError, match="not found"):
+            await service.submit_task(uuid4(), TaskSubmission(description="Write a post"))
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_scheduled(self, service, mock_db_session, mock_instance):
+        """Test a future task goes to the delayed scheduler instead of the queue."""
+        mock_db_session.get.return_value = mock_instance
+        future_time = datetime.now(timezone.utc) + timedelta(hours=2)
+        
+        with patch.object(service, '_queue_task', new_callable=AsyncMock) as mock_queue:
+            await service.submit_task(
+                mock_instance.id, TaskSubmission(description="Scheduled post", scheduled_for=future_time)
+            )
+        
+        mock_queue.assert_not_awaited()
+        due_times = service.scheduler.schedule_many.call_args[0][0]
+        assert list(due_times.values()) == [future_time]
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_idempotency_key(self, service, mock_db_session, mock_instance):
+        """Test a new idempotency key reserves, creates, then confirms."""
+        mock_db_session.get.return_value = mock_instance
+        service.deduplicator.keys_for.return_value = {"key": 3600}
+        
+        with patch.object(service, '_queue_task', new_callable=AsyncMock):
+            task = await service.submit_task(mock_instance.id, TaskSubmission(description="Post"), idempotency_key="abc")
+        
+        assert service.deduplicator.keys_for.call_args[0][2] == "abc"
+        reserved_id = service.deduplicator.reserve.call_args[0][1]
+        assert task.id == reserved_id
+        service.deduplicator.confirm.assert_called_once_with({"key": 3600}, reserved_id)
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_duplicate_returns_existing(self, service, mock_db_session, mock_instance, mock_task):
+        """Test a replayed submission returns the original task."""
+        mock_db_session.get.return_value = mock_instance
+        mock_db_session.scalar.return_value = mock_task
+        service.deduplicator.keys_for.return_value = {"key": 3600}
+        service.deduplicator.reserve.return_value = str(mock_task.id)
+        
+        with patch.object(service, '_queue_task', new_callable=AsyncMock) as mock_queue:
+            task = await service.submit_task(mock_instance.id, TaskSubmission(description="Post"), idempotency_key="abc")
+        
+        assert task is mock_task
+        mock_db_session.add.assert_not_called()
+        mock_queue.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_duplicate_in_progress(self, service, mock_db_session, mock_instance):
+        """Test a retry racing the original submission is rejected."""
+        mock_db_session.get.return_value = mock_instance
+        service.deduplicator.keys_for.return_value = {"key": 3600}
+        service.deduplicator.reserve.return_value = f"pending:{uuid4()}"
+        
+        with pytest.raises(SubmissionInProgressError):
+            await service.submit_task(mock_instance.id, TaskSubmission(description="Post"), idempotency_key="abc")
+        mock_db_session.add.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_submit_task_failure_releases_reservation(self, service, mock_db_session, mock_instance):
+        """Test a failed submission frees its dedup keys for the retry."""
+        mock_db_session.get.return_value = mock_instance
+        mock_db_session.commit.side_effect = RuntimeError("db down")
+        service.deduplicator.keys_for.return_value = {"key": 3600}
+        
+        with pytest.raises(RuntimeError):
+            await service.submit_task(mock_instance.id, TaskSubmission(description="Post"), idempotency_key="abc")
+        service.deduplicator.release.assert_called_once()
+        service.deduplicator.confirm.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_submit_tasks_bulk(self, service, mock_db_session, mock_instance):
+        """Test bulk submission uses one insert, one update and one dispatch."""
+        mock_instance.configuration = {"max_concurrent_tasks": 3, "fair_share_weight": 2}
+        mock_db_session.get.return_value = mock_instance
+        mock_db_session.scalars.side_effect = lambda stmt, rows: [SimpleNamespace(**row) for row in rows]
+        
+        future_time = datetime.now(timezone.utc) + timedelta(hours=2)
+        submissions = [
+            TaskSubmission(description="Create a social media post", priority=TaskPriority.URGENT),
+            TaskSubmission(description="Random task"),
+            TaskSubmission(description="Scheduled post", scheduled_for=future_time),
+        ]
+        
+        tasks = await service.submit_tasks_bulk(mock_instance.id, submissions)
+        
+        assert len(tasks) == 3
+        assert mock_db_session.scalars.await_count == 1
+        assert len(mock_db_session.scalars.await_args[0][1]) == 3
+        assert mock_db_session.execute.await_count == 1
+        mock_db_session.commit.assert_awaited_once()
+        
+        # Only the two due tasks are dispatched, together
+        payloads = service.dispatcher.enqueue_many.call_args[0][0]
+        assert [payload['queue'] for payload in payloads] == ['agents', 'default']
+        assert all(payload['weight'] == 2.0 for payload in payloads)
+        service.dispatcher.pump.assert_called_once()
+        assert tasks[0].parsed_intent['intent_type'] == 'content_creation'
+        assert 'parsed_intent' not in vars(tasks[2])
+    
+    @pytest.mark.asyncio
+    async def test_submit_tasks_bulk_instance_not_found(self, service, mock_db_session):
+        """Test bulk submission with invalid instance."""
+        mock_db_session.get.return_value = None
+        
+        with pytest.raises(ValueError, match="Instance .* not found"):
+            await service.submit_tasks_bulk(uuid4(), [TaskSubmission(description="Test")])
+        mock_db_session.scalars.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_queue_task_with_processor(self, service, mock_db_session, mock_task, mock_instance):
+        """Test a matched processor is recorded and handed to the dispatcher."""
+        mock_task.description = "Create social media content"
+        mock_task.priority = TaskPriority.URGENT
+        
+        await service._queue_task(mock_task, mock_instance.configuration)
+        
+        assert mock_task.status == InstanceTaskStatus.QUEUED
+        assert mock_task.parsed_intent['intent_type'] == 'content_creation'
+        payload, = service.dispatcher.enqueue_many.call_args[0][0]
+        assert payload['task_id'] == str(mock_task.id)
+        assert payload['processor_path'].endswith('ContentCreationProcessor')
+        assert payload['queue'] == 'agents'  # High priority queue
+    
+    @pytest.mark.asyncio
+    async def test_queue_task_at_concurrency_limit(self, service, mock_db_session, mock_task, mock_instance):
+        """Test tasks over the instance limit are held instead of published."""
+        service.limiter.acquire_many.side_effect = None
+        service.limiter.acquire_many.return_value = [False]
+        
+        await service._queue_task(mock_task, mock_instance.configuration)
+        
+        assert mock_task.status == InstanceTaskStatus.QUEUED
+        (payload, limit), = service.limiter.acquire_many.call_args[0][0]
+        assert payload["task_id"] == str(mock_task.id)
+        assert limit == 2
+        service.dispatcher.enqueue_many.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_queue_task_no_processor(self, service, mock_db_session, mock_task, mock_instance):
+        """Test a task without a processor is failed and not published."""
+        AsyncTaskQueueService._processor_registry = {}
+        
+        await service._queue_task(mock_task, mock_instance.configuration)
+        
+        assert mock_task.status == InstanceTaskStatus.FAILED
+        assert "No processor available" in mock_task.error_message
+        mock_db_session.commit.assert_awaited_once()
+        service.dispatcher.enqueue_many.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_queue_task_publishes_after_commit(self, service, mock_db_session, mock_task, mock_instance):
+        """Test the queued status is committed before the task is published."""
+        calls = []
+        mock_db_session.commit.side_effect = lambda: calls.append('commit')
+        service.dispatcher.enqueue_many.side_effect = lambda payloads: calls.append('publish')
+        
+        with patch.object(service, '_resolve_processor', return_value=('default', DefaultTaskProcessor)):
+            await service._queue_task(mock_task, mock_instance.configuration)
+        
+        assert mock_task.status == InstanceTaskStatus.QUEUED
+        assert calls == ['commit', 'publish']
+    
+    @pytest.mark.asyncio
+    async def test_get_task_status(self, service, mock_db_session, mock_task):
+        """Test the status combines the task, its steps and its Celery state."""
+        mock_task.status = InstanceTaskStatus.IN_PROGRESS
+        mock_task.step_count = 250
+        mock_db_session.get.return_value = mock_task
+        step = Mock(step={"step_id": "s1", "action": "Research"})
+        
+        with patch('src.tasks.async_queue_service.load_task_archive', new_callable=AsyncMock, return_value=None), \
+                patch('src.tasks.async_queue_service.list_task_steps_async', new_callable=AsyncMock, return_value=[step]) as mock_list, \
+                patch('src.tasks.queue_service.AsyncResult') as mock_async_result:
+            mock_async_result.return_value.state = "PENDING"
+            mock_async_result.return_value.info = {"progress": 50}
+            status = await service.get_task_status(mock_task.id)
+        
+        # Only the newest page of steps is loaded
+        mock_list.assert_awaited_once_with(mock_db_session, mock_task.id, 150, 100, None)
+        assert status['step_count'] == 250
+        assert status['task_id'] == mock_task.id
+        assert status['status'] == InstanceTaskStatus.IN_PROGRESS
+        assert status['celery_status'] == {"state": "PENDING", "info": {"progress": 50}}
+        assert status['execution_steps'] == [{"step_id": "s1", "action": "Research"}]
+    
+    @pytest.mark.asyncio
+    async def test_get_task_status_archived(self, service, mock_db_session, mock_task):
+        """Test an archived task's status includes the steps from its archive."""
+        mock_task.status = InstanceTaskStatus.COMPLETED
+        mock_task.step_count = 2
+        mock_db_session.get.return_value = mock_task
+        archived = Mock()
+        archived.steps_after.return_value = [Mock(seq=1, step={"step_id": "s1"}), Mock(seq=2, step={"step_id": "s2"})]
+        
+        with patch('src.tasks.async_queue_service.load_task_archive', new_callable=AsyncMock, return_value=archived):
+            status = await service.get_task_status(mock_task.id)
+        
+        archived.steps_after.assert_called_once_with(0, 100)
+        assert status['execution_steps'] == [{"step_id": "s1"}, {"step_id": "s2"}]
+        assert status['celery_status'] is None
+    
+    @pytest.mark.asyncio
+    async def test_update_task_records_steps(self, service, mock_db_session, mock_task):
+        """Test an update's execution step is appended to the task's steps."""
+        mock_db_session.get.return_value = mock_task
+        step = TaskExecutionStep(step_id="1", agent="Writer", action="Draft", status="completed")
+        
+        with patch('src.tasks.async_queue_service.append_execution_steps_async', new_callable=AsyncMock) as mock_append:
+            await service.update_task(mock_task.id, TaskUpdateRequest(progress_percentage=40, execution_step=step))
+        
+        assert mock_task.progress_percentage == 40
+        mock_append.assert_awaited_once_with(mock_db_session, mock_task.id, [step.model_dump(mode="json")])
+        mock_db_session.commit.assert_awaited_once()
+    
+    @pytest.mark.asyncio
+    async def test_cancel_finished_task(self, service, mock_db_session, mock_task):
+        """Test finished tasks cannot be cancelled."""
+        mock_task.status = InstanceTaskStatus.COMPLETED
+        mock_db_session.get.return_value = mock_task
+        
+        assert await service.cancel_task(mock_task.id) is False
+        mock_db_session.commit.assert_not_awaited()
+    
+    @pytest.mark.asyncio
+    async def test_cancel_queued_task_releases_slot(self, service, mock_db_session, mock_task):
+        """Test cancelling a queued task revokes it and frees its slot."""
+        mock_task.status = InstanceTaskStatus.QUEUED
+        mock_db_session.get.return_value = mock_task
+        
+        with patch.object(service, '_revoke') as mock_revoke:
+            assert await service.cancel_task(mock_task.id) is True
+        
+        assert mock_task.status == InstanceTaskStatus.CANCELLED
+        mock_revoke.assert_called_once_with(mock_task.id)
+        service.limiter.release_and_dispatch.assert_called_once_with(str(mock_task.instance_id), str(mock_task.id))
+    
+    @pytest.mark.asyncio
+    async def test_cancel_series_cancels_pending_occurrences(self, service, mock_db_session, mock_task):
+        """Test cancelling a recurring series also cancels its unstarted occurrences."""
+        mock_task.recurring_pattern = {"rrule": "FREQ=DAILY"}
+        mock_db_session.get.return_value = mock_task
+        
+        assert await service.cancel_task(mock_task.id) is True
+        
+        statement = mock_db_session.execute.await_args[0][0]
+        assert "instance_tasks.parent_task_id" in str(statement)
+        service.limiter.release_and_dispatch.assert_not_called()
+    
+    @pytest.mark.asyncio
+    async def test_retry_task(self, service, mock_db_session, mock_task, mock_instance):
+        """Test a failed task is reset and queued again."""
+        mock_task.status = InstanceTaskStatus.FAILED
+        mock_task.retry_count = 1
+        mock_db_session.get.return_value = mock_task
+        mock_db_session.scalar.return_value = mock_instance.configuration
+        
+        with patch.object(service, '_queue_task', new_callable=AsyncMock) as mock_queue:
+            await service.retry_task(mock_task.id)
+        
+        assert mock_task.status == InstanceTaskStatus.SUBMITTED
+        assert mock_task.error_message is None
+        assert mock_task.retry_count == 2
+        mock_queue.assert_awaited_once_with(mock_task, mock_instance.configuration)
+    
+    @pytest.mark.asyncio
+    async def test_retry_requires_failed_task(self, service, mock_db_session, mock_task):
+        """Test only failed tasks can be retried."""
+        mock_db_session.get.return_value = mock_task
+        
+        with pytest.raises(ValueError):
+            await service.retry_task(mock_task.id)
+    
+    @pytest.mark.asyncio
+    async def test_list_tasks_filters(self, service, mock_db_session, mock_instance, mock_task):
+        """Test listing builds one filtered, paginated SELECT."""
+        mock_db_session.scalars.return_value = [mock_task]
+        filters = TaskListFilters(status=InstanceTaskStatus.FAILED, limit=5)
+        
+        tasks = await service.list_tasks(mock_instance.id, filters)
+        
+        assert tasks == [mock_task]
+        statement = mock_db_session.scalars.await_args[0][0]
+        sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+        assert "instance_tasks.status = 'FAILED'" in sql
+        assert "LIMIT 5" in sql
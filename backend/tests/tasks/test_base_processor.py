@@ -37,6 +37,7 @@ class TestBaseTaskProcessor:
         """Create a mock database session."""
         session = Mock()
         session.query.return_value.filter_by.return_value.first.return_value = mock_task
+        session.execute.return_value.scalar_one.return_value = 1
         return session
     
     def test_context_manager_initialization(self, mock_db_session, mock_task):
@@ -78,27 +79,30 @@ class TestBaseTaskProcessor:
                 mock_db_session.commit.assert_called()
     
     def test_update_progress(self, mock_db_session, mock_task):
-        """Test progress update functionality."""
+        """Test progress updates are buffered and coalesced."""
         with patch('src.tasks.base_processor.get_session', return_value=iter([mock_db_session])):
             with ConcreteTaskProcessor(mock_task.id, mock_task.instance_id) as processor:
-                # Test basic progress update
                 processor.update_progress(50)
-                assert mock_task.progress_percentage == 50
-                
-                # Test progress with message
                 processor.update_progress(75, "Processing data")
-                assert mock_task.progress_percentage == 75
-                assert len(mock_task.execution_steps) == 1
-                assert mock_task.execution_steps[0]['action'] == "Processing data"
+                
+                # Nothing written until a threshold is reached
+                mock_db_session.execute.assert_not_called()
+                mock_db_session.commit.assert_not_called()
+                assert processor.progress_buffer.progress == 75
+                assert len(processor.progress_buffer.steps) == 1
+                assert processor.progress_buffer.steps[0]['action'] == "Processing data"
                 
                 # Test progress bounds
                 processor.update_progress(150)
-                assert mock_task.progress_percentage == 100
+                assert processor.progress_buffer.progress == 100
                 
                 processor.update_progress(-10)
-                assert mock_task.progress_percentage == 0
-                
-                mock_db_session.commit.assert_called()
+                assert processor.progress_buffer.progress == 0
+            
+            # Flushed on exit: one UPDATE for progress and seq, one INSERT for steps
+            assert mock_db_session.execute.call_count == 2
+            mock_db_session.commit.assert_called_once()
+            assert not processor.progress_buffer.pending
     
     def test_add_execution_step(self, mock_db_session, mock_task):
         """Test adding execution steps."""
@@ -116,10 +120,47 @@ class TestBaseTaskProcessor:
                 
                 processor.add_execution_step(step)
                 
-                assert len(mock_task.execution_steps) == 1
-                assert mock_task.execution_steps[0]['step_id'] == "test_step"
-                assert mock_task.execution_steps[0]['agent'] == "TestAgent"
-                mock_db_session.commit.assert_called()
+                buffered = processor.progress_buffer.steps
+                assert len(buffered) == 1
+                assert buffered[0]['step_id'] == "test_step"
+                assert buffered[0]['agent'] == "TestAgent"
+                assert isinstance(buffered[0]['started_at'], str)
+                mock_db_session.commit.assert_not_called()
+    
+    def test_execution_steps_flush_on_batch_size(self, mock_db_session, mock_task):
+        """Test a full batch of steps is written in one round of statements."""
+        with patch('src.tasks.base_processor.get_session', return_value=iter([mock_db_session])):
+            with ConcreteTaskProcessor(mock_task.id, mock_task.instance_id) as processor:
+                processor.progress_buffer.max_steps = 3
+                for i in range(3):
+                    processor.update_progress(i * 10, f"Step {i}")
+                
+                assert mock_db_session.execute.call_count == 2
+                mock_db_session.commit.assert_called_once()
+                assert not processor.progress_buffer.pending
+    
+    def test_update_status_writes_buffer_through(self, mock_db_session, mock_task):
+        """Test a status change writes buffered progress in the same commit."""
+        with patch('src.tasks.base_processor.get_session', return_value=iter([mock_db_session])):
+            with ConcreteTaskProcessor(mock_task.id, mock_task.instance_id) as processor:
+                processor.update_progress(40, "Halfway")
+                processor.update_status(InstanceTaskStatus.COMPLETED)
+                
+                assert mock_db_session.execute.call_count == 2
+                mock_db_session.commit.assert_called_once()
+                assert not processor.progress_buffer.pending
+    
+    def test_buffered_steps_kept_on_error(self, mock_db_session, mock_task):
+        """Test buffered steps are written after the rollback of a failed task."""
+        with patch('src.tasks.base_processor.get_session', return_value=iter([mock_db_session])):
+            with pytest.raises(Exception, match="boom"):
+                with ConcreteTaskProcessor(mock_task.id, mock_task.instance_id) as processor:
+                    processor.update_progress(10, "Started")
+                    raise Exception("boom")
+            
+            mock_db_session.rollback.assert_called()
+            assert mock_db_session.execute.call_count == 2
+            mock_db_session.commit.assert_called_once()
     
     def test_set_output(self, mock_db_session, mock_task):
         """Test setting task output."""
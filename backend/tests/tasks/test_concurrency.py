@@ -0,0 +1,97 @@
+"""Tests for the per-instance concurrency limiter."""
+
+import json
+import pytest
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from src.tasks.concurrency import (
+    DEFAULT_MAX_CONCURRENT_TASKS, InstanceConcurrencyLimiter,
+    build_dispatch_payload, get_concurrency_limit, get_concurrency_limiter
+)
+
+
+class TestInstanceConcurrencyLimiter:
+    """Test cases for InstanceConcurrencyLimiter."""
+
+    @pytest.fixture
+    def mock_redis(self):
+        """Create a mock Redis client with separate acquire/release scripts."""
+        client = Mock()
+        client.register_script.side_effect = lambda script: Mock()
+        return client
+
+    @pytest.fixture
+    def limiter(self, mock_redis):
+        """Create a limiter backed by the mock client."""
+        return InstanceConcurrencyLimiter(redis_client=mock_redis, lease_seconds=60, dispatcher=Mock())
+
+    @pytest.fixture
+    def payload(self):
+        """Create a dispatch payload."""
+        return build_dispatch_payload(uuid4(), uuid4(), "src.tasks.processors.Default", "default")
+
+    def test_get_concurrency_limit(self):
+        """Test the limit is read from the instance configuration."""
+        assert get_concurrency_limit({"max_concurrent_tasks": 5}) == 5
+        assert get_concurrency_limit({}) == DEFAULT_MAX_CONCURRENT_TASKS
+        assert get_concurrency_limit(None) == DEFAULT_MAX_CONCURRENT_TASKS
+        assert get_concurrency_limit({"max_concurrent_tasks": "bad"}) == DEFAULT_MAX_CONCURRENT_TASKS
+        assert get_concurrency_limit({"max_concurrent_tasks": 0}) == 1
+
+    def test_acquire_many_single_round_trip(self, limiter, mock_redis, payload):
+        """Test several acquisitions share one pipeline."""
+        pipe = mock_redis.pipeline.return_value
+        pipe.execute.return_value = [1, 0]
+
+        admitted = limiter.acquire_many([(payload, 3), (payload, 3)])
+
+        assert admitted == [True, False]
+        assert limiter._acquire_script.call_count == 2
+        call = limiter._acquire_script.call_args
+        assert call.kwargs["client"] is pipe
+        assert call.kwargs["keys"][0] == f"swallowtail:concurrency:{payload['instance_id']}:active"
+        assert json.loads(call.kwargs["args"][4]) == payload
+        pipe.execute.assert_called_once()
+
+    def test_acquire_many_empty(self, limiter, mock_redis):
+        """Test nothing is sent to Redis without dispatches."""
+        assert limiter.acquire_many([]) == []
+        mock_redis.pipeline.assert_not_called()
+
+    def test_release_and_dispatch_hands_off_held_tasks(self, limiter, payload):
+        """Test released pending tasks go to the fair-share dispatcher."""
+        limiter._release_script.return_value = [json.dumps(payload)]
+
+        count = limiter.release_and_dispatch(payload["instance_id"], "finished-task")
+
+        assert count == 1
+        assert limiter._release_script.call_args.kwargs["args"][0] == "finished-task"
+        limiter.dispatcher.enqueue_many.assert_called_once_with([payload])
+        limiter.dispatcher.pump.assert_called_once()
+
+    def test_reclaim_expired_scans_pending_lanes(self, limiter, mock_redis):
+        """Test every instance with a pending lane is pumped."""
+        instance_id = str(uuid4())
+        mock_redis.scan_iter.return_value = [f"swallowtail:concurrency:{instance_id}:pending"]
+        limiter._release_script.return_value = []
+
+        assert limiter.reclaim_expired() == 0
+        keys = limiter._release_script.call_args.kwargs["keys"]
+        assert keys[1] == f"swallowtail:concurrency:{instance_id}:pending"
+        assert limiter._release_script.call_args.kwargs["args"][0] == ''
+
+    def test_held_task_ids(self, limiter, mock_redis, payload):
+        """Test the tasks waiting in every pending lane are listed."""
+        mock_redis.scan_iter.return_value = [f"swallowtail:concurrency:{payload['instance_id']}:pending"]
+        mock_redis.lrange.return_value = [json.dumps(payload)]
+
+        assert limiter.held_task_ids() == {payload["task_id"]}
+
+    def test_limiter_shared_per_process(self):
+        """Test workers reuse one limiter instead of reconnecting per task."""
+        with patch('src.tasks.concurrency._limiter', None), \
+                patch('src.tasks.concurrency.InstanceConcurrencyLimiter') as mock_limiter_class:
+            assert get_concurrency_limiter() is get_concurrency_limiter()
+
+        mock_limiter_class.assert_called_once_with()
@@ -0,0 +1,63 @@
+"""Tests for the Redis delayed task scheduler."""
+
+import pytest
+from unittest.mock import Mock
+from datetime import datetime, timezone, timedelta
+from uuid import uuid4
+
+from src.tasks.delayed_scheduler import DelayedTaskScheduler
+
+
+class TestDelayedTaskScheduler:
+    """Test cases for DelayedTaskScheduler."""
+    
+    @pytest.fixture
+    def mock_redis(self):
+        """Create a mock Redis client."""
+        return Mock()
+    
+    @pytest.fixture
+    def scheduler(self, mock_redis):
+        """Create a scheduler backed by the mock client."""
+        return DelayedTaskScheduler(redis_client=mock_redis, key="test:due")
+    
+    def test_schedule_many_single_zadd(self, scheduler, mock_redis):
+        """Test several tasks are scheduled with one ZADD scored by due time."""
+        due = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        task_ids = [uuid4(), uuid4()]
+        
+        scheduler.schedule_many({task_id: due for task_id in task_ids})
+        
+        mock_redis.zadd.assert_called_once()
+        key, mapping = mock_redis.zadd.call_args[0]
+        assert key == "test:due"
+        assert mapping == {str(task_id): due.timestamp() for task_id in task_ids}
+    
+    def test_naive_datetimes_treated_as_utc(self, scheduler, mock_redis):
+        """Test naive due times are scored as UTC."""
+        scheduler.schedule(uuid4(), datetime(2030, 1, 1))
+        
+        score = list(mock_redis.zadd.call_args[0][1].values())[0]
+        assert score == datetime(2030, 1, 1, tzinfo=timezone.utc).timestamp()
+    
+    def test_pop_due_uses_atomic_script(self, scheduler, mock_redis):
+        """Test due tasks are popped through the Lua script."""
+        task_id = uuid4()
+        script = mock_redis.register_script.return_value
+        script.return_value = [str(task_id)]
+        now = datetime.now(timezone.utc)
+        
+        popped = scheduler.pop_due(now=now, limit=10)
+        
+        assert popped == [task_id]
+        script.assert_called_once_with(keys=["test:due"], args=[now.timestamp(), 10])
+    
+    def test_seconds_until_next(self, scheduler, mock_redis):
+        """Test the wait time is derived from the earliest member."""
+        now = datetime.now(timezone.utc)
+        mock_redis.zrange.return_value = [("task", (now + timedelta(seconds=2)).timestamp())]
+        
+        assert scheduler.seconds_until_next(now=now) == pytest.approx(2.0)
+        
+        mock_redis.zrange.return_value = []
+        assert scheduler.seconds_until_next(now=now) is None
@@ -0,0 +1,77 @@
+"""Tests for execution step storage."""
+
+from datetime import datetime
+from unittest.mock import Mock
+from uuid import uuid4
+
+from src.models.instance import InstanceTaskStep
+from src.tasks.execution_steps import append_execution_steps, step_to_log
+
+
+class TestAppendExecutionSteps:
+    """Test cases for append_execution_steps."""
+
+    def test_numbers_batch_after_reserved_seq(self):
+        """Test a batch gets the block of seq numbers ending at step_count."""
+        session = Mock()
+        session.execute.return_value.scalar_one.return_value = 7
+        task_id = uuid4()
+
+        append_execution_steps(session, task_id, [{"step_id": "a"}, {"step_id": "b"}], progress=40)
+
+        assert session.execute.call_count == 2
+        rows = session.execute.call_args_list[1][0][1]
+        assert rows == [
+            {"task_id": task_id, "seq": 6, "step": {"step_id": "a"}},
+            {"task_id": task_id, "seq": 7, "step": {"step_id": "b"}},
+        ]
+
+    def test_progress_only(self):
+        """Test progress without steps is a single UPDATE."""
+        session = Mock()
+        append_execution_steps(session, uuid4(), [], progress=10)
+        session.execute.assert_called_once()
+
+    def test_nothing_to_write(self):
+        """Test an empty call issues no statements."""
+        session = Mock()
+        append_execution_steps(session, uuid4(), [])
+        session.execute.assert_not_called()
+
+
+class TestStepToLog:
+    """Test cases for step_to_log."""
+
+    def test_maps_step_fields(self):
+        """Test step status and output map onto the log entry."""
+        record = InstanceTaskStep(
+            seq=3,
+            step={
+                "agent": "Researcher",
+                "action": "Search",
+                "status": "completed",
+                "output": {"message": "Found 5 results"},
+                "started_at": "2025-01-01T10:00:00+00:00",
+            },
+            created_at=datetime(2025, 1, 1, 10, 0, 5)
+        )
+
+        log = step_to_log(record, datetime(2025, 1, 1))
+
+        assert log.seq == 3
+        assert log.agent_name == "Researcher"
+        assert log.status == "success"
+        assert log.message == "Found 5 results"
+        assert log.timestamp.hour == 10
+
+    def test_defaults_for_sparse_step(self):
+        """Test legacy steps without optional keys still convert."""
+        record = InstanceTaskStep(seq=1, step={"status": "in_progress"})
+        default = datetime(2025, 1, 1)
+
+        log = step_to_log(record, default)
+
+        assert log.status == "info"
+        assert log.agent_name == "System"
+        assert log.timestamp == default
+        assert log.details is None
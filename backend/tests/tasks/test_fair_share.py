@@ -0,0 +1,251 @@
+"""Tests for the weighted fair-share dispatcher."""
+
+import json
+import pytest
+from collections import defaultdict
+from fnmatch import fnmatch
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from src.tasks.concurrency import build_dispatch_payload
+from src.tasks.fair_share import (
+    _ENQUEUE_SCRIPT, _RESTORE_SCRIPT, _RETIRE_SCRIPT, FairShareDispatcher, default_in_flight_lease,
+    get_fair_share_weight
+)
+
+
+class InMemoryRedis:
+    """Just enough of a Redis client to run the dispatcher's round-robin."""
+
+    def __init__(self):
+        self.lists = defaultdict(list)
+        self.sets = defaultdict(set)
+        self.hashes = defaultdict(dict)
+        self.zsets = defaultdict(dict)
+
+    # Scripts are emulated in Python
+    def register_script(self, script):
+        handler = {_ENQUEUE_SCRIPT: self._enqueue, _RESTORE_SCRIPT: self._restore, _RETIRE_SCRIPT: self._retire}[script]
+        return lambda keys, args, client=None: handler(keys, args)
+
+    def _enqueue(self, keys, args):
+        self.lists[keys[0]].append(args[0])
+        return self._join_ring(keys, args)
+
+    def _restore(self, keys, args):
+        self.lists[keys[0]].insert(0, args[0])
+        return self._join_ring(keys, args)
+
+    def _join_ring(self, keys, args):
+        if args[1] not in self.sets[keys[1]]:
+            self.sets[keys[1]].add(args[1])
+            self.lists[keys[2]].append(args[1])
+        return 1
+
+    def _retire(self, keys, args):
+        if self.lists[keys[0]]:
+            return 0
+        self.lists[keys[2]].remove(args[0])
+        self.sets[keys[1]].discard(args[0])
+        self.hashes[keys[3]].pop(args[0], None)
+        return 1
+
+    def pipeline(self, transaction=True):
+        results = []
+        pipe = Mock()
+        pipe.execute.side_effect = lambda: list(results)
+        for name in ("hset", "zadd", "lpush", "ltrim", "zrem", "llen", "lrem"):
+            method = getattr(self, name)
+            setattr(pipe, name, lambda *args, method=method: results.append(method(*args)))
+        return pipe
+
+    def lock(self, name, timeout=None, blocking_timeout=None):
+        return Mock()
+
+    def hset(self, key, field, value):
+        self.hashes[key][field] = str(value)
+
+    def hget(self, key, field):
+        return self.hashes[key].get(field)
+
+    def hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def llen(self, key):
+        return len(self.lists[key])
+
+    def lindex(self, key, index):
+        items = self.lists[key]
+        return items[index] if items else None
+
+    def lrem(self, key, count, value):
+        if value in self.lists[key]:
+            self.lists[key].remove(value)
+
+    def lpop(self, key):
+        items = self.lists[key]
+        return items.pop(0) if items else None
+
+    def lpush(self, key, value):
+        self.lists[key].insert(0, str(value))
+
+    def ltrim(self, key, start, end):
+        self.lists[key] = self.lists[key][start:end + 1]
+
+    def lrange(self, key, start, end):
+        return list(self.lists[key])
+
+    def lmove(self, source, destination, src_side, dest_side):
+        if not self.lists[source]:
+            return None
+        item = self.lists[source].pop(0)
+        self.lists[destination].append(item)
+        return item
+
+    def scan_iter(self, match):
+        return [key for key, items in list(self.lists.items()) if items and fnmatch(key, match)]
+
+    def zrange(self, key, start, end):
+        return list(self.zsets[key])
+
+    def zadd(self, key, mapping):
+        self.zsets[key].update(mapping)
+
+    def zrem(self, key, member):
+        self.zsets[key].pop(member, None)
+
+    def zcard(self, key):
+        return len(self.zsets[key])
+
+    def zremrangebyscore(self, key, low, high):
+        for member, score in list(self.zsets[key].items()):
+            if score <= high:
+                del self.zsets[key][member]
+
+
+class TestFairShareDispatcher:
+    """Test cases for FairShareDispatcher."""
+
+    @pytest.fixture
+    def fake_redis(self):
+        """Create the in-memory Redis."""
+        return InMemoryRedis()
+
+    @pytest.fixture
+    def dispatcher(self, fake_redis):
+        """Create a dispatcher with room for four in-flight tasks per queue."""
+        return FairShareDispatcher(redis_client=fake_redis, in_flight=4, lease_seconds=60)
+
+    def _payloads(self, instance_id, count, weight=1.0):
+        """Build dispatch payloads for one instance."""
+        return [
+            build_dispatch_payload(uuid4(), instance_id, "src.tasks.processors.Default", "default", weight)
+            for _ in range(count)
+        ]
+
+    def test_get_fair_share_weight(self):
+        """Test the weight is read from the instance configuration."""
+        assert get_fair_share_weight({"fair_share_weight": 3}) == 3.0
+        assert get_fair_share_weight({}) == 1.0
+        assert get_fair_share_weight({"fair_share_weight": 0}) == 0.1
+        assert get_fair_share_weight({"fair_share_weight": "x"}) == 1.0
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_burst_does_not_starve_other_instances(self, mock_celery, dispatcher):
+        """Test a large backlog from one instance is interleaved with others."""
+        busy, quiet = uuid4(), uuid4()
+        dispatcher.enqueue_many(self._payloads(busy, 50))
+        dispatcher.enqueue_many(self._payloads(quiet, 2))
+
+        assert dispatcher.pump() == 4
+
+        published = [call[1]["args"][1] for call in mock_celery.send_task.call_args_list]
+        assert published == [str(busy), str(quiet), str(busy), str(quiet)]
+        assert dispatcher.backlog(str(busy))["default"] == 48
+        assert dispatcher.backlog(str(quiet))["default"] == 0
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_weights_scale_share(self, mock_celery, dispatcher):
+        """Test an instance with weight 3 gets three tasks per round."""
+        heavy, light = uuid4(), uuid4()
+        dispatcher.enqueue_many(self._payloads(heavy, 10, weight=3))
+        dispatcher.enqueue_many(self._payloads(light, 10))
+
+        dispatcher.pump()
+
+        published = [call[1]["args"][1] for call in mock_celery.send_task.call_args_list]
+        assert published == [str(heavy)] * 3 + [str(light)]
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_complete_frees_in_flight_budget(self, mock_celery, dispatcher):
+        """Test finishing a task lets the next one be published."""
+        payloads = self._payloads(uuid4(), 5)
+        dispatcher.enqueue_many(payloads)
+
+        assert dispatcher.pump() == 4
+        assert dispatcher.pump() == 0
+
+        dispatcher.complete(payloads[0]["task_id"])
+        assert dispatcher.pump() == 1
+        assert mock_celery.send_task.call_args[1]["task_id"] == f"task_{payloads[4]['task_id']}"
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_wait_time_percentiles(self, mock_celery, dispatcher):
+        """Test wait times are recorded per instance on publish."""
+        instance_id = uuid4()
+        payloads = self._payloads(instance_id, 2)
+        for payload in payloads:
+            payload["queued_at"] -= 5
+        dispatcher.enqueue_many(payloads)
+
+        dispatcher.pump()
+
+        stats = dispatcher.wait_time_percentiles(str(instance_id))
+        assert stats["samples"] == 2
+        assert stats["p50"] == pytest.approx(5, abs=1)
+        assert dispatcher.wait_time_percentiles(str(uuid4()))["p99"] is None
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_failed_publish_keeps_payload(self, mock_celery, dispatcher, fake_redis):
+        """Test a payload Celery did not accept goes back to the head of its sub-queue."""
+        instance_id = uuid4()
+        payloads = self._payloads(instance_id, 2)
+        dispatcher.enqueue_many(payloads)
+        mock_celery.send_task.side_effect = ConnectionError("broker down")
+
+        assert dispatcher.pump() == 0
+
+        assert dispatcher.backlog(str(instance_id))["default"] == 2
+        assert fake_redis.lists[dispatcher._key("default", "publishing")] == []
+        assert fake_redis.zsets[dispatcher._key("default", "inflight")] == {}
+
+        mock_celery.send_task.side_effect = None
+        assert dispatcher.pump() == 2
+        assert mock_celery.send_task.call_args_list[-2][1]["task_id"] == f"task_{payloads[0]['task_id']}"
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_pump_restores_payloads_of_dead_pump(self, mock_celery, dispatcher, fake_redis):
+        """Test a payload left in the publishing list is published by the next pump."""
+        payload = self._payloads(uuid4(), 1)[0]
+        fake_redis.lists[dispatcher._key("default", "publishing")].append(json.dumps(payload))
+
+        assert dispatcher.pump() == 1
+
+        assert mock_celery.send_task.call_args[1]["task_id"] == f"task_{payload['task_id']}"
+        assert fake_redis.lists[dispatcher._key("default", "publishing")] == []
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_tracked_task_ids(self, mock_celery, dispatcher):
+        """Test waiting and in-flight tasks are both tracked."""
+        payloads = self._payloads(uuid4(), 5)
+        dispatcher.enqueue_many(payloads)
+        dispatcher.pump()
+
+        assert dispatcher.tracked_task_ids() == {payload["task_id"] for payload in payloads}
+
+    @patch('src.tasks.fair_share.celery_app')
+    def test_default_lease_follows_time_limit(self, mock_celery):
+        """Test the in-flight lease ends shortly after Celery's hard time limit."""
+        mock_celery.conf.task_time_limit = 30 * 60
+
+        assert default_in_flight_lease() == 35 * 60
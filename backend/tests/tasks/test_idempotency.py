@@ -0,0 +1,76 @@
+"""Tests for duplicate task submission detection."""
+
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import Mock, patch
+from uuid import uuid4
+
+from src.models.instance_schemas import TaskSubmission
+from src.tasks.idempotency import SubmissionDeduplicator, get_dedup_window, submission_fingerprint
+
+
+class TestSubmissionDeduplicator:
+    """Test cases for SubmissionDeduplicator."""
+
+    @pytest.fixture
+    def mock_redis(self):
+        """Create a mock Redis client with separate reserve/release scripts."""
+        client = Mock()
+        client.register_script.side_effect = lambda script: Mock()
+        return client
+
+    @pytest.fixture
+    def deduplicator(self, mock_redis):
+        """Create a deduplicator backed by the mock client."""
+        return SubmissionDeduplicator(redis_client=mock_redis)
+
+    def test_keys_for(self, deduplicator):
+        """Test the idempotency key and the content window get their own keys."""
+        instance_id = uuid4()
+        submission = TaskSubmission(description="Write a post")
+
+        assert deduplicator.keys_for(instance_id, submission) == {}
+
+        keys = deduplicator.keys_for(instance_id, submission, idempotency_key="abc", dedup_window=30)
+        key_name, content_name = list(keys)
+        assert key_name == f"swallowtail:idempotency:{instance_id}:key:abc"
+        assert keys[key_name] == deduplicator.key_ttl
+        assert content_name.startswith(f"swallowtail:idempotency:{instance_id}:content:")
+        assert keys[content_name] == 30
+
+    def test_fingerprint_normalizes_description(self):
+        """Test whitespace and case do not defeat content dedup."""
+        due = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        first = TaskSubmission(description="Write  a Post", scheduled_for=due)
+        second = TaskSubmission(description="write a post ", scheduled_for=due)
+        other = TaskSubmission(description="write a post")
+
+        assert submission_fingerprint(first) == submission_fingerprint(second)
+        assert submission_fingerprint(first) != submission_fingerprint(other)
+
+    def test_reserve_passes_pending_marker_and_ttls(self, deduplicator):
+        """Test reservations use a pending marker and per-key TTLs."""
+        task_id = uuid4()
+        deduplicator._reserve_script.return_value = None
+
+        assert deduplicator.reserve({"a": 100, "b": 30}, task_id) is None
+        call = deduplicator._reserve_script.call_args.kwargs
+        assert call["keys"] == ["a", "b"]
+        assert call["args"] == [f"pending:{task_id}", deduplicator.pending_ttl, 100, 30]
+
+    def test_confirm_sets_task_id(self, deduplicator, mock_redis):
+        """Test confirmed keys point at the task for their full TTL."""
+        task_id = uuid4()
+        deduplicator.confirm({"a": 100}, task_id)
+
+        pipe = mock_redis.pipeline.return_value
+        pipe.set.assert_called_once_with("a", str(task_id), ex=100)
+        pipe.execute.assert_called_once()
+
+    def test_get_dedup_window(self):
+        """Test the window comes from instance configuration."""
+        assert get_dedup_window({"dedup_window_seconds": 45}) == 45
+        assert get_dedup_window({"dedup_window_seconds": -5}) == 0
+        with patch('src.tasks.idempotency.get_settings') as mock_settings:
+            mock_settings.return_value.task_dedup_window_seconds = 10
+            assert get_dedup_window({}) == 10
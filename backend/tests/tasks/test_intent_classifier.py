@@ -0,0 +1,62 @@
+"""Tests for the task intent classifier."""
+
+import pytest
+from unittest.mock import Mock
+
+from src.tasks.intent_classifier import IntentClassifier, normalize_description
+
+
+class TestIntentClassifier:
+    """Test cases for IntentClassifier."""
+
+    @pytest.fixture
+    def classifier(self):
+        """Create a classifier without fallback."""
+        return IntentClassifier()
+
+    def test_keyword_rules(self, classifier):
+        """Test each rule matches its keywords and inflections."""
+        assert classifier.classify("Create a social media post") == "content_creation"
+        assert classifier.classify("Posting schedule for next week") == "content_creation"
+        assert classifier.classify("Analyzed competitor pricing") == "market_analysis"
+        assert classifier.classify("Send the NEWSLETTERS") == "email_campaign"
+        assert classifier.classify("Update inventory counts") == "product_management"
+        assert classifier.classify("Random task") == "general"
+
+    def test_word_boundaries(self, classifier):
+        """Test keywords inside other words do not match."""
+        assert classifier.classify("Order compost for the garden") == "general"
+        assert classifier.classify("Check supermarkets opening hours") == "general"
+
+    def test_rule_precedence(self, classifier):
+        """Test the earliest rule wins regardless of position in the text."""
+        assert classifier.classify("Research the market, then write a post") == "content_creation"
+        assert classifier.classify("Email the product listing") == "email_campaign"
+
+    def test_fallback_memoized(self):
+        """Test the fallback is called once per normalized description."""
+        fallback = Mock(return_value="market_analysis")
+        classifier = IntentClassifier(fallback=fallback)
+
+        assert classifier.classify("Look into  Competitors") == "market_analysis"
+        assert classifier.classify("look into competitors") == "market_analysis"
+        fallback.assert_called_once()
+
+    def test_fallback_not_used_for_keyword_matches(self):
+        """Test keyword matches never reach the fallback."""
+        fallback = Mock()
+        IntentClassifier(fallback=fallback).classify("Write a post")
+        fallback.assert_not_called()
+
+    def test_fallback_unknown_intent_and_errors(self):
+        """Test invalid labels map to general and errors are not cached."""
+        fallback = Mock(side_effect=[RuntimeError("timeout"), "unknown label"])
+        classifier = IntentClassifier(fallback=fallback)
+
+        assert classifier.classify("Something vague") == "general"
+        assert classifier.classify("Something vague") == "general"
+        assert fallback.call_count == 2
+
+    def test_normalize_description(self):
+        """Test normalization collapses case and whitespace."""
+        assert normalize_description("  Hello\tWorld \n") == "hello world"
@@ -0,0 +1,83 @@
+"""Tests for the monthly instance_tasks partitions."""
+
+import pytest
+from unittest.mock import MagicMock
+from datetime import date, datetime
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+from src.models.instance import InstanceTask
+from src.tasks.partitions import add_months, ensure_task_partitions, partition_ddl, partition_name
+
+
+class TestPartitionNaming:
+    """Test cases for partition month arithmetic and DDL."""
+
+    def test_add_months_crosses_years(self):
+        """Test month arithmetic wraps around the year."""
+        assert add_months(date(2026, 11, 1), 2) == date(2027, 1, 1)
+        assert add_months(date(2026, 1, 1), -1) == date(2025, 12, 1)
+
+    def test_partition_ddl(self):
+        """Test a partition covers exactly one month."""
+        assert partition_name(date(2026, 12, 1)) == "instance_tasks_y2026m12"
+        assert partition_ddl(date(2026, 12, 1)) == (
+            "CREATE TABLE IF NOT EXISTS instance_tasks_y2026m12 PARTITION OF instance_tasks "
+            "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+        )
+
+
+class TestEnsureTaskPartitions:
+    """Test cases for ensure_task_partitions."""
+
+    @pytest.fixture
+    def mock_db_session(self):
+        """Create a mock session whose table has the October partition."""
+        session = MagicMock()
+        session.scalars.return_value = ["instance_tasks_y2026m10", "instance_tasks_default"]
+        return session
+
+    def test_creates_missing_months(self, mock_db_session):
+        """Test only months without a partition are created."""
+        created = ensure_task_partitions(mock_db_session, months_ahead=2, now=datetime(2026, 10, 16))
+
+        assert created == ["instance_tasks_y2026m11", "instance_tasks_y2026m12"]
+        assert mock_db_session.execute.call_count == 2
+        mock_db_session.commit.assert_called_once()
+
+    def test_failed_month_is_skipped(self, mock_db_session):
+        """Test a month that cannot be created does not stop the others."""
+        mock_db_session.execute.side_effect = [ProgrammingError("CREATE", {}, Exception("overlap")), None]
+
+        created = ensure_task_partitions(mock_db_session, months_ahead=2, now=datetime(2026, 10, 16))
+
+        assert created == ["instance_tasks_y2026m12"]
+
+
+class TestPartitionedModel:
+    """Test cases for the partitioned InstanceTask table."""
+
+    def test_table_partitioned_by_created_at(self):
+        """Test the table is range partitioned with the partition key in its primary key."""
+        ddl = str(CreateTable(InstanceTask.__table__).compile(dialect=postgresql.dialect()))
+
+        assert "PRIMARY KEY (id, created_at)" in ddl
+        assert "PARTITION BY RANGE (created_at)" in ddl
+
+    def test_tasks_identified_by_id(self):
+        """Test the ORM still loads tasks by id alone."""
+        assert [column.name for column in InstanceTask.__mapper__.primary_key] == ["id"]
+
+    def test_live_status_indexes_are_partial(self):
+        """Test the scheduler and polling indexes only cover waiting or running tasks."""
+        indexes = {
+            index.name: str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+            for index in InstanceTask.__table__.indexes
+        }
+
+        assert indexes["idx_instance_tasks_due"].endswith("(scheduled_for) WHERE status = 'SUBMITTED'")
+        assert indexes["idx_instance_tasks_live"].endswith(
+            "(instance_id, status) WHERE status IN ('SUBMITTED', 'QUEUED', 'IN_PROGRESS')"
+        )
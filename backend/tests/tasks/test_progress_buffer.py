@@ -0,0 +1,44 @@
+"""Tests for the task progress buffer."""
+
+from unittest.mock import patch
+
+from src.tasks.progress_buffer import ProgressBuffer
+
+
+class TestProgressBuffer:
+    """Test cases for ProgressBuffer."""
+
+    def test_progress_coalesced(self):
+        """Test only the latest progress value is kept."""
+        buffer = ProgressBuffer(max_steps=5, max_interval=60)
+        buffer.set_progress(10)
+        buffer.set_progress(20)
+
+        assert buffer.drain() == (20, [])
+        assert not buffer.pending
+
+    def test_flush_on_size(self):
+        """Test the buffer asks for a flush once max_steps are queued."""
+        buffer = ProgressBuffer(max_steps=2, max_interval=60)
+        buffer.add_step({"step_id": "a"})
+        assert not buffer.should_flush()
+
+        buffer.add_step({"step_id": "b"})
+        assert buffer.should_flush()
+        assert buffer.drain() == (None, [{"step_id": "a"}, {"step_id": "b"}])
+
+    def test_flush_on_interval(self):
+        """Test pending updates are flushed once the interval has passed."""
+        with patch('src.tasks.progress_buffer.time.monotonic', return_value=100.0):
+            buffer = ProgressBuffer(max_steps=10, max_interval=2)
+            buffer.set_progress(5)
+        with patch('src.tasks.progress_buffer.time.monotonic', return_value=101.0):
+            assert not buffer.should_flush()
+        with patch('src.tasks.progress_buffer.time.monotonic', return_value=102.5):
+            assert buffer.should_flush()
+
+    def test_empty_buffer_never_flushes(self):
+        """Test an empty buffer does not ask for a write."""
+        with patch('src.tasks.progress_buffer.time.monotonic', return_value=100.0):
+            buffer = ProgressBuffer(max_steps=10, max_interval=0)
+            assert not buffer.should_flush()
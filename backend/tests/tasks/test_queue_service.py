@@ -1,15 +1,17 @@
 """Tests for task queue service."""
 
 import pytest
-from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime, timezone, timedelta
+from unittest.mock import Mock, patch
+from datetime import datetime
 from uuid import uuid4
 
-from src.tasks.queue_service import TaskQueueService
+from sqlalchemy.dialects import postgresql
+
+from src.tasks.queue_service import TaskQueueService, decode_task_cursor, encode_task_cursor
 from src.tasks.processors.default_processor import DefaultTaskProcessor
 from src.tasks.processors.content_creation_processor import ContentCreationProcessor
 from src.models.instance import Instance, InstanceTask, InstanceTaskStatus, TaskPriority
-from src.models.instance_schemas import TaskSubmission, TaskUpdateRequest, TaskListFilters
+from src.models.instance_schemas import TaskListFilters
 
 
 class TestTaskQueueService:
@@ -28,23 +30,16 @@ class TestTaskQueueService:
         instance.name = "Test Instance"
         return instance
     
-    @pytest.fixture
-    def mock_task(self, mock_instance):
-        """Create a mock task."""
-        task = Mock(spec=InstanceTask)
-        task.id = uuid4()
-        task.instance_id = mock_instance.id
-        task.description = "Test task description"
-        task.status = InstanceTaskStatus.SUBMITTED
-        task.priority = TaskPriority.NORMAL
-        task.execution_steps = []
-        task.created_at = datetime.now(timezone.utc)
-        return task
-    
     @pytest.fixture
     def service(self, mock_db_session):
         """Create a TaskQueueService instance."""
-        service = TaskQueueService(mock_db_session)
+        limiter = Mock()
+        limiter.acquire_many.side_effect = lambda dispatches: [True] * len(dispatches)
+        deduplicator = Mock()
+        deduplicator.reserve.return_value = None
+        service = TaskQueueService(
+            mock_db_session, scheduler=Mock(), limiter=limiter, dispatcher=Mock(), deduplicator=deduplicator
+        )
         # Register test processors
         TaskQueueService.register_processor('default', DefaultTaskProcessor)
         TaskQueueService.register_processor('content_creation', ContentCreationProcessor)
@@ -58,95 +53,17 @@ class TestTaskQueueService:
         assert 'test' in TaskQueueService._processor_registry
         assert TaskQueueService._processor_registry['test'] == DefaultTaskProcessor
     
-    def test_submit_task_success(self, service, mock_db_session, mock_instance):
-        """Test successful task submission."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_instance
-        
-        submission = TaskSubmission(
-            description="Create a social media post",
-            priority=TaskPriority.URGENT
-        )
-        
-        with patch.object(service, '_queue_task') as mock_queue:
-            task = service.submit_task(mock_instance.id, submission)
-            
-            # Verify task was created
-            mock_db_session.add.assert_called_once()
-            mock_db_session.commit.assert_called()
-            
-            # Verify task was queued (no schedule)
-            mock_queue.assert_called_once()
-            
-            # Verify task attributes
-            added_task = mock_db_session.add.call_args[0][0]
-            assert added_task.description == submission.description
-            assert added_task.priority == submission.priority
-            assert added_task.status == InstanceTaskStatus.SUBMITTED
-    
-    def test_submit_task_scheduled(self, service, mock_db_session, mock_instance):
-        """Test scheduled task submission."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_instance
-        
-        future_time = datetime.now(timezone.utc) + timedelta(hours=2)
-        submission = TaskSubmission(
-            description="Scheduled post",
-            scheduled_for=future_time
-        )
-        
-        with patch.object(service, '_queue_task') as mock_queue:
-            task = service.submit_task(mock_instance.id, submission)
-            
-            # Verify task was not queued immediately
-            mock_queue.assert_not_called()
-    
-    def test_submit_task_instance_not_found(self, service, mock_db_session):
-        """Test task submission with invalid instance."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = None
-        
-        submission = TaskSubmission(description="Test")
-        
-        with pytest.raises(ValueError, match="Instance .* not found"):
-            service.submit_task(uuid4(), submission)
-    
-    @patch('src.tasks.queue_service.celery_app')
-    def test_queue_task_with_processor(self, mock_celery, service, mock_db_session, mock_task):
-        """Test queuing task with matched processor."""
-        mock_task.description = "Create social media content"
-        
-        service._queue_task(mock_task)
-        
-        # Verify task status updated
-        assert mock_task.status == InstanceTaskStatus.QUEUED
-        assert mock_task.parsed_intent is not None
-        assert mock_task.parsed_intent['intent_type'] == 'content_creation'
-        
-        # Verify Celery task sent
-        mock_celery.send_task.assert_called_once()
-        call_args = mock_celery.send_task.call_args
-        assert call_args[0][0] == 'process_task'
-        assert call_args[1]['queue'] == 'default'  # Normal priority
-        assert call_args[1]['task_id'] == f"task_{mock_task.id}"
-    
-    @patch('src.tasks.queue_service.celery_app')
-    def test_queue_task_urgent_priority(self, mock_celery, service, mock_db_session, mock_task):
-        """Test urgent tasks go to high priority queue."""
-        mock_task.priority = TaskPriority.URGENT
-        
-        service._queue_task(mock_task)
+    @patch('src.tasks.queue_service.group')
+    def test_publish_without_redis(self, mock_group, service):
+        """Test dispatch falls back to publishing straight to Celery without Redis."""
+        service.limiter.acquire_many.side_effect = ConnectionError("redis down")
+        service.dispatcher.enqueue_many.side_effect = ConnectionError("redis down")
+        payload = {"task_id": "1", "instance_id": "2", "processor_path": "a.B", "queue": "default"}
         
-        call_args = mock_celery.send_task.call_args
-        assert call_args[1]['queue'] == 'agents'  # High priority queue
-    
-    def test_queue_task_no_processor(self, service, mock_db_session, mock_task):
-        """Test queuing task with no matching processor."""
-        # Clear registry to ensure no processors
-        TaskQueueService._processor_registry = {}
-        
-        service._queue_task(mock_task)
-        
-        assert mock_task.status == InstanceTaskStatus.FAILED
-        assert "No processor available" in mock_task.error_message
-        mock_db_session.commit.assert_called()
+        with patch('src.tasks.queue_service.celery_app'):
+            assert service._publish([(payload, 3), (payload, 3)]) == 2
+        assert len(mock_group.call_args[0][0]) == 2
+        mock_group.return_value.apply_async.assert_called_once()
     
     def test_parse_intent_type(self, service):
         """Test intent type parsing."""
@@ -162,132 +79,137 @@ class TestTaskQueueService:
         assert service._get_queue_name(TaskPriority.NORMAL) == "default"
         assert service._get_queue_name(TaskPriority.LOW) == "background"
     
-    @patch('src.tasks.queue_service.AsyncResult')
-    def test_get_task_status(self, mock_async_result, service, mock_db_session, mock_task):
-        """Test getting task status."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        mock_task.status = InstanceTaskStatus.IN_PROGRESS
-        
-        # Mock Celery result
-        mock_result = Mock()
-        mock_result.state = "PENDING"
-        mock_result.info = {"progress": 50}
-        mock_async_result.return_value = mock_result
-        
-        status = service.get_task_status(mock_task.id)
-        
-        assert status['task_id'] == mock_task.id
-        assert status['status'] == InstanceTaskStatus.IN_PROGRESS
-        assert status['celery_status']['state'] == "PENDING"
-        assert status['celery_status']['info']['progress'] == 50
-    
-    def test_update_task(self, service, mock_db_session, mock_task):
-        """Test updating task."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        
-        update = TaskUpdateRequest(
-            status=InstanceTaskStatus.IN_PROGRESS,
-            progress_percentage=75,
-            error_message="Test error"
+    def test_list_statement(self, mock_instance):
+        """Test listings filter, order and paginate in one SELECT."""
+        filters = TaskListFilters(
+            status=InstanceTaskStatus.COMPLETED,
+            priority=TaskPriority.URGENT,
+            limit=10,
+            offset=0
         )
         
-        updated_task = service.update_task(mock_task.id, update)
+        statement = TaskQueueService._list_statement(mock_instance.id, filters)
         
-        assert mock_task.status == InstanceTaskStatus.IN_PROGRESS
-        assert mock_task.progress_percentage == 75
-        assert mock_task.error_message == "Test error"
-        mock_db_session.commit.assert_called()
+        sql = str(statement.compile(compile_kwargs={"literal_binds": True}))
+        assert "WHERE instance_tasks.instance_id = " in sql
+        assert "instance_tasks.status = 'COMPLETED'" in sql
+        assert "ORDER BY instance_tasks.created_at DESC, instance_tasks.id DESC" in sql
+        assert "LIMIT 10" in sql
     
-    @patch('src.tasks.queue_service.celery_app')
-    def test_cancel_task(self, mock_celery, service, mock_db_session, mock_task):
-        """Test task cancellation."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        mock_task.status = InstanceTaskStatus.IN_PROGRESS
-        
-        result = service.cancel_task(mock_task.id)
+    def test_list_statement_with_cursor(self, mock_instance):
+        """Test cursor pages seek past the cursor instead of using offset."""
+        cursor = encode_task_cursor(datetime(2030, 1, 1, 12, 0), uuid4())
+        filters = TaskListFilters(limit=20, offset=40, cursor=cursor)
         
-        assert result is True
-        assert mock_task.status == InstanceTaskStatus.CANCELLED
-        assert mock_task.processing_ended_at is not None
+        sql = str(TaskQueueService._list_statement(mock_instance.id, filters, fields=["status"]))
         
-        # Verify Celery revoke called
-        mock_celery.control.revoke.assert_called_once_with(
-            f"task_{mock_task.id}",
-            terminate=True
-        )
+        assert "(instance_tasks.created_at, instance_tasks.id) <" in sql
+        # The plain bound on the partition key lets PostgreSQL prune later months
+        assert "instance_tasks.created_at <= :created_at_1" in sql
+        assert "OFFSET" not in sql
     
-    def test_cancel_completed_task(self, service, mock_db_session, mock_task):
-        """Test cannot cancel completed task."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        mock_task.status = InstanceTaskStatus.COMPLETED
-        
-        result = service.cancel_task(mock_task.id)
+    def test_task_cursor_round_trip(self):
+        """Test cursors decode to the position they were built from."""
+        created_at, task_id = datetime(2030, 1, 1, 12, 0, 0, 123456), uuid4()
         
-        assert result is False
-        assert mock_task.status == InstanceTaskStatus.COMPLETED
+        assert decode_task_cursor(encode_task_cursor(created_at, task_id)) == (created_at, task_id)
+        with pytest.raises(ValueError, match="Invalid cursor"):
+            decode_task_cursor("not-a-cursor")
     
-    def test_retry_task(self, service, mock_db_session, mock_task):
-        """Test retrying failed task."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        mock_task.status = InstanceTaskStatus.FAILED
-        mock_task.retry_count = 1
+    def test_list_columns(self):
+        """Test listings only load response columns plus the cursor key."""
+        names = {column.key for column in TaskQueueService._list_columns(["status"])}
+        assert names == {"id", "created_at", "status"}
         
-        with patch.object(service, '_queue_task') as mock_queue:
-            retried_task = service.retry_task(mock_task.id)
-            
-            assert mock_task.status == InstanceTaskStatus.SUBMITTED
-            assert mock_task.error_message is None
-            assert mock_task.retry_count == 2
-            mock_queue.assert_called_once_with(mock_task)
-    
-    def test_retry_non_failed_task(self, service, mock_db_session, mock_task):
-        """Test cannot retry non-failed task."""
-        mock_db_session.query.return_value.filter_by.return_value.first.return_value = mock_task
-        mock_task.status = InstanceTaskStatus.IN_PROGRESS
-        
-        with pytest.raises(ValueError, match="Can only retry failed tasks"):
-            service.retry_task(mock_task.id)
+        names = {column.key for column in TaskQueueService._list_columns(None)}
+        assert "execution_steps" in names
+        assert "tiktok_post_data" not in names and "result_data" not in names
     
-    def test_list_tasks(self, service, mock_db_session, mock_instance):
-        """Test listing tasks with filters."""
-        mock_query = Mock()
-        mock_db_session.query.return_value = mock_query
-        mock_query.filter_by.return_value = mock_query
-        mock_query.filter.return_value = mock_query
-        mock_query.order_by.return_value = mock_query
-        mock_query.limit.return_value = mock_query
-        mock_query.offset.return_value = mock_query
-        mock_query.all.return_value = []
-        
-        filters = TaskListFilters(
-            status=InstanceTaskStatus.COMPLETED,
-            priority=TaskPriority.URGENT,
-            limit=10,
-            offset=0
-        )
-        
-        tasks = service.list_tasks(mock_instance.id, filters)
-        
-        # Verify query construction
-        mock_query.filter_by.assert_called_with(instance_id=mock_instance.id)
-        mock_query.limit.assert_called_with(10)
-        mock_query.offset.assert_called_with(0)
-    
-    def test_process_scheduled_tasks(self, service, mock_db_session):
-        """Test processing scheduled tasks."""
-        # Create mock scheduled tasks
+    def test_claim_due_tasks(self, service, mock_db_session):
+        """Test claiming due tasks locks rows and commits once."""
         mock_tasks = [Mock(spec=InstanceTask) for _ in range(3)]
         for task in mock_tasks:
+            task.id = uuid4()
+            task.instance_id = uuid4()
+            task.description = "Create a social media post"
+            task.priority = TaskPriority.NORMAL
             task.status = InstanceTaskStatus.SUBMITTED
+            task.parent_task_id = None
             
-        mock_query = Mock()
-        mock_db_session.query.return_value = mock_query
-        mock_query.filter.return_value = mock_query
-        mock_query.all.return_value = mock_tasks
+        mock_db_session.scalars.return_value = mock_tasks
+        mock_db_session.execute.return_value.all.return_value = [
+            (task.instance_id, {"max_concurrent_tasks": 1}) for task in mock_tasks
+        ]
+        
+        with patch('src.tasks.queue_service.celery_app'):
+            count = service.claim_due_tasks([task.id for task in mock_tasks])
+        
+        assert count == 3
+        statement = mock_db_session.scalars.call_args[0][0]
+        assert "FOR UPDATE SKIP LOCKED" in str(statement.compile(dialect=postgresql.dialect()))
+        mock_db_session.commit.assert_called_once()
+        assert all(task.status == InstanceTaskStatus.QUEUED for task in mock_tasks)
+        assert len(service.dispatcher.enqueue_many.call_args[0][0]) == 3
+        assert [limit for _, limit in service.limiter.acquire_many.call_args[0][0]] == [1, 1, 1]
+    
+    def test_claim_due_tasks_empty_ids(self, service, mock_db_session):
+        """Test claiming with no popped ids does not hit the database."""
+        assert service.claim_due_tasks([]) == 0
+        mock_db_session.scalars.assert_not_called()
+        mock_db_session.commit.assert_not_called()
+    
+    def test_claim_due_tasks_no_processor(self, service, mock_db_session):
+        """Test a claimed task without a processor is failed, not dispatched."""
+        TaskQueueService._processor_registry = {}
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        task.instance_id = uuid4()
+        task.description = "Random task"
+        task.parent_task_id = None
+        mock_db_session.scalars.return_value = [task]
+        mock_db_session.execute.return_value.all.return_value = [(task.instance_id, None)]
         
-        with patch.object(service, '_queue_task') as mock_queue:
-            count = service.process_scheduled_tasks()
-            
-            assert count == 3
-            assert mock_queue.call_count == 3
-            mock_db_session.commit.assert_called()
\ No newline at end of file
+        assert service.claim_due_tasks([task.id]) == 1
+        
+        assert task.status == InstanceTaskStatus.FAILED
+        assert "No processor available" in task.error_message
+        mock_db_session.commit.assert_called_once()
+        service.dispatcher.enqueue_many.assert_not_called()
+    
+    def test_process_scheduled_tasks(self, service, mock_db_session):
+        """Test the sweep claims due tasks in batches."""
+        with patch.object(service, 'claim_due_tasks', side_effect=[100, 20]) as mock_claim:
+            count = service.process_scheduled_tasks(batch_size=100)
+        
+        assert count == 120
+        assert mock_claim.call_count == 2
+    
+    def test_reconcile_queued_tasks(self, service, mock_db_session):
+        """Test queued tasks missing from Redis are dispatched again."""
+        tracked, lost = Mock(spec=InstanceTask), Mock(spec=InstanceTask)
+        for task in (tracked, lost):
+            task.id = uuid4()
+            task.instance_id = uuid4()
+            task.priority = TaskPriority.NORMAL
+            task.parsed_intent = {"intent_type": "content_creation", "processor": "ContentCreationProcessor"}
+        service.limiter.held_task_ids.return_value = {str(tracked.id)}
+        service.dispatcher.tracked_task_ids.return_value = set()
+        mock_db_session.scalars.return_value = [tracked, lost]
+        mock_db_session.execute.return_value.all.return_value = [(lost.instance_id, None)]
+        
+        assert service.reconcile_queued_tasks() == 1
+        
+        payload, = service.dispatcher.enqueue_many.call_args[0][0]
+        assert payload["task_id"] == str(lost.id)
+        assert payload["processor_path"].endswith("ContentCreationProcessor")
+    
+    def test_reconcile_queued_tasks_all_tracked(self, service, mock_db_session):
+        """Test nothing is dispatched while Redis still knows every queued task."""
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        service.limiter.held_task_ids.return_value = set()
+        service.dispatcher.tracked_task_ids.return_value = {str(task.id)}
+        mock_db_session.scalars.return_value = [task]
+        
+        assert service.reconcile_queued_tasks() == 0
+        service.dispatcher.enqueue_many.assert_not_called()
@@ -0,0 +1,109 @@
+"""Tests for the recurring task engine."""
+
+import pytest
+from unittest.mock import Mock
+from datetime import datetime, timezone, timedelta
+from uuid import uuid4
+
+from src.tasks.recurrence import RecurrenceEngine, compile_rule, is_recurring
+from src.models.instance import InstanceTask, InstanceTaskStatus, TaskPriority
+
+
+def fake_task_class():
+    """Stand-in for InstanceTask that builds plain mocks for child rows."""
+    return Mock(side_effect=lambda **kwargs: Mock(**kwargs), id=InstanceTask.id)
+
+
+class TestRecurrenceEngine:
+    """Test cases for RecurrenceEngine."""
+    
+    @pytest.fixture
+    def mock_db_session(self):
+        """Create a mock database session."""
+        return Mock()
+    
+    @pytest.fixture
+    def parent(self):
+        """Create a recurring series parent."""
+        task = Mock(spec=InstanceTask)
+        task.id = uuid4()
+        task.instance_id = uuid4()
+        task.description = "Daily TikTok post"
+        task.priority = TaskPriority.NORMAL
+        task.attached_media_ids = []
+        task.status = InstanceTaskStatus.SUBMITTED
+        task.recurring_pattern = {"rrule": "FREQ=DAILY;BYHOUR=9;BYMINUTE=0;BYSECOND=0"}
+        task.scheduled_for = None
+        return task
+    
+    @pytest.fixture
+    def engine(self, mock_db_session):
+        """Create an engine with a lookahead of three occurrences."""
+        return RecurrenceEngine(mock_db_session, lookahead=3)
+    
+    def test_is_recurring(self):
+        """Test series detection."""
+        assert is_recurring({"rrule": "FREQ=DAILY"})
+        assert not is_recurring({})
+        assert not is_recurring(None)
+    
+    def test_compile_rule_is_cached(self):
+        """Test the same rule is parsed once."""
+        dtstart = datetime(2030, 1, 1, tzinfo=timezone.utc).isoformat()
+        assert compile_rule("RRULE:FREQ=HOURLY", dtstart) is compile_rule("RRULE:FREQ=HOURLY", dtstart)
+    
+    def test_start_series_materializes_lookahead(self, engine, parent, mock_db_session):
+        """Test a new series creates only the next N occurrences."""
+        start = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("src.tasks.recurrence.InstanceTask", fake_task_class())
+            children = engine.start_series(parent, start)
+        
+        assert [child.scheduled_for for child in children] == [
+            datetime(2030, 1, 1, 9, tzinfo=timezone.utc),
+            datetime(2030, 1, 2, 9, tzinfo=timezone.utc),
+            datetime(2030, 1, 3, 9, tzinfo=timezone.utc),
+        ]
+        assert all(child.parent_task_id == parent.id for child in children)
+        mock_db_session.add_all.assert_called_once()
+        assert parent.recurring_pattern["cursor"] == children[-1].scheduled_for.isoformat()
+        assert parent.recurring_pattern["materialized"] == 3
+        assert parent.scheduled_for is None
+    
+    def test_advance_moves_cursor(self, engine, parent, mock_db_session):
+        """Test dispatching occurrences extends the window by the same amount."""
+        parent.recurring_pattern = {
+            "rrule": "FREQ=DAILY;BYHOUR=9;BYMINUTE=0;BYSECOND=0",
+            "dtstart": datetime(2030, 1, 1, tzinfo=timezone.utc).isoformat(),
+            "cursor": datetime(2030, 1, 3, 9, tzinfo=timezone.utc).isoformat(),
+            "materialized": 3,
+        }
+        mock_db_session.query.return_value.filter.return_value \
+            .with_for_update.return_value.populate_existing.return_value.all.return_value = [parent]
+        
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("src.tasks.recurrence.InstanceTask", fake_task_class())
+            children = engine.advance([parent.id, parent.id])
+        
+        assert [child.scheduled_for.day for child in children] == [4, 5]
+        assert parent.recurring_pattern["materialized"] == 5
+    
+    def test_series_exhausts_at_count(self, engine, parent, mock_db_session):
+        """Test COUNT-limited rules stop generating occurrences."""
+        parent.recurring_pattern = {"rrule": "FREQ=DAILY;COUNT=2"}
+        
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("src.tasks.recurrence.InstanceTask", fake_task_class())
+            children = engine.start_series(parent, datetime(2030, 1, 1, tzinfo=timezone.utc))
+        
+        assert len(children) == 2
+        assert parent.recurring_pattern["exhausted"] is True
+    
+    def test_cancelled_series_not_advanced(self, engine, parent, mock_db_session):
+        """Test cancelled series stop producing occurrences."""
+        parent.status = InstanceTaskStatus.CANCELLED
+        mock_db_session.query.return_value.filter.return_value \
+            .with_for_update.return_value.populate_existing.return_value.all.return_value = [parent]
+        
+        assert engine.advance([parent.id]) == []
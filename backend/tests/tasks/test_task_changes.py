@@ -0,0 +1,129 @@
+"""Tests for task change feeds."""
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import Mock
+from uuid import uuid4
+
+import pytest
+
+from src.tasks.task_changes import (
+    NIL_ID,
+    ChangeCursorExpiredError,
+    change_cursor_since,
+    changed_tasks_statement,
+    collect_changes,
+    decode_change_cursor,
+    encode_change_cursor,
+    initial_change_cursor,
+    prune_task_tombstones,
+)
+
+NOW = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def task_at(seconds_ago: float):
+    # Task timestamps come back from the database as naive UTC
+    updated_at = (NOW - timedelta(seconds=seconds_ago)).replace(tzinfo=None)
+    return SimpleNamespace(id=uuid4(), updated_at=updated_at)
+
+
+class TestChangeCursor:
+    """Test cases for encoding and decoding change cursors."""
+
+    def test_round_trip(self):
+        """Test a position survives the cursor, naive times read as UTC."""
+        task_id = uuid4()
+
+        position = decode_change_cursor(encode_change_cursor((datetime(2030, 1, 1, 11, 0), task_id)), now=NOW)
+
+        assert position == (datetime(2030, 1, 1, 11, 0, tzinfo=timezone.utc), task_id)
+
+    def test_updated_since(self):
+        """Test updated_since starts before every task updated at that time."""
+        assert decode_change_cursor(change_cursor_since(NOW), now=NOW) == (NOW, NIL_ID)
+
+    def test_initial_cursor_overlaps(self):
+        """Test a listing's cursor starts the overlap before the listing."""
+        since, _ = decode_change_cursor(initial_change_cursor(NOW), now=NOW)
+
+        assert since == NOW - timedelta(seconds=5)
+
+    def test_expired(self):
+        """Test cursors older than the tombstone retention are rejected."""
+        with pytest.raises(ChangeCursorExpiredError):
+            decode_change_cursor(change_cursor_since(NOW - timedelta(days=8)), now=NOW)
+
+    def test_invalid(self):
+        """Test garbage cursors raise ValueError."""
+        with pytest.raises(ValueError):
+            decode_change_cursor("not-a-cursor", now=NOW)
+
+
+class TestChangedTasksStatement:
+    """Test cases for changed_tasks_statement."""
+
+    def test_seeks_past_position(self):
+        """Test the query walks (updated_at, id) after the position."""
+        sql = str(changed_tasks_statement(uuid4(), (NOW, NIL_ID), 50))
+
+        assert "(instance_tasks.updated_at, instance_tasks.id) >" in sql
+        assert "ORDER BY instance_tasks.updated_at, instance_tasks.id" in sql
+
+
+class TestCollectChanges:
+    """Test cases for collect_changes."""
+
+    def test_full_page_continues_after_last_task(self):
+        """Test a full page returns has_more and an exact cursor."""
+        position = (NOW - timedelta(minutes=10), NIL_ID)
+        tasks = [task_at(500), task_at(400), task_at(300)]
+        tombstones = [SimpleNamespace(id=uuid4(), deleted_at=task.updated_at) for task in (task_at(450), task_at(350))]
+
+        changes = collect_changes(position, tasks, tombstones, limit=2, now=NOW)
+
+        assert changes.has_more
+        assert changes.tasks == tasks[:2]
+        assert changes.deleted == tombstones[:1]
+        assert decode_change_cursor(changes.change_cursor, now=NOW) == (
+            tasks[1].updated_at.replace(tzinfo=timezone.utc), tasks[1].id
+        )
+
+    def test_caught_up_moves_to_settled_change(self):
+        """Test the cursor moves to the newest change older than the overlap."""
+        position = (NOW - timedelta(minutes=10), NIL_ID)
+        tasks = [task_at(120), task_at(60)]
+
+        changes = collect_changes(position, tasks, [], limit=10, now=NOW)
+
+        assert not changes.has_more
+        assert decode_change_cursor(changes.change_cursor, now=NOW)[1] == tasks[1].id
+
+    def test_recent_changes_are_held_back(self):
+        """Test changes within the overlap are returned again next time."""
+        position = (NOW - timedelta(minutes=10), NIL_ID)
+
+        changes = collect_changes(position, [task_at(60), task_at(1)], [], limit=10, now=NOW)
+
+        assert decode_change_cursor(changes.change_cursor, now=NOW) == (NOW - timedelta(seconds=5), NIL_ID)
+
+    def test_never_moves_backwards(self):
+        """Test an empty poll keeps its cursor."""
+        position = (NOW - timedelta(seconds=1), uuid4())
+
+        changes = collect_changes(position, [], [], limit=10, now=NOW)
+
+        assert decode_change_cursor(changes.change_cursor, now=NOW) == position
+
+
+class TestPruneTaskTombstones:
+    """Test cases for prune_task_tombstones."""
+
+    def test_deletes_and_commits(self):
+        """Test old tombstones are deleted in one statement."""
+        session = Mock()
+        session.execute.return_value.rowcount = 3
+
+        assert prune_task_tombstones(session, now=NOW) == 3
+        session.execute.assert_called_once()
+        session.commit.assert_called_once()